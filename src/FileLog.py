@@ -14,14 +14,130 @@ Suggested way to use the following log function:
         #tb is an exception
 
 In try catch, use: tb=sys.exc_traceback
+
+Log files are kept open and written by a background thread, so a call to
+log() only formats the message and puts it on a bounded queue. Everything
+queued is written out when the program exits; call FileLog.flush() to force it
+earlier (e.g. before reading a log file back).
+
+Messages below the level set with set_level() are dropped, and
+set_rate_limit() caps how many messages per second a log file accepts, e.g. to
+keep a per-user loop from flooding the log:
+    FileLog.set_rate_limit('crawl_users.log', 10)
+    FileLog.log('crawl_users.log', 'Error...', level=FileLog.ERROR) #never dropped
 '''
 import os
 import datetime
 import sys
 import traceback
+import threading
+import atexit
+import time
+import Queue
 
 default_log_path = "../log/"
 
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+_QUEUE_SIZE = 10000
+_BATCH_SIZE = 1000
+
+_level = INFO
+_rate_limits = {}  # log_file -> _RateLimit
+_writer = None
+_writer_lock = threading.Lock()
+
+
+class _RateLimit:
+    """Token bucket allowing messages_per_sec messages, with bursts."""
+
+    def __init__(self, messages_per_sec, burst):
+        self.rate = float(messages_per_sec)
+        self.burst = float(burst)
+        self.tokens = self.burst
+        self.last = time.time()
+        self.suppressed = 0
+
+    def allow(self):
+        now = time.time()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        self.suppressed += 1
+        return False
+
+
+class _Writer:
+    """Background thread writing queued messages to open log files."""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.queue = Queue.Queue(_QUEUE_SIZE)
+        self.files = {}
+        self.thread = threading.Thread(target=self.run, name='FileLog')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        running = True
+        while running:
+            items = [self.queue.get()]
+            try:
+                while len(items) < _BATCH_SIZE:
+                    items.append(self.queue.get_nowait())
+            except Queue.Empty:
+                pass
+            touched = set()
+            for item in items:
+                if item is None: # put by close()
+                    running = False
+                    continue
+                path, text = item
+                try:
+                    out_file = self.files.get(path)
+                    if out_file is None:
+                        out_file = open(path, "a")
+                        self.files[path] = out_file
+                    out_file.write(text)
+                    touched.add(out_file)
+                except (IOError, OSError), err:
+                    print >> sys.stderr, 'FileLog: could not write to %s: %s' % (
+                        path, err)
+            for out_file in touched:
+                out_file.flush()
+            for _ in items:
+                self.queue.task_done()
+        for out_file in self.files.values():
+            out_file.close()
+
+    def put(self, path, text):
+        self.queue.put((path, text))
+
+    def flush(self):
+        self.queue.join()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+
+def _get_writer():
+    """Returns the writer thread, starting one if needed (also after a fork)."""
+    global _writer
+    writer = _writer
+    if writer is None or writer.pid != os.getpid():
+        with _writer_lock:
+            if _writer is None or _writer.pid != os.getpid():
+                _writer = _Writer()
+            writer = _writer
+    return writer
+
+
 def set_log_dir(new_log_path=None):  
     """Make sure the deafult log directory, ../log/, exists."""
     log_path = default_log_path
@@ -33,22 +149,68 @@ def set_log_dir(new_log_path=None):
     if not os.path.exists(log_path):
         os.makedirs(log_path)  
 
+def set_level(level):
+    """Drop messages logged below the given level (DEBUG, INFO, ...)."""
+    global _level
+    _level = level
+
+def set_rate_limit(log_file, messages_per_sec, burst=None):
+    """Limit the rate of messages accepted for a log file.
+
+    Messages over the limit are dropped, and the number dropped is reported
+    with the next message that gets through. Messages at level ERROR and above
+    are never dropped. Pass messages_per_sec=None to remove the limit.
+    """
+    if messages_per_sec is None:
+        _rate_limits.pop(log_file, None)
+    else:
+        _rate_limits[log_file] = _RateLimit(messages_per_sec,
+                                            burst or messages_per_sec)
+
 def log(log_file, msg, print_log=True, exception_tb=None, 
-        log_path=default_log_path):
+        log_path=default_log_path, level=INFO):
     """Print out a message and save it to a log file.
-    
+
     If log_file is None or empty, the message will not be stored.
     By default, the log path is ../log/
     """
+    if level < _level:
+        return
+    rate_limit = _rate_limits.get(log_file)
+    suppressed = 0
+    if rate_limit and level < ERROR:
+        if not rate_limit.allow():
+            return
+        suppressed, rate_limit.suppressed = rate_limit.suppressed, 0
+
     now = datetime.datetime.now()
     now_str = now.strftime('%m/%d/%Y %H:%M:%S') #'03/09/2011 17:41:30'
     full_msg = now_str + " > " + str(msg)
+    if suppressed:
+        full_msg += " (%s messages suppressed)" % suppressed
     if exception_tb:
         tb_list = traceback.format_tb(exception_tb)        
         full_msg = full_msg + "\nTraceback:\n" + "\n".join(tb_list)
-    
+
     if print_log:
         print full_msg
     if log_file:
-        with open(log_path + log_file, "a") as log_file:
-            log_file.write(full_msg +os.linesep)
+        _get_writer().put(log_path + log_file, full_msg + os.linesep)
+
+def flush():
+    """Block until every queued message has been written to its log file."""
+    if _writer is not None and _writer.pid == os.getpid():
+        _writer.flush()
+
+def close():
+    """Write out queued messages and close the open log files.
+
+    Logging again afterwards starts a new writer thread.
+    """
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None and writer.pid == os.getpid():
+        writer.close()
+
+atexit.register(close)
@@ -1,6 +1,8 @@
 import urlparse
 import re
 
+import metrics
+
 
 def extract_category(url):
   """Extracts the 'categories' from a given nytimes url.
@@ -31,12 +33,17 @@ def extract_http(text):
 def parse_urls(text, cache):
   urls = extract_http(text)
   expanded_urls = []
+  hits = 0
   for url in urls:
     if cache.has_key(url):
+      hits += 1
       long_url = cache[url]
       if 'nytimes.com' in long_url:
         expanded_urls.append(long_url.strip())
     else:
       if 'nytimes.com' in url:
         expanded_urls.append(url.strip())
+  if metrics.enabled():
+    metrics.incr('parse_urls.cache_hit', hits)
+    metrics.incr('parse_urls.cache_miss', len(urls) - hits)
   return expanded_urls
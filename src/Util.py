@@ -10,6 +10,10 @@ from datetime import datetime
 from ground_truths import DataSet
 
 import FileLog
+import data_files
+import metrics
+import seed_table
+import vote_data
 
 from constants import _DATA_DIR
 from constants import _DATETIME_FORMAT
@@ -18,6 +22,17 @@ from constants import _CACHE_FILENAME
 
 _LOG_FILE = 'Util.log'
 
+# Bounds of the training set, testing set and whole window, see is_in_*().
+_TRAINING_START = datetime(year=2011, month=9, day=1)
+_TESTING_START = datetime(year=2011, month=11, day=1)
+_TESTING_END = datetime(year=2012, month=1, day=1)
+
+# The same bounds in seconds since the epoch (see vote_data.to_epoch()), for
+# comparing columns of epochs.
+_TRAINING_START_EPOCH = vote_data.to_epoch(_TRAINING_START)
+_TESTING_START_EPOCH = vote_data.to_epoch(_TESTING_START)
+_TESTING_END_EPOCH = vote_data.to_epoch(_TESTING_END)
+
 
 def get_graph_output_dir(output_dir):
   """Assign an output path for the graph(s)."""
@@ -36,6 +51,7 @@ def get_data_dir_name_for(month):
   return '%s/%s_%s' % (_DATA_DIR, year, month)
 
 
+@metrics.timed('load_cache')
 def load_cache():
   """Loads a mapping of short urls to long urls.
   
@@ -44,27 +60,29 @@ def load_cache():
   """
   log('Loading cache...')
   cache = {}
-  with open(_CACHE_FILENAME) as input_file:
+  cache_filename = data_files.find(_CACHE_FILENAME)
+  metrics.add_file(cache_filename)
+  with data_files.open_file(cache_filename) as input_file:
     for line in input_file:
       tokens = line.split('\t')
       short_url = tokens[0]
       long_url = tokens[1]
       cache[short_url] = long_url
+  metrics.add_rows(len(cache))
   return cache
 
 
+@metrics.timed('load_seeds')
 def load_seeds():
-  """Loads the set of seed times for urls from file."""
+  """Loads the set of seed times for urls from file.
+
+  Returns:
+  seeds -- (SeedTable) Usable as a dictionary of url to (seed tweet id, seed
+           user id, seed time), see seed_table.
+  """
   log('Loading seeds.')
-  seeds = {}
-  with open('../data/FolkWisdom/seed_times.tsv') as input_file:
-    for line in input_file:
-      tokens = line.split('\t')
-      seed_tweet_id = tokens[0]
-      seed_user_id = tokens[1]
-      seed_time = datetime.strptime(tokens[2], _DATETIME_FORMAT)
-      url = tokens[3].strip()
-      seeds[url] = (seed_tweet_id, seed_user_id, seed_time)
+  seeds = seed_table.load()
+  metrics.add_rows(len(seeds))
   return seeds
 
 
@@ -77,8 +95,7 @@ def is_in_testing_set(date_time):
   Returns:
   True if the datetime object is within the testing set window, False otherwise.
   """
-  if (date_time >= datetime(year=2011, month=11, day=1)
-      and date_time < datetime(year=2012, month=1, day=1)):
+  if date_time >= _TESTING_START and date_time < _TESTING_END:
     return True
   return False
 
@@ -91,8 +108,7 @@ def is_in_training_set(date_time):
 
   Returns: True if the datetime is within the training set window.
   """
-  if (date_time >= datetime(year=2011, month=9, day=1)
-      and date_time < datetime(year=2011, month=11, day=1)):
+  if date_time >= _TRAINING_START and date_time < _TESTING_START:
     return True
   return False
 
@@ -115,8 +131,7 @@ def is_in_window(date_time):
   Returns:
   True if within the window, False otherwise.
   """
-  if (date_time > datetime(year=2011, month=9, day=1) and
-      date_time < datetime(year=2012, month=1, day=1)):
+  if date_time > _TRAINING_START and date_time < _TESTING_END:
     return True
   return False
 
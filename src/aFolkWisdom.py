@@ -29,6 +29,7 @@ __author__ = 'Chris Moghbel (cmoghbel@cs.ucla.edu)'
 """
 import FileLog
 import Util
+import metrics
 
 import experts
 import user_groups
@@ -46,12 +47,18 @@ from params import _SWITCHED
 from params import _EXCLUDE_TWEETS_WITHIN_DELTA
 from params import _EXCLUDE_RETWEETS
 
-from constants import _TESTING_SET_MONTHS
-
 _GRAPH_DIR = Util.get_graph_output_dir('FolkWisdom/')
 _LOG_FILE = 'aFolkWisdom.log'
 
+# The models whose rankings are used past the urls their precision is
+# calculated for: mixed, compared with the ground truth or written out. The
+# other models are only ranked as far as precision_recall looks.
+_FULL_RANKINGS = ['newsaholics', 'active_users', 'common_users', 'non_experts',
+                  'precision', 'fscore', 'ci', 'ci_1', 'ci_2', 'ci_3',
+                  'super_experts']
+
 
+@metrics.instrument_run('aFolkWisdom')
 def run():
   """Contains the main logic for this analysis."""
   FileLog.set_log_dir()
@@ -64,22 +71,13 @@ def run():
       size_top_news = .10
 
     data_set = DataSet.TESTING
-    retweets = set()
     if _SWITCHED:
       data_set = DataSet.TRAINING
-    if _EXCLUDE_RETWEETS:
-      retweets = ground_truths.find_retweets(_TESTING_SET_MONTHS)
-    log('Num retweets to exclude: %s' % len(retweets))
     gt_rankings = ground_truths.get_gt_rankings(seeds, data_set, category,
                                                 exclude_tweets_within_delta=_EXCLUDE_TWEETS_WITHIN_DELTA,
-                                                retweets=retweets)
+                                                exclude_retweets=_EXCLUDE_RETWEETS)
     log('Num ground_truth_rankings: %s' % len(gt_rankings))
 
-    # Format for use later.
-    ground_truth_url_to_rank = {}
-    for rank, (url, count) in enumerate(gt_rankings):
-      ground_truth_url_to_rank[url] = rank
-
     target_news = ground_truths.find_target_news(gt_rankings, size_top_news)
     log('Size target_news: %s' % len(target_news))
 
@@ -98,7 +96,10 @@ def run():
       log('Num Social Bias Experts: %s' % len(groups.social_bias))
 
       log('Finding rankings with an %s hour delta.' % delta)
-      ranks = rankings.get_rankings(delta, seeds, groups, category, d_num_followers)
+      limit = precision_recall.ranking_limit(gt_rankings)
+      ranks = rankings.get_rankings(delta, seeds, groups, category,
+                                    d_num_followers, limit=limit,
+                                    full=_FULL_RANKINGS)
 
       # Output some interesting info to file
       size_market_unfiltered = '0'
@@ -206,91 +207,25 @@ def run():
         log('[%s] %s\t%s' %(i, url.strip(), count))
 
         
-      market_rank_to_url = {}
-      newsaholic_rank_to_url = {}
-      active_rank_to_url = {}
-      common_rank_to_url = {}
-      expert_p_rank_to_url = {}
-      expert_f_rank_to_url = {}
-      expert_c_rank_to_url = {}
-      expert_s_rank_to_url = {}
-      for rank, (url, count) in enumerate(ranks.newsaholics):
-        newsaholic_rank_to_url[rank] = url
-      for rank, (url, count) in enumerate(ranks.population):
-        market_rank_to_url[rank] = url
-      for rank, (url, count) in enumerate(ranks.active_users):
-        active_rank_to_url[rank] = url
-      for rank, (url, count) in enumerate(ranks.common_users):
-        common_rank_to_url[rank] = url
-      for rank, (url, count) in enumerate(ranks.precision):
-        expert_p_rank_to_url[rank] = url
-      for rank, (url, count) in enumerate(ranks.fscore):
-        expert_f_rank_to_url[rank] = url
-      for rank, (url, count) in enumerate(ranks.ci):
-        expert_c_rank_to_url[rank] = url
-      for rank, (url, count) in enumerate(ranks.super_experts):
-        expert_s_rank_to_url[rank] = url
-
-      population_url_to_rank = {}
-      market_url_to_rank = {}
-      precision_url_to_rank = {}
-      fscore_url_to_rank = {}
-      ci_url_to_rank = {}
-      ci_1_url_to_rank = {}
-      ci_2_url_to_rank = {}
-      ci_3_url_to_rank = {}
-      common_url_to_rank = {}
-      for rank, (url, count) in enumerate(ranks.population):
-        population_url_to_rank[url] = rank
-      for rank, (url, count) in enumerate(ranks.non_experts):
-        market_url_to_rank[url] = rank
-      for rank, (url, count) in enumerate(ranks.precision):
-        precision_url_to_rank[url] = rank
-      for rank, (url, count) in enumerate(ranks.fscore):
-        fscore_url_to_rank[url] = rank
-      for rank, (url, count) in enumerate(ranks.ci):
-        ci_url_to_rank[url] = rank
-      for rank, (url, count) in enumerate(ranks.ci_1):
-        ci_1_url_to_rank[url] = rank
-      for rank, (url, count) in enumerate(ranks.ci_2):
-        ci_2_url_to_rank[url] = rank
-      for rank, (url, count) in enumerate(ranks.ci_3):
-        ci_3_url_to_rank[url] = rank
-      for rank, (url, count) in enumerate(ranks.common_users):
-        common_url_to_rank[url] = rank
-
       precisions, recalls = precision_recall.get_precision_recalls(gt_rankings, ranks)
 
-      mixed_rankings = mixed_model.get_mixed_rankings(market_url_to_rank,
-                                                      precisions.non_experts,
-                                                      precision_url_to_rank,
-                                                      precisions.precision,
-                                                      fscore_url_to_rank,
-                                                      precisions.fscore,
-                                                      ci_url_to_rank,
-                                                      precisions.ci,
-                                                      ground_truth_url_to_rank)
-
-      mixed_inact_rankings = mixed_model.get_mixed_rankings(common_url_to_rank,
-                                                            precisions.common_users,
-                                                            precision_url_to_rank,
-                                                            precisions.precision,
-                                                            fscore_url_to_rank,
-                                                            precisions.fscore,
-                                                            ci_url_to_rank,
-                                                            precisions.ci,
-                                                            ground_truth_url_to_rank)
-
-      mixed_ci_rankings = mixed_model.get_mixed_rankings(market_url_to_rank,
-                                                         precisions.non_experts,
-                                                         ci_1_url_to_rank,
-                                                         precisions.ci_1,
-                                                         ci_2_url_to_rank,
-                                                         precisions.ci_2,
-                                                         ci_3_url_to_rank,
-                                                         precisions.ci_3,
-                                                         ground_truth_url_to_rank)
-                                                         
+      mixed_rankings = mixed_model.get_mixed_rankings(
+          [(ranks.non_experts, precisions.non_experts),
+           (ranks.precision, precisions.precision),
+           (ranks.fscore, precisions.fscore),
+           (ranks.ci, precisions.ci)], gt_rankings)
+
+      mixed_inact_rankings = mixed_model.get_mixed_rankings(
+          [(ranks.common_users, precisions.common_users),
+           (ranks.precision, precisions.precision),
+           (ranks.fscore, precisions.fscore),
+           (ranks.ci, precisions.ci)], gt_rankings)
+
+      mixed_ci_rankings = mixed_model.get_mixed_rankings(
+          [(ranks.non_experts, precisions.non_experts),
+           (ranks.ci_1, precisions.ci_1),
+           (ranks.ci_2, precisions.ci_2),
+           (ranks.ci_3, precisions.ci_3)], gt_rankings)
 
       mixed_precisions, mixed_recalls = precision_recall.calc_precision_recall(gt_rankings, 
                                                                                mixed_rankings)
@@ -310,22 +245,19 @@ def run():
 
       with open('%sranking_comparisons_%s.tsv'
                 % (info_output_dir, run_params_str), 'w') as out_file:
+        # 1 based ranks of each ground truth url, 0 if not ranked.
+        gt_url_ids = gt_rankings.url_ids
+        market_ranks = ranks.non_experts.ranks()[gt_url_ids] + 1
+        precision_ranks = ranks.precision.ranks()[gt_url_ids] + 1
+        ci_ranks = ranks.ci.ranks()[gt_url_ids] + 1
+        fscore_ranks = ranks.fscore.ranks()[gt_url_ids] + 1
+        inactive_crowd_ranks = ranks.common_users.ranks()[gt_url_ids] + 1
         for gt_rank, (gt_url, _) in enumerate(gt_rankings):
-          market_rank = 0
-          precision_rank = 0
-          ci_rank = 0
-          fscore_rank = 0
-          inactive_crowd_rank = 0
-          if gt_url in market_url_to_rank:
-            market_rank = market_url_to_rank[gt_url] + 1
-          if gt_url in precision_url_to_rank:
-            precision_rank = precision_url_to_rank[gt_url] + 1
-          if gt_url in ci_url_to_rank:
-            ci_rank = ci_url_to_rank[gt_url] + 1
-          if gt_url in fscore_url_to_rank:
-            fscore_rank = fscore_url_to_rank[gt_url] + 1
-          if gt_url in common_url_to_rank:
-            inactive_crowd_rank = common_url_to_rank[gt_url] + 1
+          market_rank = market_ranks[gt_rank]
+          precision_rank = precision_ranks[gt_rank]
+          ci_rank = ci_ranks[gt_rank]
+          fscore_rank = fscore_ranks[gt_rank]
+          inactive_crowd_rank = inactive_crowd_ranks[gt_rank]
           line = '%s\t%s\t%s\t%s\t%s\t%s\t%s\n' % (gt_url, gt_rank + 1,
                                                    market_rank,
                                                    inactive_crowd_rank,
@@ -343,61 +275,61 @@ def run():
         for rank, (url, count) in enumerate(ranks.common_users):
           output_file.write('%s\t%s\t(%s,%s)\n'
                             % (url.strip(), count, rank,
-                               ground_truth_url_to_rank[url]))
+                               gt_rankings.rank_of(url)))
       with open('%snewsaholic_rankings_%s.tsv'
                 % (info_output_dir, run_params_str), 'w') as output_file:
         for rank, (url, count) in enumerate(ranks.newsaholics):
           output_file.write('%s\t%s\t(%s,%s)\n'
                             % (url.strip(), count, rank,
-                               ground_truth_url_to_rank[url]))
+                               gt_rankings.rank_of(url)))
       with open('%sactive_user_rankings_%s.tsv'
                 % (info_output_dir, run_params_str), 'w') as output_file:
         for rank, (url, count) in enumerate(ranks.active_users):
           output_file.write('%s\t%s\t(%s,%s)\n'
                             % (url.strip(), count, rank,
-                               ground_truth_url_to_rank[url]))
+                               gt_rankings.rank_of(url)))
       with open('%scommon_user_rankings_%s.tsv'
                 % (info_output_dir, run_params_str), 'w') as output_file:
         for rank, (url, count) in enumerate(ranks.common_users):
           output_file.write('%s\t%s\t(%s,%s)\n'
                             % (url.strip(), count, rank,
-                               ground_truth_url_to_rank[url]))
+                               gt_rankings.rank_of(url)))
       with open('%snonexpert_user_rankings_%s.tsv'
                 % (info_output_dir, run_params_str), 'w') as output_file:
         for rank, (url, count) in enumerate(ranks.non_experts):
           output_file.write('%s\t%s\t(%s,%s)\n'
                             % (url.strip(), count, rank,
-                               ground_truth_url_to_rank[url]))
+                               gt_rankings.rank_of(url)))
       with open('%sexpert_p_user_rankings_%s.tsv'
                 % (info_output_dir, run_params_str), 'w') as output_file:
         for rank, (url, count) in enumerate(ranks.precision):
           output_file.write('%s\t%s\t(%s,%s)\n'
                             % (url.strip(), count, rank,
-                               ground_truth_url_to_rank[url]))
+                               gt_rankings.rank_of(url)))
       with open('%sexpert_f_user_rankings_%s.tsv'
                 % (info_output_dir, run_params_str), 'w') as output_file:
         for rank, (url, count) in enumerate(ranks.fscore):
           output_file.write('%s\t%s\t(%s,%s)\n'
                             % (url.strip(), count, rank,
-                               ground_truth_url_to_rank[url]))
+                               gt_rankings.rank_of(url)))
       with open('%sexpert_c_user_rankings_%s.tsv'
                 % (info_output_dir, run_params_str), 'w') as output_file:
         for rank, (url, count) in enumerate(ranks.ci):
           output_file.write('%s\t%s\t(%s,%s)\n'
                             % (url.strip(), count, rank,
-                               ground_truth_url_to_rank[url]))
+                               gt_rankings.rank_of(url)))
       with open('%sexpert_s_user_rankings_%s.tsv'
                 % (info_output_dir, run_params_str), 'w') as output_file:
         for rank, (url, count) in enumerate(ranks.super_experts):
           output_file.write('%s\t%s\t(%s,%s)\n'
                             % (url.strip(), count, rank,
-                            ground_truth_url_to_rank[url]))
+                            gt_rankings.rank_of(url)))
       with open('%smixed_rankings_%s.tsv'
                 % (info_output_dir, run_params_str), 'w') as output_file:
         for rank, (url, count) in enumerate(mixed_rankings):
           output_file.write('%s\t%s\t(%s,%s)\n'
                             % (url.strip(), count, rank,
-                            ground_truth_url_to_rank[url]))
+                            gt_rankings.rank_of(url)))
 
       with open('../data/FolkWisdom/market_precisions_%s.txt'
                 % run_params_str, 'w') as out_file:
@@ -1,5 +1,6 @@
 import Configuration
 import Util
+import metrics
 
 from MarketDecisionUtils import *
 from matplotlib.ticker import MultipleLocator
@@ -254,6 +255,7 @@ def draw_stability_graph(stabilities, max_y):
     plt.close()
 
 
+@metrics.instrument_run('aMarketDecision')
 def run():
     """Main logic of this analysis.
 
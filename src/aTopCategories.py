@@ -1,5 +1,6 @@
 import FileLog
 import Util
+import metrics
 
 import re
 
@@ -29,6 +30,7 @@ def extract_category(url):
   else:
     return None
 
+@metrics.instrument_run('aTopCategories')
 def run():
   """Main logic for this anlysis.
 
@@ -21,16 +21,19 @@ calculate_user_percentile -- Calculates the percentile to which each user
                              belonds.
 draw_active_users_graph -- Draws the active users graph (graph #1).
 draw_percentage_change_graph -- Draws the percentage change graph (graph #2).
-gather_tweet_counts -- Parses total tweet counts per users from data files.
+gather_tweet_counts -- Gathers total tweet counts per users from the activity
+                       cube.
 output_top_users -- Outputs the top 100 users to tsv file in descending order.
 run -- Main logic.
 
 __author__ = 'Chris Moghbel (cmoghbel@cs.ucla.edu)'
 """
-import os
-
 import Configuration
 import Util
+import activity_cube
+import metrics
+
+import numpy as npy
 
 import matplotlib
 matplotlib.use("Agg")
@@ -38,26 +41,12 @@ matplotlib.use("Agg")
 from matplotlib.ticker import MultipleLocator
 import matplotlib.pyplot as plt
 
-_DATA_DIR = '/dfs/birch/tsv'
-_YEAR = 2011
 _MONTHS = ['09', '10', '11', '12']
 
 _NUM_TOP_USERS_TO_OUTPUT = 100
 
 _GRAPH_DIR = None # defined right after _get_graph_output_dir
 
-_TWEETFILE_TWEET_ID_INDEX = 0
-_TWEETFILE_USER_ID_INDEX = 1
-_TWEETFILE_TWEET_TEXT_INDEX = 2
-_TWEETFILE_CREATED_AT_INDEX = 3
-_TWEETFILE_RETWEETED_INDEX = 4
-_TWEETFILE_RETWEET_COUNT_INDEX = 5
-_TWEETFILE_ORIGIN_USER_ID_INDEX = 6
-_TWEETFILE_ORIGIN_TWEET_ID_INDEX = 7
-_TWEETFILE_SOURCE_INDEX = 8
-_TWEETFILE_FILTER_WORDS_INDEX = 9
-_TWEETFILE_INSERT_TIMESTAMP_INDEX = 10
-
 
 def _get_graph_output_dir():
   """Assign an output path for the graph(s)."""
@@ -233,8 +222,8 @@ def draw_percentage_change_graph(avg_change):
 def gather_tweet_counts():
   """Gathers the num tweets per user.
 
-  This function looks at the tweet files over the period of
-  the month in question, and returns a dictionary of user id
+  This function counts the tweets of the months in question from the
+  activity cube, and returns a dictionary of user id
   to number of tweets. It also returns a similiar dictionary
   for both a training set and a testing set. The training set is defined
   as the first two months, with the testing set being the second two months.
@@ -247,38 +236,23 @@ def gather_tweet_counts():
   id_to_count_testing -- A dictionary mapping user id's to tweet count for the
                          testing set.
   """
-  user_id_to_tweet_count = {}
-  id_to_count_training = {}
-  id_to_count_testing = {}
-  for month in _MONTHS:
-    print 'Parsing %s/%s' % (month, _YEAR)
-    training_dir = '%s/%s_%s' % (_DATA_DIR, _YEAR, month)
-    for filename in os.listdir(training_dir):
-      if '.tweet' in filename and 'http_nyti_ms' in filename:
-        data_file = '%s/%s' % (training_dir, filename)
-        with open(data_file) as in_file:
-          for line in in_file:
-            tokens = line.split('\t')
-            user_id = tokens[_TWEETFILE_USER_ID_INDEX]
-            if user_id_to_tweet_count.has_key(user_id):
-              user_id_to_tweet_count[user_id] += 1
-            else:
-              user_id_to_tweet_count[user_id] = 1
-            if month is _MONTHS[0] or month is _MONTHS[1]:
-              if id_to_count_training.has_key(user_id):
-                id_to_count_training[user_id] += 1
-              else:
-                id_to_count_training[user_id] = 1
-            else:
-              if id_to_count_testing.has_key(user_id):
-                id_to_count_testing[user_id] += 1
-              else:
-                id_to_count_testing[user_id] = 1
+  cube = activity_cube.load()
+  user_ids = cube.user_ids
+  user_id_to_tweet_count = _to_dict(user_ids, cube.tweet_counts(_MONTHS))
+  id_to_count_training = _to_dict(user_ids, cube.tweet_counts(_MONTHS[:2]))
+  id_to_count_testing = _to_dict(user_ids, cube.tweet_counts(_MONTHS[2:]))
                 
   print "Size of users (total): " + str(len(user_id_to_tweet_count.keys()))
   return user_id_to_tweet_count, id_to_count_training, id_to_count_testing
 
 
+def _to_dict(user_ids, counts):
+  """Returns a dictionary of user id (str) to count, for users with a count."""
+  has_count = npy.flatnonzero(counts)
+  return dict(zip([str(user_id) for user_id in user_ids[has_count].tolist()],
+                  counts[has_count].tolist()))
+
+
 def output_top_users(user_id_sorted_by_tweet_count):
   """Outputs the top X users to a tsv file.
   
@@ -295,6 +269,7 @@ def output_top_users(user_id_sorted_by_tweet_count):
       out_file.write(line)
 
 
+@metrics.instrument_run('a_active_users')
 def run():
   """Main logic of this analysis.
 
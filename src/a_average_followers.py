@@ -1,34 +1,34 @@
 import user_groups
+import user_store
+import metrics
 
-from constants import _USER_INFO_FILE_ID_INDEX
-from constants import _USER_INFO_FILE_FOLLOWERS_COUNT_INDEX
+import numpy as npy
 
+
+def _to_array(user_ids):
+  return npy.array([int(user_id) for user_id in user_ids], dtype=npy.int64)
+
+
+@metrics.instrument_run('a_average_followers')
 def run():
 
-  groups = user_groups.get_all_user_groups()
-
-  sum_num_followers_experts = 0
-  sum_num_followers_common = 0
-  sum_num_followers_other = 0
-
-  num_experts = 0
-  num_common = 0
-  num_other = 0
-
-  with open("../data/SocialHubBias/user_info.tsv") as in_file:
-    for line in in_file:
-      tokens = line.split("\t")
-      user_id = tokens[_USER_INFO_FILE_ID_INDEX].strip()
-      num_followers = int(tokens[_USER_INFO_FILE_FOLLOWERS_COUNT_INDEX].strip())
-      if user_id in groups.all_experts:
-        sum_num_followers_experts += num_followers
-        num_experts += 1
-      elif user_id in groups.common_users:
-        sum_num_followers_common += num_followers
-        num_common += 1
-      else:
-        sum_num_followers_other += num_followers
-        num_other += 1
+  groups, _ = user_groups.get_all_user_groups()
+
+  followers = user_store.load_followers()
+  user_ids = followers.user_ids
+  followers_counts = followers.followers_counts
+  is_expert = npy.in1d(user_ids, _to_array(groups.all_experts))
+  is_common = (npy.in1d(user_ids, _to_array(groups.common_users))
+               & ~is_expert)
+  is_other = ~(is_expert | is_common)
+
+  sum_num_followers_experts = int(followers_counts[is_expert].sum())
+  sum_num_followers_common = int(followers_counts[is_common].sum())
+  sum_num_followers_other = int(followers_counts[is_other].sum())
+
+  num_experts = int(is_expert.sum())
+  num_common = int(is_common.sum())
+  num_other = int(is_other.sum())
 
   with open("../data/SocialHubBias/avg_num_followers.tsv", 'w') as out_file:
     out_file.write('experts\t%s\n' % (sum_num_followers_experts / num_experts))
@@ -29,6 +29,7 @@ __author__ = 'Chris Moghbel (cmoghbel@cs.ucla.edu)'
 """
 import FileLog
 import Util
+import metrics
 
 import experts
 import basic_groups
@@ -103,6 +104,7 @@ def calc_precision_recall(gt_rankings, other_rankings):
   return precisions, recalls
 
 
+@metrics.instrument_run('a_crowd_wisdom_def')
 def run():
   """Contains the main logic for this analysis."""
   global _SIZE_TOP_NEWS
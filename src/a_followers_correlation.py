@@ -1,5 +1,6 @@
 import Util
-import crawl_users
+import metrics
+import user_store
 import user_groups
 
 import matplotlib
@@ -44,29 +45,30 @@ def get_user_precisions():
   return user_id_to_precision
 
 
+@metrics.instrument_run('a_followers_correlation')
 def run():
-  users = crawl_users.load_user_info()
-  groups = user_groups.get_all_user_groups()
+  followers = user_store.load_followers()
+  groups, _ = user_groups.get_all_user_groups()
   user_id_to_precision = get_user_precisions()
 
-  num_followers = []
+  experts = [user_id for user_id in groups.all_experts
+             if user_id in user_id_to_precision]
+  user_ids, followers_counts = followers.lookup(experts)
+  num_followers = followers_counts.tolist()
   precision_scores = []
   awesome_people = []
-  missing = 0
   awesome_people_votes = 0
-  for user in users.values():
-    if user.id in groups.all_experts and user.id in user_id_to_precision:
-      num_followers.append(user.followers_count)
-      precision, num_tweets = user_id_to_precision[user.id]
-      precision_scores.append(precision)
-      if precision >= .5 and num_tweets > 7 and user.followers_count > 1254:
-        awesome_people.append(user)
-        awesome_people_votes += num_tweets
-    else:
-      missing += 1
-
-  for user in awesome_people:
-    print user.screen_name
+  for user_id, followers_count in zip(user_ids.tolist(), num_followers):
+    precision, num_tweets = user_id_to_precision[str(user_id)]
+    precision_scores.append(precision)
+    if precision >= .5 and num_tweets > 7 and followers_count > 1254:
+      awesome_people.append(str(user_id))
+      awesome_people_votes += num_tweets
+  missing = len(followers) - len(user_ids)
+
+  screen_names = user_store.open_store().screen_names(awesome_people)
+  for user_id in awesome_people:
+    print screen_names.get(user_id)
   print 'Number of awesome people: %s' % len(awesome_people)
   print 'Number of votes awesome people: %s' % awesome_people_votes
   print 'Missing: %s' % missing
@@ -3,11 +3,12 @@ import experts
 import basic_groups
 import ground_truths
 import Util
+import metrics
+import vote_data
+import vote_buckets
 from ground_truths import DataSet
 
-from constants import _TIMEDELTAS_FILE_DELTA_INDEX
-from constants import _TIMEDELTAS_FILE_URL_INDEX 
-from constants import _TIMEDELTAS_FILE_USER_ID_INDEX
+import numpy as npy
 
 from params import _DELTAS
 from params import _SIZE_EXPERTS
@@ -18,35 +19,12 @@ _LOG_FILE = 'a_hour_thresholds.log'
 _DATA_DIR = '../data/HourThresholds/'
 _BREAKDOWN = False
 
-# enum Expert type
-class ExpertGroup:
-  precision = None
-  fscore = None
-  ci = None
-  union = None
-
-class GroupCount:
-  population = 0
-  common = 0
-  union = 0
-  other = 0
-
-  non_experts = 0
-
-  precision = 0
-  fscore = 0
-  ci = 0
-
-  def add(self, gc):
-    self.population += gc.population
-    self.common += gc.common
-    self.union += gc.union
-    self.other += gc.other
-    self.non_experts += gc.non_experts
-    self.precision += gc.precision
-    self.fscore += gc.fscore
-    self.ci += gc.ci
+# The groups the votes of each hour are broken down by, as written out.
+_GROUPS = ['population', 'non_experts', 'experts', 'common', 'precision',
+           'fscore', 'ci']
 
+
+@metrics.instrument_run('a_hour_thresholds')
 def run():
 
   Util.ensure_dir_exist(_DATA_DIR)
@@ -59,6 +37,19 @@ def run():
   target_news = ground_truths.find_target_news(gt_rankings, _SIZE_TOP_NEWS)
   log('Size target_news: %s' % len(target_news))
 
+  # The votes for target news, after the seed tweet.
+  votes = vote_data.load()
+  rows = npy.concatenate([votes.rows_of_url(url) for url in target_news]
+                         or [npy.array([], dtype=npy.int64)])
+  rows = rows[votes.delta[rows] > 0]
+  metrics.add_rows(len(rows))
+  total_num_tweets = len(rows)
+  deltas = votes.delta[rows]
+  num_hours = 0
+  if len(rows):
+    num_hours = deltas.max() // _NUM_SEC_PER_HOUR + 1
+  edges = npy.arange(num_hours + 1) * _NUM_SEC_PER_HOUR
+
   for delta in _DELTAS:
     (num_users, newsaholics,
      active_users, common_users) = basic_groups.group_users(delta, category)
@@ -69,92 +60,50 @@ def run():
     log('Num users (population): %s' % len(population))
 
     # -- Get experts --
-    ExpertGroup.precision = experts.select_experts_precision(
+    experts_precision = experts.select_experts_precision(
         newsaholics.union(active_users), num_users, delta, _SIZE_EXPERTS,
         category)
-    ExpertGroup.fscore = experts.select_experts_fscore(len(target_news),
+    experts_fscore = experts.select_experts_fscore(len(target_news),
                                                    num_users,
                                                    delta, _SIZE_EXPERTS,
                                                    category)
-    ExpertGroup.ci = experts.select_experts_ci(num_users, delta, _SIZE_EXPERTS,
+    experts_ci = experts.select_experts_ci(num_users, delta, _SIZE_EXPERTS,
                                            category)
-    ExpertGroup.union = experts.select_all_experts(ExpertGroup.precision,
-                                             ExpertGroup.fscore,
-                                             ExpertGroup.ci)
+    experts_union = experts.select_all_experts(experts_precision,
+                                               experts_fscore,
+                                               experts_ci)
 
-    log('Num experts (precision): %s' % len(ExpertGroup.precision))
-    log('Num experts (fscore): %s' % len(ExpertGroup.fscore))
-    log('Num experts (ci): %s' % len(ExpertGroup.ci))
-    log('Num all experts: %s' % len(ExpertGroup.union))
+    log('Num experts (precision): %s' % len(experts_precision))
+    log('Num experts (fscore): %s' % len(experts_fscore))
+    log('Num experts (ci): %s' % len(experts_ci))
+    log('Num all experts: %s' % len(experts_union))
 
-    non_experts = population.difference(ExpertGroup.union)
+    non_experts = population.difference(experts_union)
     log('Num non_experts: %s' % len(non_experts))
 
-    # other_users = population.difference(all_experts).difference(common_users)
-
-
     # -- counting --
+    (everyone, is_expert, is_common, is_precision, is_fscore,
+     is_ci) = vote_buckets.memberships(votes.user_id[rows],
+                                       [None, experts_union, common_users,
+                                        experts_precision, experts_fscore,
+                                        experts_ci]).T
+    # Non experts are all the other voters, whether in population or not.
+    members = npy.column_stack([everyone, ~is_expert, is_expert,
+                                is_common & ~is_expert, is_precision,
+                                is_fscore, is_ci])
+    counts = vote_buckets.count(deltas, edges, members)
+    # Only the hours with votes are written out.
+    hours = npy.flatnonzero(counts[:, 0])
+    percentages = vote_buckets.cumulative_percentages(counts[hours],
+                                                      total_num_tweets)
 
-    total_num_tweets = 0 
-    hour_to_num_tweets = {}
-    with open('../data/FolkWisdom/time_deltas.tsv') as in_file:
-      for line in in_file:
-        tokens = line.split('\t')
-        time_delta_in_sec = int(tokens[_TIMEDELTAS_FILE_DELTA_INDEX])
-        url = tokens[_TIMEDELTAS_FILE_URL_INDEX].strip()
-        user_id = tokens[_TIMEDELTAS_FILE_USER_ID_INDEX]
-
-        if time_delta_in_sec > 0 and url in target_news:
-          current_hour = time_delta_in_sec / _NUM_SEC_PER_HOUR
-          total_num_tweets += 1
-
-          if current_hour not in hour_to_num_tweets:
-            hour_to_num_tweets[current_hour] = GroupCount()
-          gcount = hour_to_num_tweets[current_hour]
-
-          gcount.population += 1
-          if user_id in ExpertGroup.union:
-            gcount.union += 1
-            if user_id in ExpertGroup.precision:
-              gcount.precision += 1
-            if user_id in ExpertGroup.fscore:
-              gcount.fscore += 1
-            if user_id in ExpertGroup.ci:
-              gcount.ci += 1
-          else:
-            gcount.non_experts += 1
-            if user_id in common_users:
-              gcount.common += 1
-            
-            #  print >> sys.stderr, 'Error, a user in expert union but not belongs to any expert group'
-
-          # elif user_id in common_users:
-          #   gcount.common += 1
-          # else :
-          #   gcount.other += 1
-
-          # if user_id in non_experts:
-          #   gcount.non_experts += 1
-
-    gcount = GroupCount()  
     with open(_DATA_DIR + 'hour_thresholds_%s.tsv' % delta, 'w') as out_file:
-      for hour in hour_to_num_tweets.keys():
-        gc = hour_to_num_tweets[hour]
-        gcount.add(gc)
-        percentage = (gcount.population / float(total_num_tweets)) * 100.0
-        percentage_common = (gcount.common / float(total_num_tweets)) * 100.0
-        percentage_other = (gcount.other / float(total_num_tweets)) * 100.0
-        percentage_experts = (gcount.union / float(total_num_tweets)) * 100.0
-        percentage_non_experts = (gcount.non_experts / float(total_num_tweets)) * 100.0
-        
-        out_file.write('%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\n' % (hour, percentage,
-                                                             percentage_non_experts,
-                                                             percentage_experts,
-                                                             percentage_common,
-                                                             (gcount.precision / float(total_num_tweets)) * 100.0,
-                                                             (gcount.fscore / float(total_num_tweets)) * 100.0,
-                                                             (gcount.ci / float(total_num_tweets)) * 100.0))
-    log('hour\tpopulation\tnon_experts\texperts\tcommon\tprecision\tfscore\tci')
+      for hour, hour_percentages in zip(hours.tolist(), percentages.tolist()):
+        out_file.write('\t'.join([str(hour)]
+                                 + [str(percentage) for percentage
+                                    in hour_percentages]) + '\n')
+    log('hour\t%s' % '\t'.join(_GROUPS))
+
 
 def log(message):
   """Helper method to modularize the format of log messages.
@@ -9,8 +9,10 @@ a 'surge' right after nyt tweets in some graphs.
 __author__ = 'Chris Moghbel (cmoghbel@cs.ucla.edu)'
 """
 import Util
+import metrics
 import FileLog
 import ground_truths
+import vote_data
 import crawl_users
 from ground_truths import DataSet
 
@@ -154,22 +156,21 @@ def find_additional_info(url, user_info, delta):
   """
   log('Finding addtional information for: %s with delta %s...' % (url, delta))
   additional_info = {}
-  with open('../data/FolkWisdom/time_deltas.tsv', 'r') as in_file:
-    for line in in_file:
-      tokens = line.split('\t')
-      tweet_delta = int(tokens[_TIMEDELTAS_FILE_DELTA_INDEX])
-      if tweet_delta < (delta * 3600):
-        tweet_url = tokens[_TIMEDELTAS_FILE_URL_INDEX]
-        if tweet_url == url:
-          tweet_author_id = tokens[_TIMEDELTAS_FILE_USER_ID_INDEX]
-          if tweet_author_id in user_info:
-            user = user_info[tweet_author_id]
-            additional_info[tweet_author_id] = (user.followers_count,
-                                                user.screen_name,
-                                                tweet_delta / 60)
+  votes = vote_data.load()
+  rows = votes.rows_of_url(url)
+  rows = rows[votes.delta[rows] < (delta * 3600)]
+  for tweet_author_id, tweet_delta in zip(votes.user_id[rows].tolist(),
+                                          votes.delta[rows].tolist()):
+    tweet_author_id = str(tweet_author_id)
+    if tweet_author_id in user_info:
+      user = user_info[tweet_author_id]
+      additional_info[tweet_author_id] = (user.followers_count,
+                                          user.screen_name,
+                                          tweet_delta / 60)
   return sorted(additional_info.items(), key=lambda x: x[1][0], reverse=True)
 
 
+@metrics.instrument_run('a_rate_increase')
 def run():
   """Main logic for this analysis."""
   if _MAIN_ANALYSIS:
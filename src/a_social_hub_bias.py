@@ -4,12 +4,13 @@ __author__ = 'Chris Moghbel (cmoghbel@cs.ucla.edu)
 """
 import FileLog
 import Util
+import metrics
 import crawl_users
+import user_store
 import ground_truths
 import basic_groups
 import experts
 import os
-import tweepy
 
 from ground_truths import DataSet
 
@@ -23,20 +24,6 @@ _LOG_FILE = 'a_social_hub_bias.log'
 _OUTPUT_DIR = '../data/SocialHubBias/'
 
 
-def load_bad_users():
-  """Loads a set of 'blacklisted' user ids from disk."""
-  log('Loading bad users...')
-  Util.ensure_dir_exist(_OUTPUT_DIR)
-  bad_users = set()
-  if not os.path.exists(_OUTPUT_DIR + 'bad_users.tsv'):
-    return bad_users
-  with open(_OUTPUT_DIR + 'bad_users.tsv') as in_file:
-    for line in in_file:
-      user_id = line.strip()
-      bad_users.add(user_id)
-  return user_id
-
-
 def get_user_groups(delta, category=None):
   seeds = Util.load_seeds()
 
@@ -73,9 +60,6 @@ def sample_user_group(group, sample_size):
 
 
 def find_users_to_crawl():
-  user_info = crawl_users.load_user_info()
-  user_ids_already_crawled = user_info.keys()
-  bad_users = load_bad_users()
   experts, newsaholics, active_users, common_users = get_user_groups(_DELTA)
 
   sample_size = round(len(newsaholics.union(active_users).union(common_users)) * _SAMPLE_SIZE)
@@ -85,11 +69,14 @@ def find_users_to_crawl():
   common_users_sample = sample_user_group(common_users, sample_size)
 
   users_to_crawl = experts.union(newsaholics_sample).union(active_users_sample).union(common_users_sample)
-  users_to_crawl = users_to_crawl.difference(bad_users).difference(user_ids_already_crawled)
+  # Leave out users already crawled or known to be bad.
+  store = user_store.open_store(crawl_users._OUTPUT_DIR)
+  users_to_crawl = store.frontier(users_to_crawl)
 
   return users_to_crawl
 
 
+@metrics.instrument_run('a_social_hub_bias')
 def run():
   """The main logic of this analysis."""
   global _OUTPUT_DIR # pylint: disable-msg=W0603
@@ -105,9 +92,8 @@ def run():
       while len(users_to_crawl) > 10:
         users_to_crawl.pop()
 
-    api = tweepy.API()
     log('Crawling %s users...' % len(users_to_crawl))
-    crawl_users.get_user_info(api, users_to_crawl)
+    crawl_users.crawl_user_info(users_to_crawl)
 
   log('Analysis done!')
   
@@ -6,16 +6,14 @@ __author__ = 'Chris Moghbel (cmoghbel@cs.ucla.edu)'
 """
 import FileLog
 import Util
-import URLUtil
+import metrics
 import ground_truths
+import tweet_facts
 from ground_truths import DataSet
 
-import os
 import sys
 import re
 
-from datetime import datetime
-
 import numpy as npy
 
 import matplotlib
@@ -23,20 +21,9 @@ matplotlib.use("Agg")
 
 import matplotlib.pyplot as plt
 
-from constants import _TIMEDELTAS_FILE_TWEET_ID_INDEX
-from constants import _TIMEDELTAS_FILE_DELTA_INDEX
-
-from constants import _TWEETFILE_TWEET_ID_INDEX
-from constants import _TWEETFILE_CREATED_AT_INDEX
-from constants import _TWEETFILE_RETWEET_COUNT_INDEX
-from constants import _TWEETFILE_SOURCE_INDEX
-from constants import _TWEETFILE_TWEET_TEXT_INDEX
-
 from constants import _DEVICE_FILE_DEVICE_INDEX
 from constants import _DEVICE_FILE_PERCENT1_INDEX
 
-from constants import _DATETIME_FORMAT
-from constants import _WINDOW_MONTHS
 from constants import _DELTAS
 
 _SIZE_TOP_NEWS = .02
@@ -113,108 +100,77 @@ def draw_graph(top_sorted, original_dict, retweet_dict, param_str):
   plt.close()
 
 
-def find_device_counts(max_delta, deltas, top_news, cache):
-  """Finds the number of tweets by each source device.
+def find_device_counts(facts, max_deltas, top_news):
+  """Finds the number of tweets by each source device, for every max delta.
 
-  * To achieve no filtering by delta, pass in sys.maxint.
+  Tweets are grouped by (max delta, device) in one pass over the tweet facts.
+  To achieve no filtering by delta, pass in sys.maxint as a max delta.
+
+  Keyword Arguments:
+  facts -- (TweetFacts) The tweet facts, see tweet_facts.load().
+  max_deltas -- (List) Max deltas, in hours.
+  top_news -- (Set) Urls of the top news.
 
   Returns:
-  Dictionary of source device string to pair of (count, percentage).
-  e.g. {'Twitter for iPhone': (1100, 10.0) ...} for all, top, origin,
-  and retweets.
+  Dictionary of max delta to the dictionaries of source device string to pair
+  of (count, percentage), e.g. {'Twitter for iPhone': (1100, 10.0) ...}, for
+  all, original, retweets and top.
   """
+  devices = facts.sources.tolist()
+  num_devices = len(devices)
+
+  # If the url is in the top news, count the tweet. Note we do not limit this
+  # by delta.
+  rows = facts.url_rows()
+  rows = rows[facts.in_window(rows)]
+  rows = rows[facts.urls_bitmap(top_news)[facts.url_id[rows]]]
+  top_counts = npy.bincount(facts.source_id[rows], minlength=num_devices)
+
+  # Tweets we weren't able to parse a url from have no delta, so lets ignore
+  # them.
+  rows = facts.tweet_rows()
+  rows = rows[facts.in_window(rows) & facts.has_delta(rows)]
+  metrics.add_rows(len(rows))
+  # Need to convert to hours
+  hours = facts.delta[rows] // 3600
+  retweet = facts.retweet_count[rows] > 0
+
+  # A tweet counts for every max delta past its hours.
+  sorted_max_deltas = sorted(max_deltas)
+  first_delta = npy.searchsorted(sorted_max_deltas, hours, side='right')
+  cells = first_delta * (2 * num_devices) + retweet * num_devices
+  cells += facts.source_id[rows]
+  counts = npy.bincount(cells, minlength=(len(sorted_max_deltas) + 1)
+                        * 2 * num_devices)
+  counts = npy.cumsum(counts.reshape(-1, 2, num_devices), axis=0)
+
   device_counts = {}
-  all_count = 0
-  device_counts_top = {}
-  top_count = 0
-  device_counts_original = {}
-  original_count = 0
-  device_counts_retweets = {}
-  retweet_count = 0
-  for month in _WINDOW_MONTHS:
-    log('Finding device counts for month %s and delta %s.' % (month, max_delta))
-    dir_name = Util.get_data_dir_name_for(month) 
-    for filename in os.listdir(dir_name):
-      if '.tweet' in filename and 'http_nyti_ms' in filename:
-        data_file = '%s/%s' % (dir_name, filename)
-        with open(data_file) as input_file:
-          for line in input_file:
-            tokens = line.split('\t')
-            created = datetime.strptime(tokens[_TWEETFILE_CREATED_AT_INDEX],
-                                        _DATETIME_FORMAT)
-            if Util.is_in_window(created):
-              tweet_id = tokens[_TWEETFILE_TWEET_ID_INDEX]
-              source_device = tokens[_TWEETFILE_SOURCE_INDEX]
-              retweet = bool(int(tokens[_TWEETFILE_RETWEET_COUNT_INDEX]))
-
-              # If the url is in the top news, increment the count. Note
-              # we do not limit this by delta.
-              tweet_text = tokens[_TWEETFILE_TWEET_TEXT_INDEX]
-              urls = URLUtil.parse_urls(tweet_text, cache)
-              for url in urls:
-                if url in top_news:
-                  top_count += 1
-                  if source_device in device_counts_top:
-                    device_counts_top[source_device] += 1
-                  else:
-                    device_counts_top[source_device] = 1
-
-              # If we don't see the tweet_id in the timedeltas file, we weren't
-              # able to parse a url from the tweet text, so lets ignore it by
-              # setting default delta to sys.maxint
-              delta = sys.maxint
-              if tweet_id in deltas:
-                delta = deltas[tweet_id]
-              if delta < max_delta: 
-                all_count += 1
-                if source_device in device_counts:
-                  device_counts[source_device] += 1
-                else:
-                  device_counts[source_device] = 1
-                if retweet:
-                  retweet_count += 1
-                  if source_device in device_counts_retweets:
-                    device_counts_retweets[source_device] += 1
-                  else:
-                    device_counts_retweets[source_device] = 1
-                else:
-                  original_count += 1
-                  if source_device in device_counts_original:
-                    device_counts_original[source_device] += 1
-                  else:
-                    device_counts_original[source_device] = 1
-
-  for device, count in device_counts_original.items():
-    device_total = device_counts[device]
-    device_counts_original[device] = (count,
-                                      (float(count) / original_count) * 100,
-                                      (float(count) / device_total) * 100)
-  for device, count in device_counts_retweets.items():
-    device_total = device_counts[device]
-    device_counts_retweets[device] = (count,
-                                      (float(count) / retweet_count) * 100,
-                                      (float(count) / device_total) * 100)
-  for device, count in device_counts.items():
-    device_counts[device] = (count, (float(count) / all_count) * 100)
-  for device, count in device_counts_top.items():
-    device_counts_top[device] = (count, (float(count) / top_count) * 100)
-
-  return (device_counts, device_counts_original, device_counts_retweets,
-          device_counts_top)
-
-
-def find_deltas():
-  """Loads a map of tweet_id to delta values."""
-  log('Finding deltas...')
-  tweet_id_to_delta = {}
-  with open('../data/FolkWisdom/time_deltas.tsv') as in_file:
-    for line in in_file:
-      tokens = line.split('\t')
-      tweet_id = tokens[_TIMEDELTAS_FILE_TWEET_ID_INDEX]
-      # Need to convert to hours
-      delta = int(tokens[_TIMEDELTAS_FILE_DELTA_INDEX]) / 3600
-      tweet_id_to_delta[tweet_id] = delta 
-  return tweet_id_to_delta
+  for i, max_delta in enumerate(sorted_max_deltas):
+    original_counts, retweet_counts = counts[i]
+    device_counts[max_delta] = (
+        _to_percentages(devices, original_counts + retweet_counts),
+        _to_percentages(devices, original_counts, original_counts
+                        + retweet_counts),
+        _to_percentages(devices, retweet_counts, original_counts
+                        + retweet_counts),
+        _to_percentages(devices, top_counts))
+  return device_counts
+
+
+def _to_percentages(devices, counts, device_totals=None):
+  """Returns the dictionary of device to (count, percentage of all counts),
+  plus the percentage of the device's total if device_totals is given, for
+  the devices with a count.
+  """
+  total = counts.sum()
+  device_counts = {}
+  for i in npy.flatnonzero(counts):
+    count = int(counts[i])
+    percentages = ((float(count) / total) * 100,)
+    if device_totals is not None:
+      percentages += ((float(count) / device_totals[i]) * 100,)
+    device_counts[devices[i]] = (count,) + percentages
+  return device_counts
     
 
 def load_data(param_str):
@@ -340,27 +296,27 @@ def _get_param_str(delta):
   return '_%s' % delta
 
 
+@metrics.instrument_run('a_source_device')
 def run():
   """Main logic for this analysis."""
   FileLog.set_log_dir()
   Util.ensure_dir_exist(_OUTPUT_DIR)
   if _REGENERATE_DATA:
-    deltas = find_deltas()
-    cache = Util.load_cache()
+    facts = tweet_facts.load()
     seeds = Util.load_seeds()
 
     # Find top news
-    param_str = '_t%s' % (int(_SIZE_TOP_NEWS * 100))
     gts = ground_truths.get_gt_rankings(seeds, DataSet.ALL)
     top_news = ground_truths.find_target_news(gts, _SIZE_TOP_NEWS)
 
     # Do analysis for all delta, including sys.max to do analysis with no delta.
-    for delta in [sys.maxint] + _DELTAS:
+    max_deltas = [sys.maxint] + _DELTAS
+    device_counts = find_device_counts(facts, max_deltas, top_news)
+    for delta in max_deltas:
       param_str = _get_param_str(delta) 
 
       (all_counts, original_counts,
-       retweet_counts, top_counts) = find_device_counts(delta, deltas, top_news,
-                                                        cache)
+       retweet_counts, top_counts) = device_counts[delta]
 
       (sorted_all_counts, sorted_original_counts,
        sorted_retweet_counts, sorted_top_counts) = sort_data(all_counts,
@@ -1,15 +1,15 @@
 import FileLog
 import Util
+import metrics
 import basic_groups
+import common_user_groups
 import experts
 import ground_truths
-from datetime import timedelta
+import vote_data
+import vote_buckets
 from ground_truths import DataSet
 
-from constants import _TIMEDELTAS_FILE_URL_INDEX
-from constants import _TIMEDELTAS_FILE_DELTA_INDEX
-from constants import _TIMEDELTAS_FILE_CATEGORY_INDEX
-from constants import _TIMEDELTAS_FILE_USER_ID_INDEX
+import numpy as npy
 
 _CATEGORIES = []
 # Comment categories in/out individually as needed.
@@ -27,231 +27,90 @@ _SIZE_EXPERTS = .10
 _LOG_FILE = 'a_time_constraint.log'
 
 
-def category_matches(desired_category, tweet_category):
-  if desired_category:
-    if tweet_category == desired_category: return True
-    else: return False
-  else: return True
+# Votes are bucketed by delta (in seconds); the votes of each bucket are
+# broken down by the groups selected for the delta (in hours) of the bucket.
+_BUCKET_EDGES = [0, 3600, 4 * 3600, 8 * 3600, npy.inf]
+_BUCKET_LABELS = ['0 - 1 hours', '1 - 4 hours', '4 - 8 hours', '8 - + hours']
+_BUCKET_DELTAS = [1, 4, 8]
 
+# The groups counted for each delta.
+_GROUPS = ['all', 'common', 'experts_p', 'experts_f', 'experts_ci',
+           'experts_all', 'cu_1', 'cu_2', 'cu_3']
 
-def find_counts(seeds, category=None):
-  num_0_1 = 0
-  num_1_4 = 0
-  num_4_8 = 0
-  num_after_8 = 0
-  num_total = 0
-
-  log('Finding common users delta 1...')
-  (num_users_1, newsaholics_1, active_users_1, common_users_1) = basic_groups.group_users(1, category)
-  log('Finding common users delta 4...')
-  (num_users_4, newsaholics_4, active_users_4, common_users_4) = basic_groups.group_users(4, category)
-  log('Finding common users delta 8...')
-  (num_users_8, newsaholics_8, active_users_8, common_users_8) = basic_groups.group_users(8, category)
-
-  copy_common_users_1 = set(common_users_1)
-  common_users_1_1 = set()
-  common_users_1_2 = set()
-  common_users_1_3 = set()
-  count = 0
-  while len(copy_common_users_1) > 0:
-    if count % 3 == 0:
-      common_users_1_1.add(copy_common_users_1.pop())
-    elif count % 3 == 1:
-      common_users_1_2.add(copy_common_users_1.pop())
-    elif count % 3 == 2:
-      common_users_1_3.add(copy_common_users_1.pop())
-    count += 1
 
-  copy_common_users_4 = set(common_users_4)
-  common_users_4_1 = set()
-  common_users_4_2 = set()
-  common_users_4_3 = set()
-  count = 0
-  while len(copy_common_users_4) > 0:
-    if count % 3 == 0:
-      common_users_4_1.add(copy_common_users_4.pop())
-    elif count % 3 == 1:
-      common_users_4_2.add(copy_common_users_4.pop())
-    elif count % 3 == 2:
-      common_users_4_3.add(copy_common_users_4.pop())
-    count += 1
+def select_groups(delta, size_target_news, category=None):
+  """Selects the groups of _GROUPS for a delta.
 
-  copy_common_users_8 = set(common_users_8)
-  common_users_8_1 = set()
-  common_users_8_2 = set()
-  common_users_8_3 = set()
-  count = 0
-  while len(copy_common_users_8) > 0:
-    if count % 3 == 0:
-      common_users_8_1.add(copy_common_users_8.pop())
-    elif count % 3 == 1:
-      common_users_8_2.add(copy_common_users_8.pop())
-    elif count % 3 == 2:
-      common_users_8_3.add(copy_common_users_8.pop())
-    count += 1
+  Returns:
+  groups -- List of sets of user ids, in _GROUPS order (None for all users).
+  """
+  log('Finding common users delta %s...' % delta)
+  (num_users, newsaholics,
+   active_users, common_users) = basic_groups.group_users(delta, category)
+  common_user_buckets = common_user_groups.group_users(common_users, 3)
+  for i, common_user_bucket in enumerate(common_user_buckets):
+    log('Size Common Users %s (delta %s): %s'
+        % (i + 1, delta, len(common_user_bucket)))
+
+  log('Finding precision experts delta %s...' % delta)
+  experts_p = experts.select_experts_precision(newsaholics.union(active_users),
+                                               num_users, delta,
+                                               _SIZE_EXPERTS, category)
+  log('Finding fscore experts delta %s...' % delta)
+  experts_f = experts.select_experts_fscore(size_target_news, num_users,
+                                            delta, _SIZE_EXPERTS, category)
+  log('Finding ci experts delta %s...' % delta)
+  experts_ci = experts.select_experts_ci(num_users, delta, _SIZE_EXPERTS,
+                                         category)
+  experts_all = experts_p.union(experts_f).union(experts_ci)
+  return ([None, common_users, experts_p, experts_f, experts_ci, experts_all]
+          + list(common_user_buckets))
 
-  log('Size Common Users 1 (delta 1): %s' % len(common_users_1_1))
-  log('Size Common Users 2 (delta 1): %s' % len(common_users_1_2))
-  log('Size Common Users 3 (delta 1): %s' % len(common_users_1_3))
-  log('Size Common Users 1 (delta 4): %s' % len(common_users_4_1))
-  log('Size Common Users 2 (delta 4): %s' % len(common_users_4_2))
-  log('Size Common Users 3 (delta 4): %s' % len(common_users_4_3))
-  log('Size Common Users 1 (delta 8): %s' % len(common_users_8_1))
-  log('Size Common Users 2 (delta 8): %s' % len(common_users_8_2))
-  log('Size Common Users 3 (delta 8): %s' % len(common_users_8_3))
 
-  log('Finding precision experts delta 1...')
-  experts_p_1 = experts.select_experts_precision(newsaholics_1.union(active_users_1),
-                                                 num_users_1, 1, _SIZE_EXPERTS, category)
-  log('Finding precision experts delta 1...')
-  experts_p_4 = experts.select_experts_precision(newsaholics_4.union(active_users_4),
-                                                 num_users_4, 4, _SIZE_EXPERTS, category)
-  log('Finding precision experts delta 1...')
-  experts_p_8 = experts.select_experts_precision(newsaholics_8.union(active_users_8),
-                                                 num_users_8, 8, _SIZE_EXPERTS, category)
+def find_counts(seeds, category=None):
+  """Counts the votes of each delta bucket, by the groups of its delta.
 
+  Returns:
+  counts -- (npy.array) Number of votes, bucket x group (see _GROUPS) for the
+            buckets of _BUCKET_DELTAS. The last bucket (8+ hours) counts all
+            users only.
+  num_total -- The number of votes counted.
+  """
   log('Finding ground truths...')
   gt_rankings = ground_truths.get_gt_rankings(seeds, DataSet.TESTING, category)
   log('Finding target news...')
   target_news = ground_truths.find_target_news(gt_rankings, _SIZE_EXPERTS)
-  size_target_news = len(target_news)
-
-  log('Finding fscore experts delta 1...')
-  experts_f_1 = experts.select_experts_fscore(size_target_news, num_users_1,
-                                              1, _SIZE_EXPERTS, category)
-  log('Finding fscore experts delta 4...')
-  experts_f_4 = experts.select_experts_fscore(size_target_news, num_users_4,
-                                              4, _SIZE_EXPERTS, category)
-  log('Finding fscore experts delta 8...')
-  experts_f_8 = experts.select_experts_fscore(size_target_news, num_users_8,
-                                              8, _SIZE_EXPERTS, category)
-
-  log('Finding ci experts delta 1...')
-  experts_ci_1 = experts.select_experts_ci(num_users_1, 1, _SIZE_EXPERTS, category)
-  log('Finding ci experts delta 4...')
-  experts_ci_4 = experts.select_experts_ci(num_users_4, 4, _SIZE_EXPERTS, category)
-  log('Finding ci experts delta 8...')
-  experts_ci_8 = experts.select_experts_ci(num_users_8, 8, _SIZE_EXPERTS, category)
-
-  experts_all_1 = experts_p_1.union(experts_f_1).union(experts_ci_1)
-  experts_all_4 = experts_p_4.union(experts_f_4).union(experts_ci_4)
-  experts_all_8 = experts_p_8.union(experts_f_8).union(experts_ci_8)
 
-  num_0_1_common = 0
-  num_1_4_common = 0
-  num_4_8_common = 0
-  
-  num_cu_1_1 = 0
-  num_cu_1_2 = 0
-  num_cu_1_3 = 0
-
-  num_cu_4_1 = 0
-  num_cu_4_2 = 0
-  num_cu_4_3 = 0
-
-  num_cu_8_1 = 0
-  num_cu_8_2 = 0
-  num_cu_8_3 = 0
-
-  num_0_1_experts_p = 0
-  num_1_4_experts_p = 0
-  num_4_8_experts_p = 0
-
-  num_0_1_experts_f = 0
-  num_1_4_experts_f = 0
-  num_4_8_experts_f = 0
-
-  num_0_1_experts_ci = 0
-  num_1_4_experts_ci = 0
-  num_4_8_experts_ci = 0
-
-  num_0_1_experts_all = 0
-  num_1_4_experts_all = 0
-  num_4_8_experts_all = 0
+  groups = []
+  for delta in _BUCKET_DELTAS:
+    groups.extend(select_groups(delta, len(target_news), category))
 
   log('Finding counts...')
-  with open('../data/FolkWisdom/time_deltas.tsv') as input_file:
-    for line in input_file:
-
-      # parse line
-      tokens = line.split('\t')
-      url = tokens[_TIMEDELTAS_FILE_URL_INDEX]
-      time_delta = timedelta(seconds=int(tokens[_TIMEDELTAS_FILE_DELTA_INDEX]))
-      tweet_category = tokens[_TIMEDELTAS_FILE_CATEGORY_INDEX].strip()
-      user_id = tokens[_TIMEDELTAS_FILE_USER_ID_INDEX]
-
-      if url in seeds:
-        (seed_tweet_id, seed_user_id, seed_time) = seeds[url]
-
-        if Util.is_in_testing_set(seed_time) and category_matches(category,
-                                                                  tweet_category):
-            num_total += 1
-            if time_delta < timedelta(hours=1):
-              num_0_1 += 1
-              if user_id in common_users_1:
-                num_0_1_common += 1
-              if user_id in experts_p_1:
-                num_0_1_experts_p += 1
-              if user_id in experts_f_1:
-                num_0_1_experts_f += 1
-              if user_id in experts_ci_1:
-                num_0_1_experts_ci += 1
-              if user_id in experts_all_1:
-                num_0_1_experts_all += 1
-              if user_id in common_users_1_1:
-                num_cu_1_1 += 1
-              if user_id in common_users_1_2:
-                num_cu_1_2 += 1
-              if user_id in common_users_1_3:
-                num_cu_1_3 += 1
-            elif time_delta >= timedelta(hours=1) and time_delta < timedelta(hours=4):
-              num_1_4 += 1
-              if user_id in common_users_4:
-                num_1_4_common += 1
-              if user_id in experts_p_4:
-                num_1_4_experts_p += 1
-              if user_id in experts_f_4:
-                num_1_4_experts_f += 1
-              if user_id in experts_ci_4:
-                num_1_4_experts_ci += 1
-              if user_id in experts_all_4:
-                num_1_4_experts_all += 1
-              if user_id in common_users_4_1:
-                num_cu_4_1 += 1
-              if user_id in common_users_4_2:
-                num_cu_4_2 += 1
-              if user_id in common_users_4_3:
-                num_cu_4_3 += 1
-            elif time_delta >= timedelta(hours=4) and time_delta < timedelta(hours=8):
-              num_4_8 += 1
-              if user_id in common_users_8:
-                num_4_8_common += 1
-              if user_id in experts_p_8:
-                num_4_8_experts_p += 1
-              if user_id in experts_f_8:
-                num_4_8_experts_f += 1
-              if user_id in experts_ci_8:
-                num_4_8_experts_ci += 1
-              if user_id in experts_all_8:
-                num_4_8_experts_all += 1
-              if user_id in common_users_8_1:
-                num_cu_8_1 += 1
-              if user_id in common_users_8_2:
-                num_cu_8_2 += 1
-              if user_id in common_users_8_3:
-                num_cu_8_3 += 1
-            else:
-              num_after_8 += 1
-
-  return (num_0_1, num_0_1_common, num_0_1_experts_p, num_0_1_experts_f, num_0_1_experts_ci, num_0_1_experts_all,
-          num_1_4, num_1_4_common, num_1_4_experts_p, num_1_4_experts_f, num_1_4_experts_ci, num_1_4_experts_all,
-          num_4_8, num_4_8_common, num_4_8_experts_p, num_4_8_experts_f, num_4_8_experts_ci, num_4_8_experts_all,
-          num_cu_1_1, num_cu_1_2, num_cu_1_3,
-          num_cu_4_1, num_cu_4_2, num_cu_4_3,
-          num_cu_8_1, num_cu_8_2, num_cu_8_3,
-          num_after_8, num_total)
-
-
+  votes = vote_data.load()
+  seed_start, seed_end = ground_truths.seed_window(DataSet.TESTING)
+  rows = votes.scan(None, seed_start, seed_end, category)
+  metrics.add_rows(len(rows))
+  members = vote_buckets.memberships(votes.user_id[rows], groups)
+  all_counts = vote_buckets.count(votes.delta[rows], _BUCKET_EDGES, members)
+
+  # Bucket i is broken down by the groups of _BUCKET_DELTAS[i].
+  num_groups = len(_GROUPS)
+  counts = npy.zeros((len(_BUCKET_LABELS), num_groups), dtype=npy.int64)
+  for i in range(len(_BUCKET_DELTAS)):
+    counts[i] = all_counts[i, i * num_groups:(i + 1) * num_groups]
+  counts[-1, 0] = all_counts[-1, 0]
+  return counts, len(rows)
+
+
+def write_counts(out_file, title, underline, labels, counts, num_total):
+  """Writes a section of counts, with the percentage of num_total of each."""
+  out_file.write('\n%s\n%s\n' % (title, underline))
+  for label, count in zip(labels, counts):
+    out_file.write('%s: %s (%s percent of total)\n'
+                   % (label, count, (100 * (float(count) / num_total))))
+
+
+@metrics.instrument_run('a_time_constraint')
 def run():
   FileLog.set_log_dir()
   output_dir = '../data/TimeConstraint/'
@@ -263,113 +122,37 @@ def run():
     run_params_str = '%s' % (category)
     log('Preforming analysis: Cateogry = %s' % run_params_str)
 
-    # Find counts.
-    (num_0_1, num_0_1_common, num_0_1_experts_p, num_0_1_experts_f, num_0_1_experts_ci, num_0_1_experts_all,
-     num_1_4, num_1_4_common, num_1_4_experts_p, num_1_4_experts_f, num_1_4_experts_ci, num_1_4_experts_all,
-     num_4_8, num_4_8_common, num_4_8_experts_p, num_4_8_experts_f, num_4_8_experts_ci, num_4_8_experts_all,
-     num_cu_1_1, num_cu_1_2, num_cu_1_3,
-     num_cu_4_1, num_cu_4_2, num_cu_4_3,
-     num_cu_8_1, num_cu_8_2, num_cu_8_3,
-     num_after_8, num_total) = find_counts(seeds, category)
-
-    # Calculate non-common users.
-    num_0_1_noncommon = num_0_1 - num_0_1_common
-    num_1_4_noncommon = num_1_4 - num_1_4_common
-    num_4_8_noncommon = num_4_8 - num_4_8_common
+    counts, num_total = find_counts(seeds, category)
+    column = dict((name, i) for i, name in enumerate(_GROUPS))
+    num_buckets = len(_BUCKET_DELTAS)
+    hour_labels = _BUCKET_LABELS[:num_buckets]
+    common_counts = counts[:num_buckets, column['common']]
 
     with open('%s%s.txt' % (output_dir, run_params_str), 'w') as out_file:
       out_file.write('Common Users\n')
       out_file.write('------------\n')
-      out_file.write('0 - 1 hours: %s (%s percent of total)\n'
-                     % (num_0_1_common, (100 * (float(num_0_1_common) / num_total))))
-      out_file.write('1 - 4 hours: %s (%s percent of total)\n'
-                     % (num_1_4_common, (100 * (float(num_1_4_common) / num_total))))
-      out_file.write('4 - 8 hours: %s (%s percent of total)\n'
-                     % (num_4_8_common, (100 * (float(num_4_8_common) / num_total))))
-
-      out_file.write('\nCommon Users (Breakdown, Delta 1)\n')
-      out_file.write('------------\n')
-      out_file.write('Common Users 1:  %s (%s percent of total)\n'
-                     % (num_cu_1_1, (100 * (float(num_cu_1_1) / num_total))))
-      out_file.write('Common Users 2: %s (%s percent of total)\n'
-                     % (num_cu_1_2, (100 * (float(num_cu_1_2) / num_total))))
-      out_file.write('Common Users 3: %s (%s percent of total)\n'
-                     % (num_cu_1_3, (100 * (float(num_cu_1_1) / num_total))))
-      out_file.write('\nCommon Users (Breakdown, Delta 4)\n')
-
-      out_file.write('\nCommon Users (Breakdown, Delta 4)\n')
-      out_file.write('------------\n')
-      out_file.write('Common Users 1:  %s (%s percent of total)\n'
-                     % (num_cu_4_1, (100 * (float(num_cu_4_1) / num_total))))
-      out_file.write('Common Users 2: %s (%s percent of total)\n'
-                     % (num_cu_4_2, (100 * (float(num_cu_4_2) / num_total))))
-      out_file.write('Common Users 3: %s (%s percent of total)\n'
-                     % (num_cu_4_3, (100 * (float(num_cu_4_3) / num_total))))
-
-      out_file.write('\nCommon Users (Breakdown, Delta 8)\n')
-      out_file.write('------------\n')
-      out_file.write('Common Users 1:  %s (%s percent of total)\n'
-                     % (num_cu_8_1, (100 * (float(num_cu_8_1) / num_total))))
-      out_file.write('Common Users 2: %s (%s percent of total)\n'
-                     % (num_cu_8_2, (100 * (float(num_cu_8_2) / num_total))))
-      out_file.write('Common Users 3: %s (%s percent of total)\n'
-                     % (num_cu_8_3, (100 * (float(num_cu_8_3) / num_total))))
-
-      out_file.write('\nNon-Common Users\n')
-      out_file.write('----------------\n')
-      out_file.write('0 - 1 hours: %s (%s percent of total)\n'
-                     % (num_0_1_noncommon, (100 * (float(num_0_1_noncommon) / num_total))))
-      out_file.write('1 - 4 hours: %s (%s percent of total)\n'
-                     % (num_1_4_noncommon, (100 * (float(num_1_4_noncommon) / num_total))))
-      out_file.write('4 - 8 hours: %s (%s percent of total)\n'
-                     % (num_4_8_noncommon, (100 * (float(num_4_8_noncommon) / num_total))))
-
-      out_file.write('\nExpert Precision Users\n')
-      out_file.write('----------------\n')
-      out_file.write('0 - 1 hours: %s (%s percent of total)\n'
-                     % (num_0_1_experts_p, (100 * (float(num_0_1_experts_p) / num_total))))
-      out_file.write('1 - 4 hours: %s (%s percent of total)\n'
-                     % (num_1_4_experts_p, (100 * (float(num_1_4_experts_p) / num_total))))
-      out_file.write('4 - 8 hours: %s (%s percent of total)\n'
-                     % (num_4_8_experts_p, (100 * (float(num_4_8_experts_p) / num_total))))
-
-      out_file.write('\nExpert Fscore Users\n')
-      out_file.write('----------------\n')
-      out_file.write('0 - 1 hours: %s (%s percent of total)\n'
-                     % (num_0_1_experts_f, (100 * (float(num_0_1_experts_f) / num_total))))
-      out_file.write('1 - 4 hours: %s (%s percent of total)\n'
-                     % (num_1_4_experts_f, (100 * (float(num_1_4_experts_f) / num_total))))
-      out_file.write('4 - 8 hours: %s (%s percent of total)\n'
-                     % (num_4_8_experts_f, (100 * (float(num_4_8_experts_f) / num_total))))
-
-      out_file.write('\nExpert CI Users\n')
-      out_file.write('----------------\n')
-      out_file.write('0 - 1 hours: %s (%s percent of total)\n'
-                     % (num_0_1_experts_ci, (100 * (float(num_0_1_experts_ci) / num_total))))
-      out_file.write('1 - 4 hours: %s (%s percent of total)\n'
-                     % (num_1_4_experts_ci, (100 * (float(num_1_4_experts_ci) / num_total))))
-      out_file.write('4 - 8 hours: %s (%s percent of total)\n'
-                     % (num_4_8_experts_ci, (100 * (float(num_4_8_experts_ci) / num_total))))
-
-      out_file.write('\nExpert All Users\n')
-      out_file.write('----------------\n')
-      out_file.write('0 - 1 hours: %s (%s percent of total)\n'
-                     % (num_0_1_experts_all, (100 * (float(num_0_1_experts_all) / num_total))))
-      out_file.write('1 - 4 hours: %s (%s percent of total)\n'
-                     % (num_1_4_experts_all, (100 * (float(num_1_4_experts_all) / num_total))))
-      out_file.write('4 - 8 hours: %s (%s percent of total)\n'
-                     % (num_4_8_experts_all, (100 * (float(num_4_8_experts_all) / num_total))))
-
-      out_file.write('\nAll Users\n')
-      out_file.write('---------\n')
-      out_file.write('0 - 1 hours: %s (%s percent of total)\n'
-                     % (num_0_1, (100 * (float(num_0_1) / num_total))))
-      out_file.write('1 - 4 hours: %s (%s percent of total)\n'
-                     % (num_1_4, (100 * (float(num_1_4) / num_total))))
-      out_file.write('4 - 8 hours: %s (%s percent of total)\n'
-                     % (num_4_8, (100 * (float(num_4_8) / num_total))))
-      out_file.write('8 - + hours: %s (%s percent of total)\n'
-                     % (num_after_8, (100 * (float(num_after_8) / num_total))))
+      for label, count in zip(hour_labels, common_counts):
+        out_file.write('%s: %s (%s percent of total)\n'
+                       % (label, count, (100 * (float(count) / num_total))))
+
+      for i, delta in enumerate(_BUCKET_DELTAS):
+        write_counts(out_file, 'Common Users (Breakdown, Delta %s)' % delta,
+                     '------------',
+                     ['Common Users %s' % (j + 1) for j in range(3)],
+                     counts[i, column['cu_1']:column['cu_3'] + 1], num_total)
+
+      write_counts(out_file, 'Non-Common Users', '----------------',
+                   hour_labels,
+                   counts[:num_buckets, column['all']] - common_counts,
+                   num_total)
+      for title, name in [('Expert Precision Users', 'experts_p'),
+                          ('Expert Fscore Users', 'experts_f'),
+                          ('Expert CI Users', 'experts_ci'),
+                          ('Expert All Users', 'experts_all')]:
+        write_counts(out_file, title, '----------------', hour_labels,
+                     counts[:num_buckets, column[name]], num_total)
+      write_counts(out_file, 'All Users', '---------', _BUCKET_LABELS,
+                   counts[:, column['all']], num_total)
 
       out_file.write('\ntotal: %s' % num_total);
 
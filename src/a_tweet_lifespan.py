@@ -9,6 +9,11 @@ __author__ = 'Chris Moghbel (cmoghbel@cs.ucla.edu)'
 """
 import FileLog
 import Util
+import metrics
+import vote_data
+from ranking import Ranking
+
+import numpy as npy
 
 import matplotlib
 matplotlib.use("Agg")
@@ -16,18 +21,9 @@ matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 import matplotlib.axis
 
-from datetime import datetime
-
 _LOG_FILE = 'a_top_tweets.log'
 _GRAPH_DIR = Util.get_graph_output_dir('TweetLifespan/')
 
-_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
-
-_TIMEDELTAS_FILE_TWEET_ID_INDEX = 0
-_TIMEDELTAS_FILE_USER_ID_INDEX = 1 
-_TIMEDELTAS_FILE_DELTA_INDEX = 2
-_TIMEDELTAS_FILE_URL_INDEX = 3
-_TIMEDELTAS_FILE_CATEGORY_INDEX = 4
 
 _SIZE_TOP_NEWS = .02
 
@@ -45,56 +41,59 @@ def _determine_hours(low, high, step_percent):
   """
   hours = []
   for i in range(low, high):
-    hours += range(10**i, 10**(i+1), max(1, int(10**(i+1) * step_percent)))
+    step = 10.0**(i+1) * step_percent
+    if i >= 0:
+      # Whole hours from 1 hour on.
+      step = max(1, int(step))
+    hours += npy.arange(10.0**i, 10.0**(i+1), step).tolist()
   return hours
 
 _AGGREGATE_HOURS = _determine_hours(-5, 6, .01)
 
 
-def aggr_by_hour(time_of_90s, top_news):
+def aggr_by_hour(time_of_90s, top_news, hours=None):
   """Finds the percentage of inactive news at each time period.
 
-  Calculates for both all news and top news.
+  Calculates for both all news and top news. The times are searched for every
+  hour at once, so hours can be as fine grained as needed, e.g. minutes over
+  months: npy.arange(1, 60 * 24 * 120) / 60.0
 
   Keyword Arguments:
-  time_of_90s -- The time at which 90% of tweets occured.
-  top_news -- A set of urls representing the top news.
+  time_of_90s -- (url_ids, times) The hours after which 90% of the tweets of
+                 each url had occured, sorted by time, see find_90_times().
+  top_news -- (npy.array) The url ids of the top news.
+  hours -- The hours to aggregate at, _AGGREGATE_HOURS if None.
 
   Returns:
   aggregates -- A list of percentages of all news that is inactive.
   aggregates_top -- List of percentages of top news that is inactive.
   """
   log('Aggregating number dead stories by hours...')
-  aggregates = []
-  aggregates_top = []
-  for aggregate_hour in _AGGREGATE_HOURS:
-    num_dead_stories = 0
-    num_dead_stories_top = 0
-    for url, delta in time_of_90s:
-      if delta < aggregate_hour:
-        num_dead_stories += 1
-        if url in top_news:
-          num_dead_stories_top += 1
-    aggregates.append(num_dead_stories)
-    aggregates_top.append(num_dead_stories_top)
-  aggregates = [int((float(aggregate) / len(time_of_90s)) * 100)
-                for aggregate in aggregates]
+  if hours is None:
+    hours = _AGGREGATE_HOURS
+  url_ids, times = time_of_90s
+  times_top = times[npy.in1d(url_ids, top_news)]
+  # A story is dead at an hour if it got 90% of its tweets before it.
+  num_dead_stories = npy.searchsorted(times, hours, side='left')
+  num_dead_stories_top = npy.searchsorted(times_top, hours, side='left')
+  aggregates = [int((float(aggregate) / len(times)) * 100)
+                for aggregate in num_dead_stories.tolist()]
   aggregates_top = [int((float(aggregate) / len(top_news)) * 100)
-                    for aggregate in aggregates_top]
+                    for aggregate in num_dead_stories_top.tolist()]
   return aggregates, aggregates_top
 
 
 def calc_90_percent_count(counts):
-  """Updates dictionary of 100% counts to 90% counts.
-
-  NOTE: This method updates the argument in place.
+  """Calculates the 90% counts of 100% counts.
 
   Keyword Arguments:
-  counts -- Dictionary to update in place.
+  counts -- (npy.array) The tweet count of each url id.
+
+  Returns:
+  counts_90 -- (npy.array) 90% of each count, rounded half away from zero.
   """
   log('Calculating 90% counts...')
-  for url, count in counts.items():
-    counts[url] = round(.9 * count)
+  return npy.floor(.9 * counts + .5).astype(npy.int64)
 
 
 def draw_graph(aggregates, aggregates_top):
@@ -131,144 +130,73 @@ def draw_graph(aggregates, aggregates_top):
   plt.close()
 
 
-def find_total_tweet_count(seeds):
+def find_total_tweet_count():
   """Finds the total tweet count (100%) for each url.
 
   Finds only for urls whose seed times are within the desired window.
 
-  Keyword Arguments:
-  seeds -- Seeds times for every url.
-
   Returns:
-  counts -- A dictionary of url to tweet count.
+  counts -- (npy.array) The tweet count of each url id, 0 for urls outside
+            the window.
   """
   log('Finding total tweet counts...')
-  counts = {}
-  with open('../data/FolkWisdom/time_deltas.tsv') as in_file:
-    for line in in_file:
-      tokens = line.split('\t')
-      url = tokens[_TIMEDELTAS_FILE_URL_INDEX]
-      seed_time = seeds[url]
-      if is_in_window(seed_time):
-        if url in counts:
-          counts[url] += 1
-        else:
-          counts[url] = 1
-  return counts
+  votes = vote_data.load()
+  counts = votes.vote_counts()
+  return npy.where(in_window(votes.url_seed_epoch), counts, 0)
 
 
 def find_90_times(counts_90):
   """Finds the times at which 90% of tweets have occured.
 
+  The votes of each url are sorted by delta, so the 90% vote of a url is its
+  count_90'th one; they are all looked up at once.
+
   Keyword Arguments:
-  counts_90 -- A dictionary of url to 90% tweet count.
+  counts_90 -- (npy.array) The 90% tweet count of each url id.
 
   Returns:
-  times_sorted -- A list of (url, datetime) pairs, sorted by earliest time.
+  (url_ids, times) -- Arrays of the urls that died and the hours after which
+                      they did, sorted by earliest time.
   """
   log('Finding times at which death (90%) occurs...')
-  times = {}
-  counts = {}
-  with open('../data/FolkWisdom/time_deltas.tsv') as in_file:
-    for line in in_file:
-      tokens = line.split('\t')
-      url = tokens[_TIMEDELTAS_FILE_URL_INDEX].strip()
-      if url in counts_90: # Need to make sure its in the right window.
-        if url in counts:
-          counts[url] += 1
-        else:
-          counts[url] = 1
-        if counts[url] == counts_90[url]:
-          seconds_delta = int(tokens[_TIMEDELTAS_FILE_DELTA_INDEX])
-          time_of_90 = seconds_delta / 3600.0
-          times[url] = time_of_90
-
-  times_sorted = sorted(times.items(), key=lambda x: x[1])
-  return times_sorted
-
-
-def get_gt_rankings(seeds, category=None):
-  """Generate the ground truth rankings.
-  
-  Keyword Arguments:
-  seeds -- Dictionary of url to first time seen.
-  category -- Category to generate ground truths for, None for all news.
+  votes = vote_data.load()
+  url_ids = npy.flatnonzero((counts_90 > 0)
+                            & (counts_90 <= votes.vote_counts()))
+  rows = votes.url_rows[votes.url_offsets[url_ids] + counts_90[url_ids] - 1]
+  times = votes.delta[rows] / 3600.0
+  order = npy.argsort(times, kind='mergesort')
+  return url_ids[order], times[order]
 
-  Returns:
-  gt_rankings -- A list of (url, count) pairs in ranked order.
-  """
-  log('Getting ground truth rankings...')
-  gt_tweet_counts = {}
-  with open('../data/FolkWisdom/time_deltas.tsv') as input_file:
-    for line in input_file:
-      tokens = line.split('\t')
-      url = tokens[_TIMEDELTAS_FILE_URL_INDEX]
-      if url in seeds:
-        seed_time = seeds[url]
-        if is_in_window(seed_time):
-          if category:
-            url_category = tokens[_TIMEDELTAS_FILE_CATEGORY_INDEX].strip()
-            if url_category == category:
-              if url in gt_tweet_counts:
-                gt_tweet_counts[url] += 1
-              else:
-                gt_tweet_counts[url] = 1
-          else:
-            if url in gt_tweet_counts:
-              gt_tweet_counts[url] += 1
-            else:
-              gt_tweet_counts[url] = 1
-
-  gt_rankings = sorted(gt_tweet_counts.items(), key=lambda x: x[1],
-                       reverse=True)
-  return gt_rankings
-
-
-def get_top_news(truths, percentage):
-  """Generates a set of top news.
+
+def get_top_news(counts, percentage):
+  """Generates the top news.
 
   Keyword Arguments:
-  truths -- Dictionary of rank to url and count representing ground truths.
+  counts -- (npy.array) The tweet count of each url id, 0 for urls that are
+            not news.
   percentage -- Percentage of total news to make top news, as a float.
 
   Returns:
-  top_news -- A set of urls representing the top news.
+  top_news -- (npy.array) The url ids of the top news.
   """
   log('Getting top news at %s percent...' % int(percentage * 100))
-  num_top_news = int(len(truths) * percentage)
-  top_news = set()
-  for i in range(num_top_news):
-    url, _ = truths[i]
-    top_news.add(url)
-  return top_news
+  num_top_news = int(npy.count_nonzero(counts) * percentage)
+  truths = Ranking.from_url_counts(counts, limit=num_top_news)
+  return truths.url_ids
 
 
-def is_in_window(date_time):
-  """Checks if the given datetime is within the desired window.
+def in_window(seed_epochs):
+  """Checks which seed times are within the desired window.
 
   Keyword Arguments:
-  date_time -- The datetime object to take.
+  seed_epochs -- (npy.array) Seed times, see vote_data.to_epoch(). Urls
+                 without a seed have a negative seed time, outside the window.
   
   Returns:
-  True if within the window, False otherwise.
+  A boolean array, True where within the window.
   """
-  if (date_time > datetime(year=2011, month=9, day=1) and
-      date_time < datetime(year=2012, month=1, day=1)):
-    return True
-  return False
-
-
-def load_seeds():
-  """Loads the set of seed times for urls from file."""
-  log('Loading seeds...')
-  seeds = {}
-  with open('../data/FolkWisdom/seed_times.tsv') as input_file:
-    for line in input_file:
-      tokens = line.split('\t')
-      url = tokens[3].strip()
-      seed_time = datetime.strptime(tokens[2], _DATETIME_FORMAT)
-      seeds[url] = seed_time
-  return seeds
+  return ((seed_epochs > Util._TRAINING_START_EPOCH)
+          & (seed_epochs < Util._TESTING_END_EPOCH))
 
 
 def log(message):
@@ -280,15 +208,13 @@ def log(message):
   FileLog.log(_LOG_FILE, message)
 
 
+@metrics.instrument_run('a_tweet_lifespan')
 def run():
   """Contains the main logic for this analysis."""
   FileLog.set_log_dir()
-  seeds = load_seeds()
-  counts = find_total_tweet_count(seeds)
-  calc_90_percent_count(counts)
-  time_of_90s = find_90_times(counts)
-  truths = get_gt_rankings(seeds)
-  top_news = get_top_news(truths, _SIZE_TOP_NEWS)
+  counts = find_total_tweet_count()
+  time_of_90s = find_90_times(calc_90_percent_count(counts))
+  top_news = get_top_news(counts, _SIZE_TOP_NEWS)
   aggregates, aggregates_top = aggr_by_hour(time_of_90s, top_news)
   draw_graph(aggregates, aggregates_top)
 
@@ -9,6 +9,7 @@ __author__ = 'Chris Moghbel (cmoghbel@cs.ucla.edu)'
 """
 import FileLog
 import Util
+import metrics
 
 import matplotlib
 matplotlib.use("Agg")
@@ -65,6 +66,7 @@ def log(message):
   FileLog.log(_LOG_FILE, message)
 
 
+@metrics.instrument_run('a_tweet_popularity')
 def run():
   """Contains the main logic for this analysis."""
   FileLog.set_log_dir()
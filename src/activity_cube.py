@@ -0,0 +1,220 @@
+"""
+Sparse cube of the activity of every user.
+
+Activity analyses count the tweets of each user over some months, limited to
+a delta and a category: a_active_users counts all tweets per month,
+folk_wisdom_training sorts users by their votes for each (delta, category),
+and basic_groups splits those users into tiers. ActivityCube holds the counts
+of every user x month x delta (in hours) x category cell with a tweet, built
+once from the tweet facts (see tweet_facts), so each of those questions is a
+vectorized reduction over the cells:
+
+  cube = activity_cube.load()
+  user_ids, counts = cube.ranked_users(['09', '10'], max_delta=4,
+                                       category='world')
+
+The cells are cached as .npy files under data/FolkWisdom/activity_cube/,
+rebuilt along with the tweet facts, and within a process load() always
+returns the same ActivityCube.
+
+Columns (one row per non empty cell):
+user_index -- (int32) Index of the user into user_ids.
+month_id -- (int8) Index of the month into months.
+hour -- (int32) Whole hours between the tweets and the seed tweet of their url,
+        -1 for tweets without a delta.
+category_id -- (int16) Index of the url's category into categories.
+tweets -- (int32) Number of tweets in the cell.
+votes -- (int32) Number of (tweet, url) votes in the cell, as counted by
+         folk_wisdom_training.
+
+user_ids -- Sorted array of the distinct user ids.
+months -- The months of the tweet files.
+categories -- Sorted array of the distinct categories ('None' for urls
+              without one).
+"""
+import FileLog
+import URLUtil
+import Util
+import columnar
+import metrics
+import tweet_facts
+
+import os
+import numpy as npy
+
+from constants import _FULL_SET_MONTHS
+
+_CACHE_DIR = '../data/FolkWisdom/activity_cube/'
+_LOG_FILE = 'activity_cube.log'
+_COLUMNS = ['user_index', 'month_id', 'hour', 'category_id', 'tweets',
+            'votes', 'user_ids', 'months', 'categories']
+_NUM_SEC_PER_HOUR = 3600
+
+# ActivityCube already loaded in this process, by cache directory.
+_loaded = {}
+
+
+class ActivityCube:
+  """Cells of the user activity cube, see module docstring."""
+
+  def __init__(self, columns):
+    self.user_index = columns['user_index']
+    self.month_id = columns['month_id']
+    self.hour = columns['hour']
+    self.category_id = columns['category_id']
+    self.tweets = columns['tweets']
+    self.votes = columns['votes']
+    self.user_ids = columns['user_ids']
+    self.months = columns['months']
+    self.categories = columns['categories']
+
+  def __len__(self):
+    return len(self.user_index)
+
+  def cells(self, months=None, max_delta=None, category=None):
+    """Returns which cells are within the given months, delta and category.
+
+    Keyword Arguments:
+    months -- The months to include, None for all of them.
+    max_delta -- Only include votes less than max_delta hours after the seed,
+                 None for all votes.
+    category -- The category to include, None for all news.
+    """
+    mask = npy.ones(len(self.user_index), dtype=bool)
+    if months is not None:
+      month_ids = npy.flatnonzero(npy.in1d(self.months, list(months)))
+      mask &= npy.in1d(self.month_id, month_ids)
+    if max_delta is not None:
+      mask &= self.hour < max_delta
+    if category:
+      category_ids = npy.flatnonzero(self.categories == category)
+      mask &= npy.in1d(self.category_id, category_ids)
+    return mask
+
+  def vote_counts(self, months=None, max_delta=None, category=None):
+    """Returns the number of votes of each user, indexable like user_ids.
+
+    See cells() for the keyword arguments.
+    """
+    mask = self.cells(months, max_delta, category)
+    return npy.bincount(self.user_index[mask], weights=self.votes[mask],
+                        minlength=len(self.user_ids)).astype(npy.int64)
+
+  def tweet_counts(self, months=None):
+    """Returns the number of tweets of each user, indexable like user_ids.
+
+    Keyword Arguments:
+    months -- The months to include, None for all of them.
+    """
+    mask = self.cells(months)
+    return npy.bincount(self.user_index[mask], weights=self.tweets[mask],
+                        minlength=len(self.user_ids)).astype(npy.int64)
+
+  def ranked_users(self, months=None, max_delta=None, category=None):
+    """Returns the users with votes, most votes first (ties by user id).
+
+    See cells() for the keyword arguments.
+
+    Returns:
+    (user_ids, counts) -- (npy.array<int64>) The user ids and their number of
+                          votes.
+    """
+    return rank(self.user_ids,
+                self.vote_counts(months, max_delta, category))
+
+
+def rank(user_ids, counts):
+  """Returns the user ids and counts of the users with a count, highest first.
+
+  Ties are broken by the order of user_ids.
+  """
+  has_count = npy.flatnonzero(counts)
+  order = has_count[npy.argsort(-counts[has_count], kind='mergesort')]
+  return user_ids[order], counts[order]
+
+
+def is_available(months=_FULL_SET_MONTHS):
+  """Checks that the raw tweet files the cube is built from are there."""
+  return all(os.path.isdir(Util.get_data_dir_name_for(month))
+             for month in months)
+
+
+def load(months=_FULL_SET_MONTHS, cache_dir=_CACHE_DIR, cache=None):
+  """Returns the ActivityCube of the tweet files of the given months.
+
+  Keyword Arguments:
+  months -- The months of tweet files to include.
+  cache_dir -- Directory of the .npy cache of the cells.
+  cache -- Dictionary mapping short-url to long-url, only needed (and loaded
+           if None) when the tweet facts have to be rebuilt.
+  """
+  if cache_dir in _loaded:
+    return _loaded[cache_dir]
+  sources = tweet_facts.source_files(months)
+  cached = columnar.load(cache_dir, sources, _COLUMNS)
+  if cached is None:
+    columns = build(tweet_facts.load(months, cache=cache))
+    try:
+      columnar.save(cache_dir, columns, sources)
+      log('Cached activity cube in %s' % cache_dir)
+    except (IOError, OSError), err:
+      log('Could not cache activity cube in %s: %s' % (cache_dir, err))
+  else:
+    columns, _ = cached
+  activity_cube = ActivityCube(columns)
+  _loaded[cache_dir] = activity_cube
+  return activity_cube
+
+
+@metrics.timed('build_activity_cube')
+def build(facts):
+  """Aggregates the tweet facts into the cells of the cube.
+
+  Keyword Arguments:
+  facts -- (TweetFacts) The tweet facts, see tweet_facts.load().
+
+  Returns:
+  columns -- Dictionary of column name to array.
+  """
+  log('Building activity cube from %s tweet facts...' % len(facts))
+  url_categories = [str(URLUtil.extract_category(url))
+                    for url in facts.urls.tolist()] + ['None']
+  categories, url_category_ids = npy.unique(npy.array(url_categories),
+                                            return_inverse=True)
+  # Rows without a url (url_id -1) get the last entry, 'None'.
+  category_id = url_category_ids[facts.url_id]
+  has_delta = facts.has_delta(npy.arange(len(facts)))
+  hour = npy.where(has_delta, facts.delta // _NUM_SEC_PER_HOUR, -1)
+  user_ids, user_index = npy.unique(facts.user_id, return_inverse=True)
+
+  # Group the rows by cell; the cells come out sorted by their key.
+  rows = npy.lexsort((category_id, hour, facts.month_id, user_index))
+  keys = npy.column_stack([user_index, facts.month_id, hour,
+                           category_id])[rows]
+  is_start = npy.ones(len(rows), dtype=bool)
+  is_start[1:] = (keys[1:] != keys[:-1]).any(axis=1)
+  cell_of_row = npy.cumsum(is_start) - 1
+  num_cells = int(is_start.sum())
+  tweets = npy.bincount(cell_of_row, weights=facts.is_tweet[rows],
+                        minlength=num_cells)
+  votes = npy.bincount(cell_of_row, weights=has_delta[rows],
+                       minlength=num_cells)
+  cells = keys[is_start]
+  return {'user_index': cells[:, 0].astype(npy.int32),
+          'month_id': cells[:, 1].astype(npy.int8),
+          'hour': cells[:, 2].astype(npy.int32),
+          'category_id': cells[:, 3].astype(npy.int16),
+          'tweets': tweets.astype(npy.int32),
+          'votes': votes.astype(npy.int32),
+          'user_ids': user_ids.astype(npy.int64),
+          'months': npy.array(facts.months),
+          'categories': categories}
+
+
+def log(message):
+  """Helper method to modularize the format of log messages.
+
+  Keyword Arguments:
+  message -- A string to log.
+  """
+  FileLog.log(_LOG_FILE, message)
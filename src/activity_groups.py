@@ -0,0 +1,159 @@
+"""
+Groups users by activity using slices of a sorted user id array.
+
+folk_wisdom_training writes user_activity_<delta>_<category>.tsv, the users
+sorted by number of tweets, most active first. load() ranks the same users
+straight from the activity cube (see activity_cube) when the raw tweet files
+are there, and otherwise reads the text file into an int64 array of user ids,
+caching it as columns next to the file. Either way it is done once per process
+for each (delta, category). The grouping functions return slices of such an
+array:
+
+  user_ids = activity_groups.load(delta, category)
+  newsaholics, active_users, common_users = activity_groups.tiers(
+      user_ids, [.02, .25])
+  common_user_buckets = activity_groups.round_robin(common_users, 3)
+
+Slices are turned into sets of user id strings with to_set(), or into a
+boolean bitmap over another array of user ids with to_bitmap().
+"""
+import FileLog
+import activity_cube
+import columnar
+import metrics
+
+import numpy as npy
+
+from constants import _USER_ACTIVITY_FILE_ID_INDEX
+
+from params import _EXCLUDE_RETWEETS
+from params import _SWITCHED
+from params import _TRAINING_SET_MONTHS
+from params import _TESTING_SET_MONTHS
+
+_LOG_FILE = 'activity_groups.log'
+_IN_DIR = '../data/FolkWisdom/'
+_CACHE_DIR = 'activity/'
+
+_loaded = {}  # activity file -> user ids
+
+
+def activity_file(delta, category=None):
+  """Returns the path of the user activity file for a delta and category."""
+  in_dir = _IN_DIR
+  if _SWITCHED:
+    in_dir += 'switched/'
+  if _EXCLUDE_RETWEETS:
+    in_dir += 'no_retweets/'
+  return in_dir + 'user_activity_%s_%s.tsv' % (delta, category)
+
+
+def activity_months():
+  """Returns the months users are ranked by activity over."""
+  if _SWITCHED:
+    return _TESTING_SET_MONTHS
+  return _TRAINING_SET_MONTHS
+
+
+def load(delta, category=None):
+  """Loads the users of an activity file.
+
+  Keyword Arguments:
+  delta -- The time window, in hours.
+  category -- The category, None for all news.
+
+  Returns:
+  user_ids -- (npy.array<int64>) The user ids, most active first.
+  """
+  input_file = activity_file(delta, category)
+  if input_file in _loaded:
+    return _loaded[input_file]
+  if activity_cube.is_available():
+    user_ids, _ = activity_cube.load().ranked_users(activity_months(), delta,
+                                                    category)
+    _loaded[input_file] = user_ids
+    return user_ids
+  cache_dir = (input_file[:input_file.rindex('/') + 1] + _CACHE_DIR
+               + '%s_%s/' % (delta, category))
+  cached = columnar.load(cache_dir, [input_file], ['user_id'])
+  if cached is not None:
+    user_ids = cached[0]['user_id']
+  else:
+    log('Loading %s...' % input_file)
+    with open(input_file) as in_file:
+      user_ids = npy.array([int(line.split('\t')[_USER_ACTIVITY_FILE_ID_INDEX])
+                            for line in metrics.counted(in_file)],
+                           dtype=npy.int64)
+    try:
+      columnar.save(cache_dir, {'user_id': user_ids}, [input_file])
+    except (IOError, OSError), err:
+      log('Could not cache %s in %s: %s' % (input_file, cache_dir, err))
+  _loaded[input_file] = user_ids
+  return user_ids
+
+
+def tiers(user_ids, percentiles):
+  """Splits users into tiers at the given percentiles.
+
+  Matching the original grouping, the user at rank int(num_users * percentile)
+  still belongs to the tier above the cut.
+
+  Keyword Arguments:
+  user_ids -- (npy.array) User ids, most active first.
+  percentiles -- (List<float>) Increasing cut off points, e.g. [.02, .25].
+
+  Returns:
+  (List<npy.array>) len(percentiles) + 1 slices of user_ids.
+  """
+  num_users = len(user_ids)
+  cuts = [min(int(num_users * percentile) + 1, num_users)
+          for percentile in percentiles]
+  starts = [0] + cuts
+  ends = cuts + [num_users]
+  return [user_ids[start:max(start, end)] for start, end in zip(starts, ends)]
+
+
+def even_groups(user_ids, num_groups, group_size):
+  """Splits the first num_groups * group_size users into groups of group_size.
+
+  Groups that would be empty are left out.
+  """
+  group_size = max(group_size, 1)
+  end = min(len(user_ids), num_groups * group_size)
+  return [user_ids[start:start + group_size]
+          for start in range(0, end, group_size)]
+
+
+def round_robin(user_ids, num_groups):
+  """Deals users out to num_groups groups, like cards."""
+  return [user_ids[i::num_groups] for i in range(num_groups)]
+
+
+def to_array(user_ids):
+  """Returns a sorted int64 array of user ids (e.g. from a set of strings)."""
+  return npy.sort(npy.array([int(user_id) for user_id in user_ids],
+                            dtype=npy.int64))
+
+
+def to_set(user_ids):
+  """Returns a set of user id strings, as used for the user groups."""
+  return set([str(user_id) for user_id in user_ids.tolist()])
+
+
+def to_bitmap(user_ids, universe):
+  """Returns a boolean array, True where universe[i] is one of user_ids.
+
+  Keyword Arguments:
+  user_ids -- (npy.array) The group.
+  universe -- (npy.array) User ids, e.g. the user_id column of VoteData.
+  """
+  return npy.in1d(universe, user_ids)
+
+
+def log(message):
+  """Helper method to modularize the format of log messages.
+
+  Keyword Arguments:
+  message -- A string to log.
+  """
+  FileLog.log(_LOG_FILE, message)
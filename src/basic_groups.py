@@ -5,6 +5,10 @@ basic groups.
 __author__ = 'Chris Moghbel (cmoghbel@cs.ucla.edu)'
 """
 import Util
+import ground_truths
+import activity_groups
+from ground_truths import DataSet
+from ranking import Ranking
 
 from datetime import timedelta
 
@@ -17,9 +21,7 @@ from constants import _TIMEDELTAS_FILE_URL_INDEX
 from constants import _TIMEDELTAS_FILE_USER_ID_INDEX
 from constants import _TIMEDELTAS_FILE_DELTA_INDEX
 from constants import _TIMEDELTAS_FILE_CATEGORY_INDEX
-from constants import _USER_ACTIVITY_FILE_ID_INDEX
 
-from params import _EXCLUDE_RETWEETS
 from params import _SWITCHED
 
 _GRAPH_DIR = Util.get_graph_output_dir('FolkWisdom/')
@@ -186,7 +188,7 @@ def gather_tweet_counts(hours, seeds, newsaholics, active, nonexperts_sampled,
   
   Keyword Arguments:
   hours -- The number of hours from the seed time in which to accept votes.
-  seeds -- A dictionary of url to the datetime of it first being seend
+  seeds -- (SeedTable) The seeds, see seed_table.
   Accepts a parameter for a set defining each of the following user groups:
   newsaholics, active users, experts (precision), experts (F-score),
   experts (confidence interval), and experts (super experts).
@@ -203,6 +205,10 @@ def gather_tweet_counts(hours, seeds, newsaholics, active, nonexperts_sampled,
   common_tweet_counts = {}
   nonexpert_tweet_counts = {}
   nonexpert_sampled_tweet_counts = {}
+  data_set = DataSet.TESTING
+  if _SWITCHED:
+    data_set = DataSet.TRAINING
+  seeded_urls = seeds.seeded_urls(*ground_truths.seed_window(data_set))
   with open(_IN_DIR + 'time_deltas.tsv') as input_file:
     for line in input_file:
       tokens = line.split('\t')
@@ -213,59 +219,54 @@ def gather_tweet_counts(hours, seeds, newsaholics, active, nonexperts_sampled,
       if hours:
         max_delta = timedelta(hours=hours)
 
-      if url in seeds:
-        (seed_tweet_id, seed_user_id, seed_time) = seeds[url]
-        in_correct_set = Util.is_in_testing_set(seed_time)
-        if _SWITCHED:
-          in_correct_set = Util.is_in_training_set(seed_time)
-        if in_correct_set:
-
-          if time_delta < max_delta:
-
-            category_matches = True
-            if category:
-              category_matches = False
-              url_category = tokens[_TIMEDELTAS_FILE_CATEGORY_INDEX].strip()
-              if url_category == category:
-                category_matches = True
+      if url in seeded_urls:
+
+        if time_delta < max_delta:
+
+          category_matches = True
+          if category:
+            category_matches = False
+            url_category = tokens[_TIMEDELTAS_FILE_CATEGORY_INDEX].strip()
+            if url_category == category:
+              category_matches = True
              
-            if category_matches:
+          if category_matches:
+
+            # Market
+            if url in market_tweet_counts:
+              market_tweet_counts[url] += 1
+            else:
+              market_tweet_counts[url] = 1
+
+            # Market - experts
+            if user_id not in all_experts:
+              if url in nonexpert_tweet_counts:
+                nonexpert_tweet_counts[url] += 1
+              else:
+                nonexpert_tweet_counts[url] = 1
+
+            if user_id in nonexperts_sampled:
+              if url in nonexpert_sampled_tweet_counts:
+                nonexpert_sampled_tweet_counts[url] += 1
+              else:
+                nonexpert_sampled_tweet_counts[url] = 1
 
-              # Market
-              if url in market_tweet_counts:
-                market_tweet_counts[url] += 1
+            # Other groups
+            if user_id in newsaholics:
+              if url in newsaholic_tweet_counts:
+                newsaholic_tweet_counts[url] += 1
               else:
-                market_tweet_counts[url] = 1
-
-              # Market - experts
-              if user_id not in all_experts:
-                if url in nonexpert_tweet_counts:
-                  nonexpert_tweet_counts[url] += 1
-                else:
-                  nonexpert_tweet_counts[url] = 1
-
-              if user_id in nonexperts_sampled:
-                if url in nonexpert_sampled_tweet_counts:
-                  nonexpert_sampled_tweet_counts[url] += 1
-                else:
-                  nonexpert_sampled_tweet_counts[url] = 1
-
-              # Other groups
-              if user_id in newsaholics:
-                if url in newsaholic_tweet_counts:
-                  newsaholic_tweet_counts[url] += 1
-                else:
-                  newsaholic_tweet_counts[url] = 1
-              elif user_id in active:
-                if url in active_tweet_counts:
-                  active_tweet_counts[url] += 1
-                else:
-                  active_tweet_counts[url] = 1                
+                newsaholic_tweet_counts[url] = 1
+            elif user_id in active:
+              if url in active_tweet_counts:
+                active_tweet_counts[url] += 1
               else:
-                if url in common_tweet_counts:
-                  common_tweet_counts[url] += 1
-                else:
-                  common_tweet_counts[url] = 1                
+                active_tweet_counts[url] = 1                
+            else:
+              if url in common_tweet_counts:
+                common_tweet_counts[url] += 1
+              else:
+                common_tweet_counts[url] = 1                
               
                 
   return (market_tweet_counts, newsaholic_tweet_counts, active_tweet_counts,
@@ -274,7 +275,7 @@ def gather_tweet_counts(hours, seeds, newsaholics, active, nonexperts_sampled,
 
 
 def get_rankings(delta, seeds, newsaholics, active_users, non_experts_sampled,
-                 all_experts, category=None):
+                 all_experts, category=None, limit=None):
   """Gets the true rankings, and ranking as determined by various user groups.
   
   Keyword Arguments:
@@ -284,6 +285,7 @@ def get_rankings(delta, seeds, newsaholics, active_users, non_experts_sampled,
   newsaholics, active users, experts (precision, f-score, confidnce
   interval, and super).
   category -- The category to get rankings for, None for all news.
+  limit -- Only rank the first limit urls of each group, None for all.
   
   Returns:
   Returns rankings for the following user groups:
@@ -296,13 +298,12 @@ def get_rankings(delta, seeds, newsaholics, active_users, non_experts_sampled,
                                                          non_experts_sampled,
                                                          all_experts,
                                                          category)
-  market_rankings = sorted(mtc.items(), key=lambda x: x[1], reverse=True)
-  newsaholic_rankings = sorted(etc.items(), key=lambda x: x[1], reverse=True)
-  active_rankings = sorted(atc.items(), key=lambda x: x[1], reverse=True)
-  common_rankings = sorted(ctc.items(), key=lambda x: x[1], reverse=True)
-  nonexpert_rankings = sorted(netc.items(), key=lambda x: x[1], reverse=True)
-  nonexpert_sampled_rankings = sorted(nestc.items(), key=lambda x: x[1],
-                                      reverse=True)
+  market_rankings = Ranking.from_counts(mtc, limit=limit)
+  newsaholic_rankings = Ranking.from_counts(etc, limit=limit)
+  active_rankings = Ranking.from_counts(atc, limit=limit)
+  common_rankings = Ranking.from_counts(ctc, limit=limit)
+  nonexpert_rankings = Ranking.from_counts(netc, limit=limit)
+  nonexpert_sampled_rankings = Ranking.from_counts(nestc, limit=limit)
   return (market_rankings, newsaholic_rankings, active_rankings,
           common_rankings, nonexpert_rankings, nonexpert_sampled_rankings)
 
@@ -319,31 +320,11 @@ def group_users(delta, category=None):
   common_users -- A python set of user ids for common users, defined as users
   whose rank is lower the 25% as ranked by activity.
   """
-  in_dir = _IN_DIR
-  user_ids_sorted = []
-  if _SWITCHED:
-    in_dir += 'switched/'
-  if _EXCLUDE_RETWEETS:
-    in_dir += 'no_retweets/'
-  input_file = in_dir + 'user_activity_%s_%s.tsv' % (delta, category)
-  with open(input_file) as input_file:
-    for line in input_file:
-      tokens = line.split('\t')
-      user_id = tokens[_USER_ACTIVITY_FILE_ID_INDEX]
-      user_ids_sorted.append(user_id)
-  num_users = len(user_ids_sorted)
-  two_percent = int(num_users * .02)
-  twenty_five_percent = int(num_users * .25)
-  
-  newsaholics = set()
-  active_users = set()
-  common_users = set()
-  for i in range(num_users):
-    user_id = user_ids_sorted[i]
-    if i <= two_percent:
-      newsaholics.add(user_id)
-    elif i <= twenty_five_percent:
-      active_users.add(user_id)
-    else:
-      common_users.add(user_id)
+  user_ids = activity_groups.load(delta, category)
+  newsaholics, active_users, common_users = activity_groups.tiers(user_ids,
+                                                                  [.02, .25])
+  num_users = len(user_ids)
+  newsaholics = activity_groups.to_set(newsaholics)
+  active_users = activity_groups.to_set(active_users)
+  common_users = activity_groups.to_set(common_users)
   return num_users, newsaholics, active_users, common_users
@@ -0,0 +1,386 @@
+"""
+Bootstrap confidence bands for the FolkWisdom precision/recall curves.
+
+aFolkWisdom draws a single precision/recall curve per user group. This module
+resamples and recomputes those curves many times, and reports percentile bands
+around them. Two kinds of resampling are supported:
+
+users -- The members of each group are drawn with replacement, so a user
+         drawn twice counts their votes twice.
+urls -- The news being ranked are drawn with replacement, and the target news
+        are the top of the resampled ground truth.
+
+The votes are read once, through vote_data, into a sparse user x url matrix of
+vote counts (in coordinate form) per group, so a replicate only draws random
+numbers and sums weighted counts with npy.bincount. Replicates are spread over
+a pool of processes, which inherit the matrices when they are forked.
+
+Suggested way to use:
+  bands = bootstrap.bootstrap(delta, groups, gt_rankings, category,
+                              num_replicates=1000, seed=7)
+  bootstrap.write_bands(bands, run_params_str)
+"""
+import FileLog
+import Util
+import metrics
+import vote_data
+import user_groups
+import ground_truths
+import activity_groups
+import shared_dataset
+
+import math
+import multiprocessing
+
+import numpy as npy
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from ground_truths import DataSet
+
+from params import _DELTAS
+from params import _CATEGORIES
+from params import _SIZE_EXPERTS
+from params import _SIZE_TOP_NEWS
+from params import _SWITCHED
+from params import _BOOTSTRAP_REPLICATES
+from params import _BOOTSTRAP_RESAMPLE
+from params import _BOOTSTRAP_SEED
+
+_LOG_FILE = 'bootstrap.log'
+_GRAPH_DIR = Util.get_graph_output_dir('FolkWisdom/')
+
+RESAMPLE_USERS = 'users'
+RESAMPLE_URLS = 'urls'
+
+# The models that count the votes of one group. The weighted models are
+# combinations of these and are not bootstrapped.
+_GROUPS = [name for name, components in user_groups.MODELS.items()
+           if len(components) == 1 and components[0][1] == 1]
+
+_PERCENTILES = [2.5, 50, 97.5]
+_REPLICATES_PER_TASK = 25
+
+# Set up before the pool is created, so the worker processes inherit it.
+_state = None
+
+
+class GroupVotes:
+  """The votes of one group, as a sparse member x url matrix.
+
+  Entry i says member users[i] voted counts[i] times for url urls[i].
+  """
+
+  def __init__(self, num_members, users, urls, counts):
+    self.num_members = num_members
+    self.users = users
+    self.urls = urls
+    self.counts = counts
+
+  def url_counts(self, num_urls, member_weights=None):
+    """Returns the (weighted) number of votes for each url id."""
+    weights = self.counts
+    if member_weights is not None:
+      weights = weights * member_weights[self.users]
+    return npy.bincount(self.urls, weights=weights, minlength=num_urls)
+
+
+def build_group_votes(hours, groups, category=None):
+  """Reads the votes counted for the rankings into a matrix per group.
+
+  Votes are selected like rankings.gather_tweet_counts does: within hours of
+  the seed time, for news seeded in the testing set (training set if
+  switched), and of the given category.
+
+  Returns:
+  (group_votes, num_urls) -- A dictionary of group name to GroupVotes, and the
+                             number of url ids.
+  """
+  votes = vote_data.load()
+  scan_max_delta = None
+  if hours:
+    scan_max_delta = int(math.ceil(hours * 3600)) - 1
+  data_set = DataSet.TESTING
+  if _SWITCHED:
+    data_set = DataSet.TRAINING
+  seed_start, seed_end = ground_truths.seed_window(data_set)
+  rows = votes.scan(scan_max_delta, seed_start, seed_end, category)
+  metrics.add_rows(len(rows))
+
+  # Collapse the votes into (user, url) -> count.
+  user_ids, users = npy.unique(votes.user_id[rows], return_inverse=True)
+  num_urls = votes.num_urls()
+  cells, counts = npy.unique(users.astype(npy.int64) * num_urls
+                             + votes.url_id[rows], return_counts=True)
+  cell_users = cells // num_urls
+  cell_urls = cells % num_urls
+  log('%s votes by %s users in %s cells.'
+      % (len(rows), len(user_ids), len(cells)))
+
+  group_votes = {}
+  for name in _GROUPS:
+    members = getattr(groups, name)
+    if name == 'population':
+      # The market ranking counts every vote, like in rankings.
+      members = user_ids
+      is_member = npy.ones(len(user_ids), dtype=bool)
+    elif members is None:
+      continue
+    else:
+      is_member = activity_groups.to_bitmap(
+          activity_groups.to_array(members), user_ids)
+    # Number the members that voted 0..n-1; members without votes only
+    # matter for how many draws a replicate makes.
+    member_index = npy.cumsum(is_member) - 1
+    in_group = is_member[cell_users]
+    group_votes[name] = GroupVotes(len(members),
+                                   member_index[cell_users[in_group]],
+                                   cell_urls[in_group],
+                                   counts[in_group].astype(npy.float64))
+  return group_votes, num_urls
+
+
+def gt_counts(gt_rankings, num_urls):
+  """Returns the ground truth vote count of each url id."""
+  votes = vote_data.load()
+  counts = npy.zeros(num_urls, dtype=npy.float64)
+  for url, count in gt_rankings:
+    counts[votes.url_id_of(url)] = count
+  return counts
+
+
+def precision_recall(gt, counts, size_top_news=_SIZE_TOP_NEWS):
+  """Vectorized precision_recall.calc_precision_recall.
+
+  Keyword Arguments:
+  gt -- (npy.array) Ground truth count of each item.
+  counts -- (npy.array) The group's count of each item; items with a count of
+            0 are not ranked.
+  size_top_news -- Fraction of the ground truth that is target news.
+
+  Returns:
+  (precisions, recalls) -- Arrays, the i'th for i + 1 guesses.
+  """
+  num_ranked_gt = int(npy.count_nonzero(gt))
+  size_target_news = int(num_ranked_gt * size_top_news)
+  is_target = npy.zeros(len(gt), dtype=bool)
+  is_target[npy.argsort(-gt, kind='mergesort')[:size_target_news]] = True
+  voted = npy.flatnonzero(counts)
+  ranking = voted[npy.argsort(-counts[voted], kind='mergesort')]
+  num_guesses = min(len(ranking), size_target_news)
+  hits = npy.cumsum(is_target[ranking[:num_guesses]]).astype(npy.float64)
+  precisions = hits / npy.arange(1, num_guesses + 1) * 100.0
+  recalls = hits / max(size_target_news, 1) * 100.0
+  return precisions, recalls
+
+
+def _replicate(rand, resample):
+  """Computes one bootstrap replicate of every group's curve."""
+  gt = _state['gt']
+  num_urls = len(gt)
+  items = None
+  if resample == RESAMPLE_URLS:
+    ranked = _state['ranked_urls']
+    items = ranked[rand.randint(0, len(ranked), len(ranked))]
+    gt = gt[items]
+  curves = {}
+  for name, group_votes in _state['group_votes'].items():
+    if resample == RESAMPLE_USERS:
+      num_members = group_votes.num_members
+      picks = rand.randint(0, max(num_members, 1), num_members)
+      # Draws of members without votes fall past the voting members and are
+      # dropped by the bincount below.
+      weights = npy.bincount(picks, minlength=num_members)
+      counts = group_votes.url_counts(num_urls, weights.astype(npy.float64))
+    else:
+      counts = _state['counts'][name][items]
+    curves[name] = precision_recall(gt, counts)
+  return curves
+
+
+def _run_task(task):
+  """Runs a chunk of replicates in a worker process.
+
+  Keyword Arguments:
+  task -- (seed, first replicate, number of replicates, resample)
+
+  Returns:
+  A dictionary of group name to (precisions, recalls) matrices, one row per
+  replicate, padded with nan.
+  """
+  seed, first, num_replicates, resample = task
+  width = _state['width']
+  results = {}
+  for name in _state['group_votes']:
+    results[name] = (npy.full((num_replicates, width), npy.nan),
+                     npy.full((num_replicates, width), npy.nan))
+  for i in range(num_replicates):
+    # Each replicate has its own stream, so results do not depend on how the
+    # replicates are split between processes.
+    rand = npy.random.RandomState([seed, first + i])
+    for name, (precisions, recalls) in _replicate(rand, resample).items():
+      results[name][0][i, :len(precisions)] = precisions[:width]
+      results[name][1][i, :len(recalls)] = recalls[:width]
+  return results
+
+
+def _bands(matrix):
+  """Returns the _PERCENTILES of each column with a value in any replicate."""
+  has_value = ~npy.isnan(matrix).all(axis=0)
+  return npy.nanpercentile(matrix[:, has_value], _PERCENTILES, axis=0)
+
+
+@metrics.timed('bootstrap')
+def bootstrap(hours, groups, gt_rankings, category=None,
+              num_replicates=_BOOTSTRAP_REPLICATES,
+              resample=_BOOTSTRAP_RESAMPLE, seed=None, num_processes=None):
+  """Computes bootstrap bands of the precision/recall curve of each group.
+
+  Keyword Arguments:
+  hours -- The time window of the votes, as in rankings.get_rankings.
+  groups -- (UserGroups) The groups, e.g. from user_groups.get_all_user_groups.
+  gt_rankings -- The ground truth rankings, as from ground_truths.
+  category -- The category, None for all news.
+  num_replicates -- The number of resamples.
+  resample -- RESAMPLE_USERS or RESAMPLE_URLS.
+  seed -- Seed for the resamples, a random one (which is logged) if None.
+  num_processes -- Size of the process pool, the number of cpus if None.
+
+  Returns:
+  bands -- A dictionary of group name to (precision bands, recall bands), each
+           an array with a row per percentile in _PERCENTILES (2.5, 50, 97.5)
+           and a column per number of guesses.
+  """
+  global _state
+  if not resample in (RESAMPLE_USERS, RESAMPLE_URLS):
+    raise ValueError('Unknown resample mode: %s' % resample)
+  if seed is None:
+    seed = npy.random.randint(0, 2**31 - 1)
+  log('Bootstrapping %s replicates (resampling %s, seed %s)...'
+      % (num_replicates, resample, seed))
+
+  group_votes, num_urls = build_group_votes(hours, groups, category)
+  gt = gt_counts(gt_rankings, num_urls)
+  ranked_urls = npy.flatnonzero(gt)
+  counts = {}
+  if resample == RESAMPLE_URLS:
+    for name, votes in group_votes.items():
+      counts[name] = votes.url_counts(num_urls)
+  _state = {'gt': gt,
+            'ranked_urls': ranked_urls,
+            'group_votes': group_votes,
+            'counts': counts,
+            'width': int(len(ranked_urls) * _SIZE_TOP_NEWS)}
+
+  tasks = [(seed, first, min(_REPLICATES_PER_TASK, num_replicates - first),
+            resample)
+           for first in range(0, num_replicates, _REPLICATES_PER_TASK)]
+  if num_processes is None:
+    num_processes = multiprocessing.cpu_count()
+  try:
+    if num_processes > 1 and len(tasks) > 1:
+      pool = multiprocessing.Pool(num_processes)
+      try:
+        results = pool.map(_run_task, tasks)
+      finally:
+        pool.close()
+        pool.join()
+    else:
+      results = [_run_task(task) for task in tasks]
+  finally:
+    _state = None
+
+  bands = {}
+  for name in group_votes:
+    precisions = npy.vstack([result[name][0] for result in results])
+    recalls = npy.vstack([result[name][1] for result in results])
+    bands[name] = (_bands(precisions), _bands(recalls))
+  return bands
+
+
+def write_bands(bands, run_params_str):
+  """Writes the bands of each group to a tsv file, and draws them.
+
+  Each line holds the number of guesses, then the precision and then the
+  recall at each of the _PERCENTILES.
+  """
+  out_dir = _GRAPH_DIR + run_params_str + '/bootstrap/'
+  Util.ensure_dir_exist(out_dir)
+  for name, (precision_bands, recall_bands) in bands.items():
+    with open(out_dir + 'bootstrap_%s_%s.tsv' % (name, run_params_str),
+              'w') as out_file:
+      for i in range(precision_bands.shape[1]):
+        values = ([i + 1] + precision_bands[:, i].tolist()
+                  + recall_bands[:, i].tolist())
+        out_file.write('\t'.join([str(value) for value in values]) + '\n')
+  draw(bands, run_params_str)
+
+
+def draw(bands, run_params_str):
+  """Draws the median precision/recall curve of each group, with its band."""
+  figure = plt.figure()
+  axs = figure.add_subplot(111)
+  for name in _GROUPS:
+    if not name in bands:
+      continue
+    precision_bands, recall_bands = bands[name]
+    if not precision_bands.shape[1]:
+      continue
+    lines = axs.plot(recall_bands[1], precision_bands[1], label=name)
+    axs.fill_between(recall_bands[1], precision_bands[0], precision_bands[2],
+                     color=lines[0].get_color(), alpha=.2)
+  plt.legend(loc=0, ncol=2, fontsize='small')
+  plt.axis([0, 105, 0, 105])
+  plt.grid(True, which='major', linewidth=1)
+  plt.xlabel('Recall (%)', fontsize='16')
+  plt.ylabel('Precision (%)', fontsize='16')
+  out_dir = _GRAPH_DIR + run_params_str + '/bootstrap/'
+  with open(out_dir + 'bootstrap_%s.png' % run_params_str, 'w') as graph:
+    plt.savefig(graph, format='png')
+  plt.close()
+
+
+@metrics.instrument_run('bootstrap')
+def run():
+  """Bootstraps the curves of aFolkWisdom for every delta and category.
+
+  The (category, delta) cells run in parallel, sharing the data set loaded by
+  shared_dataset.
+  """
+  FileLog.set_log_dir()
+  cells = [(category, delta) for category in _CATEGORIES for delta in _DELTAS]
+  shared_dataset.map_cells(_run_cell, cells, groups_seed=_BOOTSTRAP_SEED)
+
+
+def _run_cell(cell):
+  """Bootstraps the curves of one (category, delta) cell of run()."""
+  category, delta = cell
+  size_top_news = _SIZE_TOP_NEWS
+  if category:
+    size_top_news = .10
+  gt_rankings = shared_dataset.gt_rankings(category)
+  run_params_str = 'd%s_t%s_e%s_%s' % (delta, int(size_top_news * 100),
+                                       int(_SIZE_EXPERTS * 100), category)
+  groups = shared_dataset.groups(category, delta, _BOOTSTRAP_SEED)
+  # A cell run in a worker process cannot start a pool of its own.
+  num_processes = None
+  if multiprocessing.current_process().daemon:
+    num_processes = 1
+  bands = bootstrap(delta, groups, gt_rankings, category,
+                    seed=_BOOTSTRAP_SEED, num_processes=num_processes)
+  write_bands(bands, run_params_str)
+
+
+def log(message):
+  """Helper method to modularize the format of log messages.
+
+  Keyword Arguments:
+  message -- A string to log.
+  """
+  FileLog.log(_LOG_FILE, message)
+
+
+if __name__ == "__main__":
+  run()
@@ -0,0 +1,114 @@
+"""
+Stores named numpy columns as a directory of .npy files.
+
+A column directory holds one <name>.npy file per column and a manifest.json
+that records the size and modification time of the source files the columns
+were derived from, plus any extra attributes. Loading returns None when the
+directory is missing, incomplete, or older than its sources, so callers can
+fall back to regenerating the columns from the text files.
+
+Suggested way to use:
+  columns = columnar.load(cache_dir, [source_file])
+  if columns is None:
+    columns = parse(source_file)
+    columnar.save(cache_dir, columns, [source_file])
+
+Columns are memory mapped when loaded, so only the pages that are touched are
+read from disk.
+"""
+import os
+import json
+
+import numpy as npy
+
+_MANIFEST_FILENAME = 'manifest.json'
+_FORMAT_VERSION = 1
+
+
+def fingerprint(sources):
+  """Returns the [path, size, mtime] of each source file."""
+  prints = []
+  for source in sources:
+    stat = os.stat(source)
+    prints.append([source, stat.st_size, int(stat.st_mtime)])
+  return prints
+
+
+def save(out_dir, columns, sources, attrs=None):
+  """Writes columns to out_dir.
+
+  The manifest is written last, so an interrupted save is treated as missing
+  by load().
+
+  Keyword Arguments:
+  out_dir -- Directory to write the columns to.
+  columns -- Dictionary of column name to numpy array.
+  sources -- Files the columns were derived from.
+  attrs -- Dictionary of extra (json serializable) values to keep alongside.
+  """
+  if not os.path.exists(out_dir):
+    os.makedirs(out_dir)
+  manifest_path = os.path.join(out_dir, _MANIFEST_FILENAME)
+  if os.path.exists(manifest_path):
+    os.remove(manifest_path)
+  for name, column in columns.items():
+    npy.save(os.path.join(out_dir, name + '.npy'), column)
+  manifest = {'version': _FORMAT_VERSION,
+              'sources': fingerprint(sources),
+              'columns': sorted(columns.keys()),
+              'attrs': attrs or {}}
+  tmp_path = manifest_path + '.tmp'
+  with open(tmp_path, 'w') as out_file:
+    json.dump(manifest, out_file)
+  os.rename(tmp_path, manifest_path)
+
+
+def read_manifest(in_dir):
+  """Returns the manifest of a column directory, or None if there is none."""
+  manifest_path = os.path.join(in_dir, _MANIFEST_FILENAME)
+  if not os.path.exists(manifest_path):
+    return None
+  with open(manifest_path) as in_file:
+    return json.load(in_file)
+
+
+def is_fresh(in_dir, sources):
+  """Checks that in_dir holds columns derived from the current sources."""
+  manifest = read_manifest(in_dir)
+  if manifest is None or manifest.get('version') != _FORMAT_VERSION:
+    return False
+  try:
+    return manifest['sources'] == fingerprint(sources)
+  except OSError:
+    return False
+
+
+def load(in_dir, sources, names=None, mmap=True):
+  """Loads columns from in_dir.
+
+  Keyword Arguments:
+  in_dir -- Directory the columns were saved to.
+  sources -- Files the columns were derived from.
+  names -- Columns to load, None for all of them.
+  mmap -- Memory map the columns (read only) rather than reading them in.
+
+  Returns:
+  (columns, attrs) -- Dictionary of column name to array and the attributes
+                      given to save(), or None if the columns are missing or
+                      stale.
+  """
+  if not is_fresh(in_dir, sources):
+    return None
+  manifest = read_manifest(in_dir)
+  if names is None:
+    names = manifest['columns']
+  mmap_mode = None
+  if mmap:
+    mmap_mode = 'r'
+  columns = {}
+  for name in names:
+    if not name in manifest['columns']:
+      return None
+    columns[name] = npy.load(os.path.join(in_dir, name + '.npy'),
+                             mmap_mode=mmap_mode)
+  return columns, manifest['attrs']
@@ -5,6 +5,10 @@ basic groups.
 __author__ = 'Chris Moghbel (cmoghbel@cs.ucla.edu)'
 """
 import Util
+import ground_truths
+import activity_groups
+from ground_truths import DataSet
+from ranking import Ranking
 
 from datetime import timedelta
 
@@ -151,7 +155,7 @@ def gather_tweet_counts(hours, seeds, group, category=None):
   
   Keyword Arguments:
   hours -- The number of hours from the seed time in which to accept votes.
-  seeds -- A dictionary of url to the datetime of it first being seend
+  seeds -- (SeedTable) The seeds, see seed_table.
   category -- The category to gather tweets for, None if for all news.
 
   Returns:
@@ -161,6 +165,10 @@ def gather_tweet_counts(hours, seeds, group, category=None):
   """
   group_tweet_counts = {}
   print 'num users in group: %s' % len(group)
+  data_set = DataSet.TESTING
+  if _SWITCHED:
+    data_set = DataSet.TRAINING
+  seeded_urls = seeds.seeded_urls(*ground_truths.seed_window(data_set))
   with open('../data/FolkWisdom/time_deltas.tsv') as input_file:
     for line in input_file:
       tokens = line.split('\t')
@@ -171,40 +179,36 @@ def gather_tweet_counts(hours, seeds, group, category=None):
       if hours:
         max_delta = timedelta(hours=hours)
 
-      if url in seeds:
-        (seed_tweet_id, seed_user_id, seed_time) = seeds[url]
-        in_correct_set = Util.is_in_testing_set(seed_time)
-        if _SWITCHED:
-          in_correct_set = Util.is_in_training_set(seed_time)
-        if in_correct_set:
-
-          if time_delta < max_delta:
-
-            category_matches = True
-            if category:
-              category_matches = False
-              url_category = tokens[_TIMEDELTAS_FILE_CATEGORY_INDEX].strip()
-              if url_category == category:
-                category_matches = True
+      if url in seeded_urls:
+
+        if time_delta < max_delta:
+
+          category_matches = True
+          if category:
+            category_matches = False
+            url_category = tokens[_TIMEDELTAS_FILE_CATEGORY_INDEX].strip()
+            if url_category == category:
+              category_matches = True
              
-            if category_matches:
+          if category_matches:
 
-              if user_id in group:
-                if url in group_tweet_counts:
-                  group_tweet_counts[url] += 1
-                else:
-                  group_tweet_counts[url] = 1
+            if user_id in group:
+              if url in group_tweet_counts:
+                group_tweet_counts[url] += 1
+              else:
+                group_tweet_counts[url] = 1
               
   return group_tweet_counts
 
 
-def get_rankings_for_group(delta, seeds, group, category=None):
+def get_rankings_for_group(delta, seeds, group, category=None, limit=None):
   """Gets the true rankings, and ranking as determined by various user groups.
   
   Keyword Arguments:
   delta -- The time window, in hours.
   seeds -- The url to first time seen dictionary.
   category -- The category to get rankings for, None for all news.
+  limit -- Only rank the first limit urls, None for all.
   
   Returns:
   Returns rankings for the following user groups:
@@ -212,31 +216,33 @@ def get_rankings_for_group(delta, seeds, group, category=None):
   f-score, confidence interval, super).
   """
   gtc  = gather_tweet_counts(delta, seeds, group, category)
-  group_rankings = sorted(gtc.items(), key=lambda x: x[1], reverse=True)
+  group_rankings = Ranking.from_counts(gtc, limit=limit)
   return group_rankings
 
 
-def get_rankings(delta, seeds, groups, category=None):
+def get_rankings(delta, seeds, groups, category=None, limit=None):
   rankings = []
   aggregate_group = set()
   for group in groups:
     aggregate_group = aggregate_group.union(group)
     print 'aggregate group num users: %s' % len(aggregate_group)
-    group_rankings = get_rankings_for_group(delta, seeds, aggregate_group, category)
+    group_rankings = get_rankings_for_group(delta, seeds, aggregate_group,
+                                            category, limit)
     rankings.append(group_rankings)
   return rankings
 
 
 def group_users(common_users, num_groups):
-  """Groups users into 'newsaholic', 'active', and 'common' categories.
-  
+  """Splits common users round-robin into a number of groups.
+
+  Keyword Arguments:
+  common_users -- (Set<str>) The users to split.
+  num_groups -- The number of groups to have.
+
   Returns:
+  groups -- A List of Sets of user ids, one for each group.
   """
-  groups = [set() for i in range(num_groups)]
-  copy_common_users = set(common_users)
-  count = 0
-  while len(copy_common_users) > 0:
-    group = groups[count % num_groups]
-    group.add(copy_common_users.pop())
-    count += 1
+  user_ids = activity_groups.to_array(common_users)
+  groups = [activity_groups.to_set(group) for group
+            in activity_groups.round_robin(user_ids, num_groups)]
   return groups
@@ -22,6 +22,9 @@ _TIMEDELTAS_FILE_DELTA_INDEX = 2 # In seconds.
 _TIMEDELTAS_FILE_URL_INDEX = 3
 _TIMEDELTAS_FILE_CATEGORY_INDEX = 4
 _TIMEDELTAS_FILE_SOURCE_INDEX = 5
+_TIMEDELTAS_FILE_RETWEETED_INDEX = 6 # 1 if the tweet is a retweet, else 0.
+_TIMEDELTAS_FILE_ORIGIN_TWEET_ID_INDEX = 7
+_TIMEDELTAS_FILE_ORIGIN_USER_ID_INDEX = 8
 
 _HITS_MISSES_FILE_USER_ID_INDEX = 0
 _HITS_MISSES_FILE_HITS_INDEX = 1
@@ -2,20 +2,41 @@
 This module contains a method for finding user infomation for a given set of
 users.
 
-Queries Twitter REST api via tweepy.
+crawl_user_info() queries the Twitter REST users/lookup endpoint directly, 100
+users per request, from a few concurrent workers. Requests are paced by a
+token bucket that follows the rate limit headers of each response, and
+requests failing with a 5xx status are retried with exponential backoff. The
+endpoint is configurable, so the crawler can be run against the local stand-in
+in twitter_api_stub.py:
+  crawl_users.crawl_user_info(user_ids,
+                              lookup_url=twitter_api_stub.lookup_url(port))
+
+get_user_info() is the older, serial crawler, which queries one user at a time
+via tweepy. tweepy is only needed for that one.
 
 __author__ = 'Chris Moghbel (cmoghbel@cs.ucla.edu)'
 """
 import FileLog
 import Util
+import user_store
 
 import os
 import codecs
 import time
+import json
+import random
 import pprint
+import urllib
+import urllib2
+import threading
+import Queue
+import _strptime # Imported up front, as the first strptime from a thread can fail.
 from datetime import datetime
 
-import tweepy
+try:
+  import tweepy
+except ImportError:
+  tweepy = None
 
 from constants import _USER_INFO_FILE_ID_INDEX
 from constants import _USER_INFO_FILE_SCREEN_NAME_INDEX
@@ -36,6 +57,15 @@ from constants import _DATETIME_FORMAT
 _LOG_FILE = 'crawl_users.log'
 _OUTPUT_DIR = '../data/SocialHubBias/'
 
+_LOOKUP_URL = 'https://api.twitter.com/1/users/lookup.json'
+_LOOKUP_BATCH_SIZE = 100 # Max number of ids per users/lookup request.
+_NUM_WORKERS = 4
+_MAX_RETRIES = 5
+_BACKOFF_SECONDS = 2
+_MAX_BACKOFF_SECONDS = 5 * 60
+_REQUEST_TIMEOUT_SECONDS = 60
+_TWITTER_DATETIME_FORMAT = '%a %b %d %H:%M:%S +0000 %Y'
+
 
 def check_rate_limit_and_wait_if_needed(api): # pylint: disable-msg=C0103
   """Waits if twitter rate limit is about to be exceeded.
@@ -94,15 +124,200 @@ def get_user_info(api, user_ids):
         count += 1
 
 
-def load_user_info():
+class RateLimiter:
+  """Token bucket shared by the crawler workers.
+
+  Starts out allowing requests_per_window requests per window_seconds, and is
+  resynchronized with the X-RateLimit-Remaining and X-RateLimit-Reset headers
+  of every response: the remaining requests are spread evenly over the time
+  left until the reset.
+  """
+
+  def __init__(self, requests_per_window=150, window_seconds=3600,
+               burst=_NUM_WORKERS):
+    self.lock = threading.Lock()
+    self.tokens = float(burst)
+    self.capacity = float(burst)
+    self.rate = float(requests_per_window) / window_seconds
+    self.last = time.time()
+    self.resume_at = 0
+
+  def acquire(self):
+    """Blocks until a request may be made."""
+    while True:
+      with self.lock:
+        now = time.time()
+        if now >= self.resume_at:
+          self.tokens = min(self.capacity,
+                            self.tokens + (now - self.last) * self.rate)
+          self.last = now
+          if self.tokens >= 1:
+            self.tokens -= 1
+            return
+          wait = (1 - self.tokens) / self.rate
+        else:
+          wait = self.resume_at - now
+      time.sleep(min(wait, 60))
+
+  def update(self, headers):
+    """Resynchronizes with the rate limit headers of a response."""
+    try:
+      remaining = int(headers['X-RateLimit-Remaining'])
+      reset = int(headers['X-RateLimit-Reset'])
+    except (KeyError, TypeError, ValueError):
+      return
+    with self.lock:
+      now = time.time()
+      if remaining <= 0:
+        # Out of requests, wait for the window to reset.
+        self.resume_at = reset
+        self.tokens = 0
+        self.last = max(now, reset)
+      else:
+        self.rate = remaining / max(1.0, reset - now)
+        self.tokens = min(self.tokens, remaining)
+
+
+def crawl_user_info(user_ids, lookup_url=_LOOKUP_URL,
+                    num_workers=_NUM_WORKERS, rate_limiter=None, store=None):
+  """Queries twitter for user information, in batches and concurrently.
+
+  Users that are found are appended to user_info.tsv, and ids that twitter
+  does not return (suspended or deleted users) to bad_user.tsv. Both are also
+  recorded in the user store as each batch comes back, and users already in
+  the store are skipped, so an interrupted crawl can simply be rerun.
+
+  Keyword Arguments:
+  user_ids -- (Set<str>) twitter ids to get info for.
+  lookup_url -- (str) Url of the users/lookup endpoint to query.
+  num_workers -- (int) Number of requests to keep in flight.
+  rate_limiter -- (RateLimiter) Paces the requests, a new one if None.
+  store -- (user_store.UserStore) Store to record users in, the one in the
+           output dir if None.
+
+  Returns:
+  (num_found, num_bad, num_failed) -- Number of users written to user_info,
+                                      to bad_user, and not crawled because
+                                      their request kept failing.
+  """
+  Util.ensure_dir_exist(_OUTPUT_DIR)
+  if rate_limiter is None:
+    rate_limiter = RateLimiter()
+  if store is None:
+    store = user_store.open_store(_OUTPUT_DIR)
+  user_ids = sorted(store.frontier(user_ids))
+  log('Crawling %s users from %s with %s workers...'
+      % (len(user_ids), lookup_url, num_workers))
+  batches = Queue.Queue()
+  for i in range(0, len(user_ids), _LOOKUP_BATCH_SIZE):
+    batches.put(user_ids[i:i + _LOOKUP_BATCH_SIZE])
+  out_lock = threading.Lock()
+  totals = {'found': 0, 'bad': 0, 'failed': 0}
+  with codecs.open(_OUTPUT_DIR + 'user_info.tsv', 'a',
+                   encoding='utf-8') as out_file:
+    with codecs.open(_OUTPUT_DIR + 'bad_user.tsv', 'a',
+                     encoding='utf-8') as bad_file:
+
+      def work():
+        while True:
+          try:
+            batch = batches.get_nowait()
+          except Queue.Empty:
+            return
+          users = lookup_users(batch, lookup_url, rate_limiter)
+          with out_lock:
+            if users is None:
+              totals['failed'] += len(batch)
+              continue
+            found = set()
+            for user in users:
+              output_user(out_file, user)
+              found.add(str(user.id))
+            bad_ids = [user_id for user_id in batch if not user_id in found]
+            for user_id in bad_ids:
+              bad_file.write('%s\n' % user_id)
+            store.upsert_users(users)
+            store.mark_bad(bad_ids)
+            totals['found'] += len(found)
+            totals['bad'] += len(batch) - len(found)
+            out_file.flush()
+            bad_file.flush()
+            done = totals['found'] + totals['bad'] + totals['failed']
+          log('Crawled %s of %s users' % (done, len(user_ids)))
+
+      workers = [threading.Thread(target=work) for _ in range(num_workers)]
+      for worker in workers:
+        worker.start()
+      for worker in workers:
+        worker.join()
+  log('Found %(found)s users, %(bad)s bad, %(failed)s failed.' % totals)
+  return totals['found'], totals['bad'], totals['failed']
+
+
+def lookup_users(user_ids, lookup_url, rate_limiter):
+  """Makes one users/lookup request, retrying on 5xx and rate limiting.
+
+  A response counts as rate limited when it says no requests remain; other
+  4xx responses are not retried. Both retries and rate limited attempts count
+  against _MAX_RETRIES.
+
+  Keyword Arguments:
+  user_ids -- (List<str>) Up to _LOOKUP_BATCH_SIZE twitter ids.
+  lookup_url -- (str) Url of the users/lookup endpoint.
+  rate_limiter -- (RateLimiter) Paces the requests.
+
+  Returns:
+  users -- (List<crawl_users.User>) the users twitter returned, or None if
+           the request kept failing.
+  """
+  url = '%s?%s' % (lookup_url, urllib.urlencode(
+      {'user_id': ','.join(user_ids), 'include_entities': 'false'}))
+  retries = 0
+  while retries <= _MAX_RETRIES:
+    rate_limiter.acquire()
+    try:
+      response = urllib2.urlopen(url, timeout=_REQUEST_TIMEOUT_SECONDS)
+      rate_limiter.update(response.info())
+      return [User.from_json(user) for user in json.load(response)]
+    except urllib2.HTTPError, err:
+      rate_limiter.update(err.info())
+      if err.code == 404:
+        # None of the users exist any more.
+        return []
+      elif (err.code in (400, 420, 429)
+            and err.info().get('X-RateLimit-Remaining') == '0'):
+        # The rate limiter now waits for the window to reset, no backoff.
+        log('Rate limited, waiting for the rate limit window to reset...')
+        retries += 1
+        continue
+      elif err.code < 500:
+        log('%s (user_ids: %s...)' % (err, user_ids[0]))
+        return None
+      log('%s, retrying %s users...' % (err, len(user_ids)))
+    except (urllib2.URLError, IOError, ValueError), err:
+      log('%s, retrying %s users...' % (err, len(user_ids)))
+    # Exponential backoff, with jitter so workers don't retry in lockstep.
+    time.sleep(min(_MAX_BACKOFF_SECONDS, _BACKOFF_SECONDS * 2 ** retries)
+               * random.uniform(.5, 1.5))
+    retries += 1
+  log('Giving up on %s users (user_ids: %s...)' % (len(user_ids), user_ids[0]))
+  return None
+
+
+def load_user_info(user_info_file=None):
   """Loads previously crawled user infomation from disk.
 
+  Keyword Arguments:
+  user_info_file -- (str) The file to load, defaults to user_info.tsv in the
+                    output dir.
+
   Returns:
   users -- (Dict<str, crawl_users.User>) user_id => user
   """
   log('Loading user_info...')
   users = {}
-  user_info_file = _OUTPUT_DIR + 'user_info.tsv'
+  if user_info_file is None:
+    user_info_file = _OUTPUT_DIR + 'user_info.tsv'
   if not os.path.exists(user_info_file):
     return users
   with codecs.open(user_info_file, encoding='utf-8') as in_file:
@@ -215,6 +430,27 @@ class User:
     else:
       self.timestamp_crawled = timestamp_crawled
 
+  @classmethod
+  def from_json(cls, user):
+    """Factory method for creating a new User instance.
+
+    Keyword Arguments:
+    user -- (Dict) a user object decoded from a twitter api response.
+
+    Returns:
+    A new User instance.
+    """
+    created_at = user.get('created_at')
+    if created_at:
+      created_at = datetime.strptime(created_at, _TWITTER_DATETIME_FORMAT)
+    user_id = user.get('id_str') or str(user['id'])
+    return User(user_id, user.get('screen_name'), user.get('name'),
+                user.get('followers_count'), user.get('statuses_count'),
+                user.get('friends_count'), created_at,
+                user.get('listed_count'), user.get('verified'),
+                user.get('utc_offset'), user.get('time_zone'),
+                user.get('lang'), datetime.now())
+
   @classmethod
   def from_tweepy_user(cls, tweepy_user):
     """Factory method for creating a new User instance.
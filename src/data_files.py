@@ -0,0 +1,158 @@
+"""
+Opens data files that may be compressed.
+
+Any data file (the monthly tweet dumps, URLExapnd.cache.txt, ...) can be kept
+compressed with gzip (.gz), bzip2 (.bz2) or xz (.xz). open_file() picks the
+codec by extension, and find() finds the compressed version of a file given
+its uncompressed name:
+
+  with data_files.open_file(data_files.find(_CACHE_FILENAME)) as input_file:
+    for line in input_file:
+      ...
+
+xz needs the lzma module, which is not in the Python 2 standard library
+(pip install backports.lzma). bzip2 files made of several streams (as written
+by pbzip2 or lbzip2, or by concatenating .bz2 files) are read to the end.
+
+map_files() runs a function over many files in worker processes, so that the
+files are read and decompressed concurrently.
+"""
+import FileLog
+
+import bz2
+import gzip
+import multiprocessing
+import os
+
+try:
+  import lzma
+except ImportError:
+  try:
+    from backports import lzma
+  except ImportError:
+    lzma = None
+
+_EXTENSIONS = ['.gz', '.bz2', '.xz']
+_BZ2_CHUNK_SIZE = 1 << 20
+
+
+class _BZ2Streams:
+  """A bzip2 file read as lines, through every stream it holds.
+
+  bz2.BZ2File stops at the end of the first stream in Python 2, silently
+  dropping the rest of multi-stream files.
+  """
+
+  def __init__(self, filename):
+    self.name = filename
+    self.file = open(filename, 'rb')
+
+  def fileno(self):
+    return self.file.fileno()
+
+  def close(self):
+    self.file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+  def chunks(self):
+    """Yields the decompressed data, a chunk at a time."""
+    decompressor = bz2.BZ2Decompressor()
+    while True:
+      data = self.file.read(_BZ2_CHUNK_SIZE)
+      if not data:
+        return
+      while data:
+        try:
+          chunk = decompressor.decompress(data)
+        except EOFError:
+          # The last stream ended exactly at the end of the previous chunk.
+          decompressor = bz2.BZ2Decompressor()
+          continue
+        data = decompressor.unused_data
+        if data:
+          # The data past the end of a stream starts the next one.
+          decompressor = bz2.BZ2Decompressor()
+        if chunk:
+          yield chunk
+
+  def read(self):
+    return ''.join(self.chunks())
+
+  def __iter__(self):
+    pending = ''
+    for chunk in self.chunks():
+      lines = (pending + chunk).split('\n')
+      pending = lines.pop()
+      for line in lines:
+        yield line + '\n'
+    if pending:
+      yield pending
+
+
+def _open_xz(filename):
+  if lzma is None:
+    raise IOError('Cannot read %s, xz needs the lzma module '
+                  '(pip install backports.lzma).' % filename)
+  return lzma.open(filename)
+
+
+_OPENERS = {'.gz': gzip.open,
+            '.bz2': _BZ2Streams,
+            '.xz': _open_xz}
+
+
+def open_file(filename):
+  """Opens a data file for reading, decompressing it if needed."""
+  opener = _OPENERS.get(os.path.splitext(filename)[1])
+  if opener is None:
+    return open(filename)
+  return opener(filename)
+
+
+def find(filename):
+  """Returns filename if it exists, otherwise its compressed version if that
+  exists, otherwise filename.
+  """
+  if os.path.exists(filename):
+    return filename
+  for extension in _EXTENSIONS:
+    if os.path.exists(filename + extension):
+      return filename + extension
+  return filename
+
+
+def map_files(func, args, processes=None):
+  """Returns [func(arg) for arg in args], computed in worker processes.
+
+  Keyword Arguments:
+  func -- A module level function (so that it can be pickled) of one argument.
+  args -- List of arguments, e.g. file names.
+  processes -- Number of worker processes, None for one per cpu.
+  """
+  if processes is None:
+    processes = multiprocessing.cpu_count()
+  processes = min(processes, len(args))
+  if processes <= 1:
+    return [func(arg) for arg in args]
+  pool = multiprocessing.Pool(processes)
+  try:
+    return pool.map(_call, [(func, arg) for arg in args], chunksize=1)
+  finally:
+    pool.close()
+    pool.join()
+
+
+def _call(task):
+  """Returns func(arg) of a (func, arg) task, in a worker of map_files()."""
+  func, arg = task
+  try:
+    return func(arg)
+  finally:
+    # Worker processes exit without running the exit handlers that write out
+    # the logs.
+    FileLog.flush()
@@ -8,36 +8,32 @@ import matplotlib.pyplot as plt
 from params import _SIZE_TOP_NEWS
 
 import math
-from math import sqrt
+import numpy as npy
 
 _GRAPH_DIR = Util.get_graph_output_dir('FolkWisdom/')
 
-def calculate_diff_avg(ground_truth_url_to_rank, other_rank_to_url):
+def calculate_diff_avg(gt_rankings, other_rankings):
   """Calculates the average of the difference in rank from the truth.
   
   Keyword Arguments:
-  ground_truth_url_to_rank -- Dictionary mapping url to true rank.
-  other_rank_to_url -- Dictionary mapping some non-truth ranking to url.
+  gt_rankings -- (Ranking) The ground truth rankings.
+  other_rankings -- (Ranking) Some non-truth ranking, of urls that are all in
+                    the ground truth.
   
   Returns:
   avg_diffs: A list of avg_diff, for each number of news chosen.
   """
-  num_gt = len(ground_truth_url_to_rank.keys())
-  num_other = len(other_rank_to_url.keys())
+  num_gt = len(gt_rankings)
+  num_other = len(other_rankings)
   max_num_news_to_consider = min(int(num_gt * _SIZE_TOP_NEWS), num_other)
-  avg_diffs = []
-  for i in range(1, max_num_news_to_consider):
-    diff_sum = 0
-    for j in range(0, i):
-      other_rank = j + 1
-      url = other_rank_to_url[other_rank]
-      gt_rank = ground_truth_url_to_rank[url]
-      diff = (other_rank - gt_rank)**2 
-      diff_sum += diff
-    diff_avg = sqrt(diff_sum) / i
-    avg_diffs.append(diff_avg)
-  
-  return avg_diffs
+  if max_num_news_to_consider < 2:
+    return []
+  # As before, the j'th guess (1 based) is the url at index j of the other
+  # ranking, compared to its 0 based ground truth rank.
+  other_ranks = npy.arange(1, max_num_news_to_consider)
+  gt_ranks = gt_rankings.ranks()[other_rankings.url_ids[other_ranks]]
+  diff_sums = npy.cumsum((other_ranks - gt_ranks)**2)
+  return (npy.sqrt(diff_sums) / other_ranks).tolist()
 
 
 def draw_avg_diff_graph(newsaholic_diffs, market_diffs, active_diffs,
@@ -1,5 +1,9 @@
 
 import Util
+import ground_truths
+import activity_groups
+from ground_truths import DataSet
+from ranking import Ranking
 
 from datetime import timedelta
 
@@ -12,9 +16,7 @@ from constants import _TIMEDELTAS_FILE_URL_INDEX
 from constants import _TIMEDELTAS_FILE_USER_ID_INDEX
 from constants import _TIMEDELTAS_FILE_DELTA_INDEX
 from constants import _TIMEDELTAS_FILE_CATEGORY_INDEX
-from constants import _USER_ACTIVITY_FILE_ID_INDEX
 
-from params import _EXCLUDE_RETWEETS
 from params import _SWITCHED
 
 _GRAPH_DIR = Util.get_graph_output_dir('FolkWisdom/')
@@ -120,7 +122,7 @@ def gather_tweet_counts(hours, seeds, groups, category=None):
   
   Keyword Arguments:
   hours -- The number of hours from the seed time in which to accept votes.
-  seeds -- A dictionary of url to the datetime of it first being seen
+  seeds -- (SeedTable) The seeds, see seed_table.
   Accepts a parameter for a set defining each of the following user groups:
   newsaholics, active users, experts (precision), experts (F-score),
   experts (confidence interval), and experts (super experts).
@@ -132,6 +134,10 @@ def gather_tweet_counts(hours, seeds, groups, category=None):
   experts (precision, F-score, confidence interval, and super).
   """
   groups_tweet_counts = [{} for i in range(len(groups))]
+  data_set = DataSet.TESTING
+  if _SWITCHED:
+    data_set = DataSet.TRAINING
+  seeded_urls = seeds.seeded_urls(*ground_truths.seed_window(data_set))
   with open('../data/FolkWisdom/time_deltas.tsv') as input_file:
     for line in input_file:
       tokens = line.split('\t')
@@ -142,36 +148,31 @@ def gather_tweet_counts(hours, seeds, groups, category=None):
       if hours:
         max_delta = timedelta(hours=hours)
 
-      if url in seeds:
-        (seed_tweet_id, seed_user_id, seed_time) = seeds[url]
-        in_correct_set = Util.is_in_testing_set(seed_time)
-        if _SWITCHED:
-          in_correct_set = Util.is_in_training_set(seed_time)
-        if in_correct_set:
-
-          if time_delta < max_delta:
-
-            category_matches = True
-            if category:
-              category_matches = False
-              url_category = tokens[_TIMEDELTAS_FILE_CATEGORY_INDEX].strip()
-              if url_category == category:
-                category_matches = True
+      if url in seeded_urls:
+
+        if time_delta < max_delta:
+
+          category_matches = True
+          if category:
+            category_matches = False
+            url_category = tokens[_TIMEDELTAS_FILE_CATEGORY_INDEX].strip()
+            if url_category == category:
+              category_matches = True
              
-            if category_matches:
-
-              for i, group in enumerate(groups):
-                if user_id in group:
-                  group_tweet_counts = groups_tweet_counts[i] 
-                  if url in group_tweet_counts:
-                    group_tweet_counts[url] += 1
-                  else:
-                    group_tweet_counts[url] = 1
+          if category_matches:
+
+            for i, group in enumerate(groups):
+              if user_id in group:
+                group_tweet_counts = groups_tweet_counts[i] 
+                if url in group_tweet_counts:
+                  group_tweet_counts[url] += 1
+                else:
+                  group_tweet_counts[url] = 1
                 
   return groups_tweet_counts 
 
 
-def get_rankings(delta, seeds, groups, category=None):
+def get_rankings(delta, seeds, groups, category=None, limit=None):
   """Gets the true rankings, and ranking as determined by various user groups.
   
   Keyword Arguments:
@@ -181,6 +182,7 @@ def get_rankings(delta, seeds, groups, category=None):
   newsaholics, active users, experts (precision, f-score, confidnce
   interval, and super).
   category -- The category to get rankings for, None for all news.
+  limit -- Only rank the first limit urls of each group, None for all.
   
   Returns:
   Returns rankings for the following user groups:
@@ -190,7 +192,7 @@ def get_rankings(delta, seeds, groups, category=None):
   gtcs = gather_tweet_counts(delta, seeds, groups, category)
   groups_rankings = []
   for gtc in gtcs:
-    group_rankings = sorted(gtc.items(), key=lambda x: x[1], reverse=True)
+    group_rankings = Ranking.from_counts(gtc, limit=limit)
     groups_rankings.append(group_rankings)
   return groups_rankings 
 
@@ -208,35 +210,10 @@ def group_users(delta, num_groups, group_size_in_percent, category=None):
   num_users -- The total number of users.
   groups -- A List of Sets of group ids, one for each group.
   """
-  user_ids_sorted = []
-  in_dir = _IN_DIR
-  if _SWITCHED:
-    in_dir += 'switched/'
-  if _EXCLUDE_RETWEETS:
-    in_dir += 'no_retweets/'
-  input_file = in_dir + 'user_activity_%s_%s.tsv' % (delta, category)
-  with open(input_file) as input_file:
-    for line in input_file:
-      tokens = line.split('\t')
-      user_id = tokens[_USER_ACTIVITY_FILE_ID_INDEX]
-      user_ids_sorted.append(user_id)
-  num_users = len(user_ids_sorted)
+  user_ids = activity_groups.load(delta, category)
+  num_users = len(user_ids)
   group_size = int(num_users * group_size_in_percent)
-  
-  groups = []
-  count = 0
-  group_index = 0
-  for i in range(num_users):
-    if group_index == num_groups:
-      break
-    if count is 0:
-      groups.append(set())
-    user_id = user_ids_sorted[i]
-    group = groups[group_index]
-    group.add(user_id)
-    count += 1
-    if count == group_size:
-      group_index += 1
-      count = 0
+  groups = [activity_groups.to_set(group) for group
+            in activity_groups.even_groups(user_ids, num_groups, group_size)]
   return num_users, groups 
 
@@ -5,6 +5,10 @@ operations involving the expert groups.
 __author__ = 'Chris Moghbel (cmoghbel@cs.ucla.edu)'
 """
 import Util
+import ground_truths
+import user_store
+from ground_truths import DataSet
+from ranking import Ranking
 
 from datetime import timedelta
 from math import sqrt
@@ -21,9 +25,6 @@ from constants import _TIMEDELTAS_FILE_CATEGORY_INDEX
 from constants import _HITS_MISSES_FILE_USER_ID_INDEX
 from constants import _HITS_MISSES_FILE_MISSES_INDEX
 from constants import _HITS_MISSES_FILE_HITS_INDEX
-from constants import _USER_INFO_FILE_ID_INDEX
-from constants import _USER_INFO_FILE_FOLLOWERS_COUNT_INDEX
-from constants import _USER_INFO_FILE_SCREEN_NAME_INDEX
 
 from params import _BETA
 from params import _Z_SCORE
@@ -33,6 +34,8 @@ from params import _SWITCHED
 _GRAPH_DIR = Util.get_graph_output_dir('FolkWisdom/')
 _IN_DIR = '../data/FolkWisdom/'
 
+_social_bias_experts = {}  # (followers version, num experts) -> experts
+
 
 def draw_precision_experts(market_precisions, expert_p_precisions,
                            expert_f_precisions, expert_c_precisions,
@@ -268,7 +271,7 @@ def gather_tweet_counts(hours, seeds, experts_precision, experts_fscore,
   
   Keyword Arguments:
   hours -- The number of hours from the seed time in which to accept votes.
-  seeds -- A dictionary of url to the datetime of it first being seend
+  seeds -- (SeedTable) The seeds, see seed_table.
   Accepts a parameter for a set defining each of the following user groups:
   newsaholics, active users, experts (precision), experts (F-score),
   experts (confidence interval), and experts (super experts).
@@ -284,6 +287,10 @@ def gather_tweet_counts(hours, seeds, experts_precision, experts_fscore,
   experts_ci_tc = {}
   experts_s_tc = {}
   experts_sb_tc = {}
+  data_set = DataSet.TESTING
+  if _SWITCHED:
+    data_set = DataSet.TRAINING
+  seeded_urls = seeds.seeded_urls(*ground_truths.seed_window(data_set))
   with open('../data/FolkWisdom/time_deltas.tsv') as input_file:
     for line in input_file:
       tokens = line.split('\t')
@@ -294,53 +301,48 @@ def gather_tweet_counts(hours, seeds, experts_precision, experts_fscore,
       if hours:
         max_delta = timedelta(hours=hours)
 
-      if url in seeds:
-        (seed_tweet_id, seed_user_id, seed_time) = seeds[url]
-        in_correct_set = Util.is_in_testing_set(seed_time)
-        if _SWITCHED:
-          in_correct_set = Util.is_in_training_set(seed_time)
-        if in_correct_set:
-
-          if time_delta < max_delta:
-
-            category_matches = True
-            if category:
-              category_matches = False
-              url_category = tokens[_TIMEDELTAS_FILE_CATEGORY_INDEX].strip()
-              if url_category == category:
-                category_matches = True
+      if url in seeded_urls:
+
+        if time_delta < max_delta:
+
+          category_matches = True
+          if category:
+            category_matches = False
+            url_category = tokens[_TIMEDELTAS_FILE_CATEGORY_INDEX].strip()
+            if url_category == category:
+              category_matches = True
              
-            if category_matches:
-
-              if user_id in experts_precision:
-                if url in experts_precision_tc:
-                  experts_precision_tc[url] += 1
-                else:
-                  experts_precision_tc[url] = 1
-
-              if user_id in experts_fscore:
-                if url in experts_fscore_tc:
-                  experts_fscore_tc[url] += 1
-                else:
-                  experts_fscore_tc[url] = 1
-
-              if user_id in experts_ci:
-                if url in experts_ci_tc:
-                  experts_ci_tc[url] += 1
-                else:
-                  experts_ci_tc[url] = 1
-
-              if user_id in super_experts:
-                if url in experts_s_tc:
-                  experts_s_tc[url] += 1
-                else:
-                  experts_s_tc[url] = 1
-
-              if user_id in social_bias_experts:
-                if url in experts_sb_tc:
-                  experts_sb_tc[url] += 1
-                else:
-                  experts_sb_tc[url] = 1
+          if category_matches:
+
+            if user_id in experts_precision:
+              if url in experts_precision_tc:
+                experts_precision_tc[url] += 1
+              else:
+                experts_precision_tc[url] = 1
+
+            if user_id in experts_fscore:
+              if url in experts_fscore_tc:
+                experts_fscore_tc[url] += 1
+              else:
+                experts_fscore_tc[url] = 1
+
+            if user_id in experts_ci:
+              if url in experts_ci_tc:
+                experts_ci_tc[url] += 1
+              else:
+                experts_ci_tc[url] = 1
+
+            if user_id in super_experts:
+              if url in experts_s_tc:
+                experts_s_tc[url] += 1
+              else:
+                experts_s_tc[url] = 1
+
+            if user_id in social_bias_experts:
+              if url in experts_sb_tc:
+                experts_sb_tc[url] += 1
+              else:
+                experts_sb_tc[url] = 1
 
                 
   return (experts_precision_tc, experts_fscore_tc, experts_ci_tc, experts_s_tc,
@@ -348,7 +350,7 @@ def gather_tweet_counts(hours, seeds, experts_precision, experts_fscore,
 
 
 def get_rankings(delta, seeds, experts_precision, experts_fscore, experts_ci,
-                 super_experts, social_bias_experts, category=None):
+                 super_experts, social_bias_experts, category=None, limit=None):
   """Gets the true rankings, and ranking as determined by various user groups.
   
   Keyword Arguments:
@@ -358,6 +360,7 @@ def get_rankings(delta, seeds, experts_precision, experts_fscore, experts_ci,
   newsaholics, active users, experts (precision, f-score, confidnce
   interval, and super).
   category -- The category to get rankings for, None for all news.
+  limit -- Only rank the first limit urls of each group, None for all.
   
   Returns:
   Returns rankings for the following user groups:
@@ -371,13 +374,11 @@ def get_rankings(delta, seeds, experts_precision, experts_fscore, experts_ci,
                                                        super_experts,
                                                        social_bias_experts,
                                                        category)
-  expert_precision_rankings = sorted(eptc.items(), key=lambda x: x[1],
-                                     reverse=True)
-  expert_fscore_rankings = sorted(eftc.items(), key=lambda x: x[1],
-                                  reverse=True)
-  expert_ci_rankings = sorted(ecitc.items(), key=lambda x: x[1], reverse=True)
-  expert_s_rankings = sorted(setc.items(), key=lambda x: x[1], reverse=True)
-  expert_sb_rankings = sorted(sbetc.items(), key=lambda x: x[1], reverse=True)
+  expert_precision_rankings = Ranking.from_counts(eptc, limit=limit)
+  expert_fscore_rankings = Ranking.from_counts(eftc, limit=limit)
+  expert_ci_rankings = Ranking.from_counts(ecitc, limit=limit)
+  expert_s_rankings = Ranking.from_counts(setc, limit=limit)
+  expert_sb_rankings = Ranking.from_counts(sbetc, limit=limit)
   return (expert_precision_rankings, expert_fscore_rankings,
           expert_ci_rankings, expert_s_rankings, expert_sb_rankings)
 
@@ -513,47 +514,34 @@ def select_experts_precision(valid_users, num_users, delta, size_experts,
 
 
 def split_ci_experts_by_followers(ci_experts):
-  users = {}
-  ci_hi = set()
-  ci_li = set()
-  with open('../data/SocialHubBias/user_info.tsv') as in_file:
-    for line in in_file:
-      tokens = line.split('\t')
-      user_id = tokens[_USER_INFO_FILE_ID_INDEX]
-      if user_id in ci_experts:
-        num_followers = int(tokens[_USER_INFO_FILE_FOLLOWERS_COUNT_INDEX])
-        screen_name = tokens[_USER_INFO_FILE_SCREEN_NAME_INDEX]
-        users[user_id] = (num_followers, screen_name)
-    users_sorted = sorted(users.items(), key=lambda x: x[1][0], reverse=True)
-    for i in range(len(users_sorted)):
-      user_id, (_,_) = users_sorted[i]
-      if i < len(users_sorted) / 2:
-        ci_hi.add(user_id)
-      else:
-        ci_li.add(user_id)
-  return ci_hi, ci_li
+  """Splits the CI experts into the more (hi) and less (li) followed half."""
+  return user_store.load_followers().split_by_median(ci_experts)
 
 
 def select_experts_social_bias(num_users, size_experts):
-  users = {}
-  d_num_followers = {}
-  with open('../data/SocialHubBias/user_info.tsv') as in_file:
-    for line in in_file:
-      tokens = line.split('\t')
-      user_id = tokens[_USER_INFO_FILE_ID_INDEX]
-      num_followers = int(tokens[_USER_INFO_FILE_FOLLOWERS_COUNT_INDEX])
-      screen_name = tokens[_USER_INFO_FILE_SCREEN_NAME_INDEX]
-      users[user_id] = (num_followers, screen_name)
-      d_num_followers[user_id] = num_followers
-  users_sorted = sorted(users.items(), key=lambda x: x[1][0], reverse=True)
-  num_experts_to_select = min([len(users), int(num_users * size_experts)])
-  experts = set()
-  with open('../data/SocialHubBias/social_bias_experts.tsv', 'w') as out_file:
-    for i in range(num_experts_to_select):
-      user_id, (num_followers, screen_name) = users_sorted[i]
-      out_file.write('%s\t%s\t%s\n' % (user_id, screen_name, num_followers))
-      experts.add(user_id)
-  return experts, d_num_followers
+  """Selects the most followed users as social bias experts.
+
+  The experts are also written to social_bias_experts.tsv, once per process
+  for a given number of experts.
+
+  Returns:
+  (experts, d_num_followers) -- The set of experts, and a dictionary of user id
+                                to follower count for all crawled users.
+  """
+  followers = user_store.load_followers()
+  num_experts_to_select = min([len(followers), int(num_users * size_experts)])
+  key = (followers.version, num_experts_to_select)
+  if not key in _social_bias_experts:
+    user_ids = [str(user_id) for user_id
+                in followers.top(num_experts_to_select).tolist()]
+    d_num_followers = followers.as_dict()
+    screen_names = user_store.open_store().screen_names(user_ids)
+    with open('../data/SocialHubBias/social_bias_experts.tsv', 'w') as out_file:
+      for user_id in user_ids:
+        out_file.write('%s\t%s\t%s\n' % (user_id, screen_names.get(user_id),
+                                         d_num_followers[user_id]))
+    _social_bias_experts[key] = set(user_ids)
+  return set(_social_bias_experts[key]), followers.as_dict()
 
 
 def select_super_experts(experts_precision, experts_fscore, experts_ci):
@@ -7,12 +7,15 @@ __author__ = 'Chris Moghbel (cmoghbel@cs.ucla.edu)'
 import Util
 import URLUtil
 import FileLog
+import activity_cube
+import data_files
+import metrics
+import vote_data
 import ground_truths
 from ground_truths import DataSet
 
 import os
 from datetime import datetime
-from datetime import timedelta
 
 from constants import _TWEETFILE_USER_ID_INDEX
 from constants import _TWEETFILE_CREATED_AT_INDEX
@@ -32,6 +35,7 @@ _LOG_FILE = 'folk_wisdom_training.log'
 _OUT_DIR = '../data/FolkWisdom/'
 
 
+@metrics.timed('find_hits_and_mises')
 def find_hits_and_mises(months, target_news, seeds, cache, delta,
                         category=None):
   """Finds the hit and miss count for each user.
@@ -39,6 +43,7 @@ def find_hits_and_mises(months, target_news, seeds, cache, delta,
   Keyword Arguments:
   months -- The months over which to calculate hit and misses.
   target_news -- A set of urls that is the set of known target news.
+  seeds -- (SeedTable) The seeds, see seed_table.
   cache -- A dictionary of short url to long url.
   category -- The category to find hits and misses for, None for all news.
   """
@@ -50,18 +55,19 @@ def find_hits_and_mises(months, target_news, seeds, cache, delta,
     for filename in os.listdir(dir_name):
       if '.tweet' in filename and 'http_nyti_ms' in filename:
         data_file = '%s/%s' % (dir_name, filename)
-        with open(data_file) as input_file:
-          for line in input_file:
+        with data_files.open_file(data_file) as input_file:
+          for line in metrics.counted(input_file):
             tokens = line.split('\t')
             user_id = tokens[_TWEETFILE_USER_ID_INDEX]
             tweet_text = tokens[_TWEETFILE_TWEET_TEXT_INDEX]
             urls = URLUtil.parse_urls(tweet_text, cache)
             for url in urls:
-              _, _, seed_time = seeds[url]
-              created = datetime.strptime(tokens[_TWEETFILE_CREATED_AT_INDEX],
-                                          _DATETIME_FORMAT)
-              time_delta = created - seed_time
-              if time_delta < timedelta(hours=delta):
+              url_id = seeds.url_id_of(url)
+              if url_id < 0:
+                raise KeyError(url)
+              created = vote_data.to_epoch(datetime.strptime(
+                  tokens[_TWEETFILE_CREATED_AT_INDEX], _DATETIME_FORMAT))
+              if created - seeds.seed_epoch[url_id] < delta * 3600:
                 category_matches = True
                 if category:
                   category_matches = False
@@ -89,60 +95,34 @@ def find_hits_and_mises(months, target_news, seeds, cache, delta,
   log('Wrote hits and misses to disk.')
 
 
-def sort_users_by_tweet_count(months, seeds, cache, delta, category=None):
+@metrics.timed('sort_users_by_tweet_count')
+def sort_users_by_tweet_count(months, delta, category=None, cache=None):
   """Sorts users by their tweet activity.
   
   Keyword Arguments:
   months -- The months for which to sort the users on.
-  cache -- Dictionary of short url to long url.
+  delta -- Only count tweets within delta hours of the seed time.
   category -- The category to go by, None for all news.
+  cache -- Dictionary of short url to long url, used if the activity cube has
+           to be rebuilt.
   """
-  user_id_to_tweet_count = {}
-  for month in months:
-    log('Gathering count information for users from %s for delta %s '
-        'and category %s' % (month, delta, category))
-    dir_name = Util.get_data_dir_name_for(month)
-    for filename in os.listdir(dir_name):
-      if '.tweet' in filename and 'http_nyti_ms' in filename:
-        data_file = '%s/%s' % (dir_name, filename)
-        with open(data_file) as input_file:
-          for line in input_file:
-            tokens = line.split('\t')
-            user_id = tokens[_TWEETFILE_USER_ID_INDEX]
-            tweet_text = tokens[_TWEETFILE_TWEET_TEXT_INDEX]
-            urls = URLUtil.parse_urls(tweet_text, cache)
-            for url in urls:
-              _, _, seed_time = seeds[url]
-              created = datetime.strptime(tokens[_TWEETFILE_CREATED_AT_INDEX],
-                                          _DATETIME_FORMAT)
-              time_delta = created - seed_time
-              if time_delta < timedelta(hours=delta):
-                if category:
-                  url_category = URLUtil.extract_category(url)
-                  if url_category == category:
-                    if user_id_to_tweet_count.has_key(user_id):
-                      user_id_to_tweet_count[user_id] += 1
-                    else:
-                      user_id_to_tweet_count[user_id] = 1
-                else:
-                  if user_id_to_tweet_count.has_key(user_id):
-                    user_id_to_tweet_count[user_id] += 1
-                  else:
-                    user_id_to_tweet_count[user_id] = 1
-                
-  user_ids_sorted_by_tweet_count = sorted(user_id_to_tweet_count.items(),
-                                          key=lambda x: x[1], reverse=True)
-  
+  log('Gathering count information for users from %s for delta %s '
+      'and category %s' % (months, delta, category))
+  user_ids, counts = activity_cube.load(cache=cache).ranked_users(months,
+                                                                  delta,
+                                                                  category)
+  metrics.add_rows(len(user_ids))
   log("Size of users for category %s (total): %s"
-      % (str(len(user_id_to_tweet_count.keys())), category))
+      % (str(len(user_ids)), category))
 
   output_file = _OUT_DIR + 'user_activity_%s_%s.tsv' % (delta, category)
   with open(output_file, 'w') as out_file:
-    for user_id, count in user_ids_sorted_by_tweet_count:
+    for user_id, count in zip(user_ids.tolist(), counts.tolist()):
       out_file.write('%s\t%s\n' % (user_id, count))
   log('Wrote users (sorted by activity) to disk') 
 
 
+@metrics.instrument_run('folk_wisdom_training')
 def run():
   """Main logic. Outputs data in format for further analysis."""
   global _OUT_DIR
@@ -156,9 +136,7 @@ def run():
     data_set = DataSet.TESTING
     months = _TESTING_SET_MONTHS
     _OUT_DIR += 'switched/'
-  retweets = set()
   if _EXCLUDE_RETWEETS:
-    retweets = ground_truths.find_retweets(months)
     _OUT_DIR += 'no_retweets/'
 
   Util.ensure_dir_exist(_OUT_DIR)
@@ -168,8 +146,8 @@ def run():
     for category in _CATEGORIES:
       gt_rankings = ground_truths.get_gt_rankings(seeds, data_set, category,
                                                   exclude_tweets_within_delta=_EXCLUDE_TWEETS_WITHIN_DELTA,
-                                                  retweets=retweets)
-      sort_users_by_tweet_count(months, seeds, cache, delta, category)
+                                                  exclude_retweets=_EXCLUDE_RETWEETS)
+      sort_users_by_tweet_count(months, delta, category, cache)
       target_news = ground_truths.find_target_news(gt_rankings, _SIZE_TOP_NEWS)
       find_hits_and_mises(months, target_news, seeds, cache,
                           delta, category)
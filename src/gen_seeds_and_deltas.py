@@ -4,85 +4,201 @@ This module parses the tweet files and generates two output files:
 1. Seed file (data/FolkWisdom/seed_times.tsv) -- This file maps url
    to it's seed time, or first time seen.
 2. Deltas file (data/FolkWisdom/time_deltas.tsv) -- The file maps a tweet
-   to the amount of seconds it happened after it's seed time.
+   to the amount of seconds it happened after it's seed time, along with its
+   url, category, source, and whether it is a retweet (and of which tweet and
+   user).
+
+It then converts the same files to columns (see tweet_columns) and builds the
+tweet fact table (see tweet_facts) from them.
 
 __author__ = 'Chris Moghbel (cmoghbel@cs.ucla.edu)
 """
 import FileLog
 import Util
 import URLUtil
+import data_files
+import metrics
+import tweet_columns
+import tweet_facts
+import vote_data
 
 from constants import _TWEETFILE_USER_ID_INDEX
 from constants import _TWEETFILE_TWEET_ID_INDEX
 from constants import _TWEETFILE_CREATED_AT_INDEX
 from constants import _TWEETFILE_TWEET_TEXT_INDEX
 from constants import _TWEETFILE_SOURCE_INDEX
+from constants import _TWEETFILE_RETWEETED_INDEX
+from constants import _TWEETFILE_ORIGIN_TWEET_ID_INDEX
+from constants import _TWEETFILE_ORIGIN_USER_ID_INDEX
 from constants import _DATETIME_FORMAT
 from constants import _TRAINING_SET_MONTHS
 from constants import _FULL_SET_MONTHS
 
+import heapq
 import os
+import shutil
+import tempfile
+import numpy as npy
+from array import array
 from datetime import datetime
 
 _LOG_FILE = 'gen_seeds_and_deltas.log'
 _REGENERATE_SEEDS = False
 
+# Bytes of time delta rows find_delta_times() holds in memory before spilling
+# a sorted run to disk, and the estimated bookkeeping per row on top of its
+# text.
+_SORT_MEMORY_BUDGET = 256 * 1024 * 1024
+_ROW_OVERHEAD = 120
+# Most run files merged at once.
+_MAX_MERGE_RUNS = 128
+
 
-def find_delta_times(months, seeds, cache):
+@metrics.timed('find_delta_times')
+def find_delta_times(months, seeds, cache, memory_budget=_SORT_MEMORY_BUDGET,
+                     spill_dir=None):
   """Finds the delta times for every url.
   
   Looks at every url, and calculates the time delta from previously calculated
   seed times.
+
+  The rows are sorted by delta with an external sort: whenever the rows held
+  in memory reach memory_budget, they are sorted and spilled to a run file,
+  and the runs are merged into the output at the end. As each tweet id is
+  written once, with its last url, the (int) tweet id of every row is kept to
+  find the last row of each tweet.
   
   Keyword Arguments:
   months -- The months over which to look at urls.
-  seeds -- A set of seed times, given as a dictionary of url to timedelta.
+  seeds -- (SeedTable) The seeds, see seed_table.
   cache -- Dictionary mapping short-url to long-url.
+  memory_budget -- Approximate number of bytes of rows to hold in memory.
+  spill_dir -- Directory for the run files, None for the system default.
   """
-  time_deltas = {}
-  for month in months:
-    log('Finding delta times from %s' % month)
-    dir_name = Util.get_data_dir_name_for(month) 
-    for filename in os.listdir(dir_name):
-      if '.tweet' in filename and 'http_nyti_ms' in filename:
-        data_file = '%s/%s' % (dir_name, filename)
-        with open(data_file) as input_file:
-          for line in input_file:
-            tokens = line.split('\t')
-            user_id = tokens[_TWEETFILE_USER_ID_INDEX]
-            tweet_id = tokens[_TWEETFILE_TWEET_ID_INDEX]
-            tweet_text = tokens[_TWEETFILE_TWEET_TEXT_INDEX]
-            urls = URLUtil.parse_urls(tweet_text, cache)
-            source = tokens[_TWEETFILE_SOURCE_INDEX]
-            for url in urls:
-              seed_tweet_id, _, seed_time = seeds[url]
-              category = URLUtil.extract_category(url)
-              if tweet_id == seed_tweet_id:
-                time_deltas[tweet_id] = (user_id, 0, url, category, source)
-              else:
-                created = datetime.strptime(tokens[_TWEETFILE_CREATED_AT_INDEX],
-                                            _DATETIME_FORMAT)
-                time_delta = created - seed_time
-                # Convert time delta to seconds to make it easy to read from
-                # file later.
-                time_delta_in_seconds = (time_delta.days * 86400
-                                         + time_delta.seconds)
-                time_deltas[tweet_id] = (user_id, time_delta_in_seconds, url,
-                                         category, source)
-  sorted_deltas = sorted(time_deltas.items(), key=lambda x: x[1][1],
-                         reverse=False)
-  for (tweet_id, tp) in sorted_deltas:
-    if len(tp) < 5:
-      print tp
-  with open('../data/FolkWisdom/time_deltas.tsv', 'w') as output_file:
-    for (tweet_id, (user_id, time_delta, url,
-                    category, source)) in sorted_deltas:
-      output_file.write('%s\t%s\t%s\t%s\t%s\t%s\n' % (tweet_id, user_id,
-                                                      time_delta, url, category,
-                                                      source))
+  run_dir = tempfile.mkdtemp(prefix='time_deltas_', dir=spill_dir)
+  runs = []
+  run = []
+  run_bytes = 0
+  tweet_ids = array('l')
+  try:
+    for month in months:
+      log('Finding delta times from %s' % month)
+      dir_name = Util.get_data_dir_name_for(month) 
+      for filename in os.listdir(dir_name):
+        if '.tweet' in filename and 'http_nyti_ms' in filename:
+          data_file = '%s/%s' % (dir_name, filename)
+          with data_files.open_file(data_file) as input_file:
+            for line in metrics.counted(input_file):
+              tokens = line.split('\t')
+              user_id = tokens[_TWEETFILE_USER_ID_INDEX]
+              tweet_id = tokens[_TWEETFILE_TWEET_ID_INDEX]
+              tweet_text = tokens[_TWEETFILE_TWEET_TEXT_INDEX]
+              urls = URLUtil.parse_urls(tweet_text, cache)
+              source = tokens[_TWEETFILE_SOURCE_INDEX]
+              retweeted = 0
+              if vote_data.parse_flag(tokens[_TWEETFILE_RETWEETED_INDEX]):
+                retweeted = 1
+              origin_tweet_id = tokens[_TWEETFILE_ORIGIN_TWEET_ID_INDEX].strip()
+              origin_user_id = tokens[_TWEETFILE_ORIGIN_USER_ID_INDEX].strip()
+              for url in urls:
+                url_id = seeds.url_id_of(url)
+                if url_id < 0:
+                  raise KeyError(url)
+                category = URLUtil.extract_category(url)
+                time_delta_in_seconds = 0
+                if int(tweet_id) != seeds.seed_tweet_id[url_id]:
+                  created = vote_data.to_epoch(datetime.strptime(
+                      tokens[_TWEETFILE_CREATED_AT_INDEX], _DATETIME_FORMAT))
+                  time_delta_in_seconds = int(created
+                                              - seeds.seed_epoch[url_id])
+                row = ('%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\t%s\n'
+                       % (tweet_id, user_id, time_delta_in_seconds, url,
+                          category, source, retweeted, origin_tweet_id,
+                          origin_user_id))
+                run.append((time_delta_in_seconds, len(tweet_ids), row))
+                tweet_ids.append(int(tweet_id))
+                run_bytes += len(row) + _ROW_OVERHEAD
+                if run_bytes >= memory_budget:
+                  runs.append(_spill_run(run, run_dir, len(runs)))
+                  run = []
+                  run_bytes = 0
+
+    log('Merging %s spilled runs of time deltas' % len(runs))
+    metrics.incr('find_delta_times.runs', len(runs))
+    runs = _reduce_runs(runs, run_dir)
+    is_last = _last_rows(tweet_ids)
+    del tweet_ids
+    run.sort()
+    with open('../data/FolkWisdom/time_deltas.tsv', 'w') as output_file:
+      for _, row_number, row in heapq.merge(iter(run),
+                                            *[_read_run(run_file)
+                                              for run_file in runs]):
+        if is_last[row_number]:
+          output_file.write(row)
+  finally:
+    shutil.rmtree(run_dir, ignore_errors=True)
   log('Wrote time deltas to disk')
 
 
+def _spill_run(run, run_dir, run_number):
+  """Sorts the rows of a run by (delta, row number) and writes them to a file.
+
+  Returns:
+  run_file -- The name of the run file.
+  """
+  run.sort()
+  run_file = os.path.join(run_dir, 'run_%s.tsv' % run_number)
+  with open(run_file, 'w') as out_file:
+    for delta, row_number, row in run:
+      out_file.write('%s\t%s\t%s' % (delta, row_number, row))
+  log('Spilled run %s (%s rows)' % (run_number, len(run)))
+  return run_file
+
+
+def _reduce_runs(runs, run_dir):
+  """Merges runs into fewer, longer runs until at most _MAX_MERGE_RUNS are
+  left, so the final merge does not hold too many files open.
+
+  Returns:
+  runs -- The names of the remaining run files.
+  """
+  while len(runs) > _MAX_MERGE_RUNS:
+    merged_runs = []
+    for start in range(0, len(runs), _MAX_MERGE_RUNS):
+      run_file = os.path.join(run_dir, 'merged_%s_%s.tsv'
+                              % (len(runs), len(merged_runs)))
+      with open(run_file, 'w') as out_file:
+        for delta, row_number, row in heapq.merge(
+            *[_read_run(run) for run in runs[start:start + _MAX_MERGE_RUNS]]):
+          out_file.write('%s\t%s\t%s' % (delta, row_number, row))
+      for run in runs[start:start + _MAX_MERGE_RUNS]:
+        os.remove(run)
+      merged_runs.append(run_file)
+    runs = merged_runs
+  return runs
+
+
+def _read_run(run_file):
+  """Yields the (delta, row number, row) tuples of a run file, in order."""
+  with open(run_file) as in_file:
+    for line in in_file:
+      delta, row_number, row = line.split('\t', 2)
+      yield int(delta), int(row_number), row
+
+
+def _last_rows(tweet_ids):
+  """Returns, for every row, whether it is the last row of its tweet id."""
+  tweet_ids = npy.frombuffer(tweet_ids, dtype='l')
+  rows = npy.argsort(tweet_ids, kind='mergesort')
+  sorted_ids = tweet_ids[rows]
+  is_last = npy.zeros(len(rows), dtype=bool)
+  if not len(rows):
+    return is_last
+  is_last[rows[npy.append(sorted_ids[1:] != sorted_ids[:-1], True)]] = True
+  return is_last
+
+
+@metrics.timed('find_seed_times')
 def find_seed_times(months, cache):
   """Finds the time at which each url was seen.
   
@@ -97,8 +213,8 @@ def find_seed_times(months, cache):
     for filename in os.listdir(dir_name):
       if '.tweet' in filename and 'http_nyti_ms' in filename:
         data_file = '%s/%s' % (dir_name, filename)
-        with open(data_file) as input_file:
-          for line in input_file:
+        with data_files.open_file(data_file) as input_file:
+          for line in metrics.counted(input_file):
             tokens = line.split('\t')
             user_id = tokens[_TWEETFILE_USER_ID_INDEX]
             tweet_id = tokens[_TWEETFILE_TWEET_ID_INDEX]
@@ -119,30 +235,24 @@ def find_seed_times(months, cache):
   log('Wrote seed times to disk')
 
 
+@metrics.timed('find_size_of_market')
 def find_size_of_market(months):
   """Outputs the size of the market (total number of users) for reference.
 
   Keyword Arguments:
   months -- The months to consider.
   """
-  user_ids = set()
+  user_ids = []
   for month in months:
     log('Finding size of unfiltered market...')
-    dir_name = Util.get_data_dir_name_for(month)
-    for filename in os.listdir(dir_name):
-      if '.tweet' in filename and 'http_nyti_ms' in filename:
-        data_file = '%s/%s' % (dir_name, filename)
-        with open(data_file) as input_file:
-          for line in input_file:
-            tokens = line.split('\t')
-            user_id = tokens[_TWEETFILE_USER_ID_INDEX]
-            if not user_id in user_ids:
-              user_ids.add(user_id)
+    user_ids.append(tweet_columns.load(month, ['user_id'])['user_id'])
+  user_ids = npy.unique(npy.concatenate(user_ids or [npy.array([])]))
 
   with open('../data/FolkWisdom/size_of_market_unfiltered.txt', 'w') as out_f:
     out_f.write('%s' % len(user_ids))
 
 
+@metrics.instrument_run('gen_seeds_and_deltas')
 def run():
   """Main logic for this analysis."""
   cache = Util.load_cache()
@@ -153,6 +263,8 @@ def run():
   seeds = Util.load_seeds()
 
   find_delta_times(_FULL_SET_MONTHS, seeds, cache)
+  tweet_columns.convert(_FULL_SET_MONTHS)
+  tweet_facts.load(_FULL_SET_MONTHS, cache=cache)
   find_size_of_market(_TRAINING_SET_MONTHS)
 
 
@@ -1,36 +1,30 @@
 """
 Handles operations involving finding ground truths and top news sets.
 
+Ground truth rankings are memoized: each distinct (dataset, category, delta,
+exclusion flags) ranking is computed once, kept for the rest of the process,
+and saved under data/FolkWisdom/gt_rankings/ as an .npz of url ids and counts
+for later runs. Saved rankings are discarded when time_deltas.tsv or
+seed_times.tsv change.
+
 __author__ = 'Chris Moghbel (cmoghbel@cs.ucla.edu)
 """
-import os
 import Util
-import URLUtil
-
-from constants import _TWEETFILE_TWEET_ID_INDEX
-from constants import _TWEETFILE_RETWEETED_INDEX
-from constants import _TIMEDELTAS_FILE_URL_INDEX
-from constants import _TIMEDELTAS_FILE_SOURCE_INDEX
-from constants import _TIMEDELTAS_FILE_DELTA_INDEX
-from constants import _TIMEDELTAS_FILE_TWEET_ID_INDEX
-
-
-def find_retweets(months):
-  retweets = set()
-  for month in months:
-    print 'Finding retweets from %s'
-    dir_name = Util.get_data_dir_name_for(month) 
-    for filename in os.listdir(dir_name):
-      if '.tweet' in filename and 'http_nyti_ms' in filename:
-        data_file = '%s/%s' % (dir_name, filename)
-        with open(data_file) as input_file:
-          for line in input_file:
-            tokens = line.split('\t')
-            retweet = bool(tokens[_TWEETFILE_RETWEETED_INDEX])
-            if retweet:
-              tweet_id = tokens[_TWEETFILE_TWEET_ID_INDEX]
-              retweets.add(tweet_id)
-  return retweets
+import columnar
+import metrics
+import vote_data
+from ranking import Ranking
+
+import os
+import json
+import zipfile
+import numpy as npy
+
+_SEEDS_FILENAME = '../data/FolkWisdom/seed_times.tsv'
+_MEMO_DIR = '../data/FolkWisdom/gt_rankings/'
+
+# Ground truth rankings computed (or loaded) in this process, by memo key.
+_gt_rankings_memo = {}
 
 
 def find_target_news(gt_rankings, size_top_news):
@@ -44,64 +38,151 @@ def find_target_news(gt_rankings, size_top_news):
   target_news -- A set of target news for the given category.
   """
   num_news = int(len(gt_rankings) * size_top_news)
-  target_news = set()
-  for i in range(0, num_news):
-    url, _ = gt_rankings[i]
-    target_news.add(url)
-  return target_news
+  return set([url for url, _ in gt_rankings[:num_news]])
 
 
+@metrics.timed('get_gt_rankings')
 def get_gt_rankings(seeds, dataset, category=None, delta=4,
-                    exclude_tweets_within_delta=False, retweets=set()):
+                    exclude_tweets_within_delta=False, exclude_retweets=False):
   """Generate the ground truth rankings.
   
   Keyword Arguments:
   seeds -- A dictionary of url to first time seen.
-  training -- Boolean to indicate if we want training window. False specifies
-              testing window.
+  dataset -- The DataSet whose window the url seed times must fall in.
   category -- The category to get gt's for, None for all news.
+  delta -- The time delta in hours, used with exclude_tweets_within_delta.
+  exclude_tweets_within_delta -- Only count tweets within delta hours of the
+                                 seed time.
+  exclude_retweets -- Do not count retweets.
 
   Returns:
-  gt_rankings -- A list of (url, count) pairs in ranked order.
+  gt_rankings -- (Ranking) The urls in ranked order, with their counts.
+
+  Rankings are memoized assuming seeds is the full set of seeds loaded by
+  Util.load_seeds().
   """
-  gt_tweet_counts = {}
-  with open('../data/FolkWisdom/time_deltas.tsv') as input_file:
-    for line in input_file:
-      tokens = line.split('\t')
-      source = tokens[_TIMEDELTAS_FILE_SOURCE_INDEX].strip()
-      url = tokens[_TIMEDELTAS_FILE_URL_INDEX]
-      tweet_id = tokens[_TIMEDELTAS_FILE_TWEET_ID_INDEX]
-      tweet_delta = float(tokens[_TIMEDELTAS_FILE_DELTA_INDEX]) / 3600
-      include_tweet = True
-      if exclude_tweets_within_delta:
-        if tweet_delta > delta:
-          include_tweet = False
-      if url in seeds and include_tweet and not tweet_id in retweets:
-        _, _, seed_time = seeds[url]
-        is_in_window = False
-        if dataset == DataSet.TRAINING:
-          is_in_window = Util.is_in_training_set(seed_time)
-        elif dataset == DataSet.TESTING:
-          is_in_window = Util.is_in_testing_set(seed_time)
-        else:
-          is_in_window = True
-        if is_in_window:
-          category_matches = True
-          if category:
-            category_matches = False
-            url_category = URLUtil.extract_category(url)
-            if url_category == category:
-              category_matches = True
-          if category_matches:
-            if url in gt_tweet_counts:
-              gt_tweet_counts[url] += 1
-            else:
-              gt_tweet_counts[url] = 1
-
-  gt_rankings = sorted(gt_tweet_counts.items(), key=lambda x: x[1],
-                       reverse=True)
+  votes = vote_data.load()
+  if exclude_retweets and not votes.has_retweet_info:
+    raise ValueError('time_deltas.tsv has no retweet columns, rerun '
+                     'gen_seeds_and_deltas to exclude retweets.')
+  if not exclude_tweets_within_delta:
+    # delta only matters when excluding by it.
+    delta = None
+  key = 'gt_%s_%s_%s_%s' % (dataset, category, delta, exclude_retweets)
+  if key in _gt_rankings_memo:
+    metrics.incr('gt_rankings.cache_hit')
+    return _gt_rankings_memo[key]
+  fingerprint = json.dumps([votes.sources, len(seeds),
+                            _seeds_fingerprint()])
+  ranked_ids, counts = _load_memo(key, fingerprint)
+  if ranked_ids is None:
+    metrics.incr('gt_rankings.cache_miss')
+    ranked_ids, counts = _compute_gt_rankings(votes, seeds, dataset, category,
+                                              delta, exclude_retweets)
+    _save_memo(key, fingerprint, ranked_ids, counts)
+  else:
+    metrics.incr('gt_rankings.cache_hit')
+  gt_rankings = Ranking(ranked_ids, counts, votes.urls)
+  _gt_rankings_memo[key] = gt_rankings
   return gt_rankings
 
+
+def _compute_gt_rankings(votes, seeds, dataset, category, delta,
+                         exclude_retweets):
+  """Computes a ground truth ranking, see get_gt_rankings.
+
+  delta is None to count votes regardless of time delta.
+
+  Returns:
+  (ranked_ids, counts) -- Arrays of url ids in ranked order and their counts.
+  """
+  def url_matches(url):
+    if not url in seeds:
+      return False
+    _, _, seed_time = seeds[url]
+    if dataset == DataSet.TRAINING:
+      return Util.is_in_training_set(seed_time)
+    elif dataset == DataSet.TESTING:
+      return Util.is_in_testing_set(seed_time)
+    return True
+
+  max_delta = None
+  if delta is not None:
+    max_delta = delta * 3600
+  seed_start, seed_end = seed_window(dataset)
+  rows = votes.scan(max_delta, seed_start, seed_end, category)
+  metrics.add_rows(len(rows))
+  url_ids = votes.url_id[rows]
+  if exclude_retweets:
+    url_ids = url_ids[~votes.retweeted[rows]]
+
+  gt_tweet_counts = npy.bincount(url_ids, minlength=votes.num_urls())
+  ranked_ids = npy.flatnonzero(gt_tweet_counts)
+  # Only look up the seeds of urls that received votes.
+  is_match = [url_matches(url) for url in votes.urls[ranked_ids].tolist()]
+  ranked_ids = ranked_ids[npy.array(is_match, dtype=bool)]
+  # Stable sort, so ties are ranked by url.
+  ranked_ids = ranked_ids[npy.argsort(-gt_tweet_counts[ranked_ids],
+                                      kind='mergesort')]
+  return ranked_ids.astype(npy.int32), gt_tweet_counts[ranked_ids]
+
+
+def seed_window(dataset):
+  """Returns the [seed_start, seed_end) epochs of a DataSet's window.
+
+  Either is None when the window is not bounded on that side, for use with
+  vote_data.VoteData.scan().
+  """
+  if dataset == DataSet.TRAINING:
+    return Util._TRAINING_START_EPOCH, Util._TESTING_START_EPOCH
+  elif dataset == DataSet.TESTING:
+    return Util._TESTING_START_EPOCH, Util._TESTING_END_EPOCH
+  return None, None
+
+
+def _seeds_fingerprint():
+  if os.path.exists(_SEEDS_FILENAME):
+    return columnar.fingerprint([_SEEDS_FILENAME])
+  return None
+
+
+def _load_memo(key, fingerprint):
+  """Loads a saved ranking, or (None, None) if missing, unreadable or out of
+  date.
+  """
+  memo_file = _MEMO_DIR + key + '.npz'
+  if not os.path.exists(memo_file):
+    return None, None
+  try:
+    saved = npy.load(memo_file)
+    try:
+      if str(saved['fingerprint']) != fingerprint:
+        return None, None
+      return saved['url_ids'], saved['counts']
+    finally:
+      saved.close()
+  except (IOError, OSError, ValueError, KeyError, EOFError,
+          zipfile.BadZipfile):
+    return None, None
+
+
+def _save_memo(key, fingerprint, ranked_ids, counts):
+  """Saves a ranking for later runs.
+
+  The ranking is written to a file of this process and then renamed, so
+  concurrent or interrupted saves never leave a partial memo behind.
+  """
+  memo_file = _MEMO_DIR + key + '.npz'
+  tmp_file = '%s.%s.tmp.npz' % (memo_file, os.getpid())
+  try:
+    Util.ensure_dir_exist(_MEMO_DIR)
+    npy.savez(tmp_file, url_ids=ranked_ids, counts=counts.astype(npy.int32),
+              fingerprint=npy.array(fingerprint))
+    os.rename(tmp_file, memo_file)
+  except (IOError, OSError):
+    if os.path.exists(tmp_file):
+      os.remove(tmp_file)
+
 class DataSet:
   """Enum for data set values."""
 
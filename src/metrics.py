@@ -0,0 +1,286 @@
+"""
+Lightweight instrumentation for analysis runs.
+
+Records per-stage timers, rows parsed per second, bytes read, peak RSS,
+counters (e.g. URLUtil.parse_urls cache hits) and arbitrary values (e.g.
+per-group vote totals). Each run writes one JSON-lines file next to the
+FileLog logs, e.g. ../log/aFolkWisdom.20111101_120000.metrics.jsonl.
+
+When collection is disabled (params._COLLECT_METRICS = False) every helper
+returns immediately, so instrumentation can stay in hot paths.
+
+Suggested way to use:
+(1) Decorate the main logic of an analysis:
+    @metrics.instrument_run('aFolkWisdom')
+    def run():
+      ...
+
+(2) Time expensive stages, and report what they consumed:
+    @metrics.timed('get_gt_rankings')
+    def get_gt_rankings(...):
+      with open(filename) as input_file:
+        for line in metrics.counted(input_file):
+          ...
+
+    or, for a block inside a function:
+    with metrics.stage('draw'):
+      ...
+
+(3) Count events or record values:
+    metrics.incr('parse_urls.cache_hit')
+    metrics.record('votes.ci', total_votes)
+"""
+import FileLog
+
+import os
+import json
+import time
+import resource
+import functools
+from datetime import datetime
+
+from params import _COLLECT_METRICS
+
+_CACHE_HIT_SUFFIX = '.cache_hit'
+_CACHE_MISS_SUFFIX = '.cache_miss'
+
+# The run currently being instrumented, None when disabled or between runs.
+_run = None
+
+
+class _Stage:
+  """A timed section of a run. Rows and bytes roll up into the parent stage."""
+
+  def __init__(self, name):
+    self.name = name
+    self.rows = 0
+    self.bytes = 0
+    self.start = None
+
+  def __enter__(self):
+    if _run is not None:
+      self.start = time.time()
+      _run.stages.append(self)
+    return self
+
+  def __exit__(self, exc_type, exc_value, exc_tb):
+    if _run is None or self.start is None:
+      return False
+    seconds = time.time() - self.start
+    _run.stages.remove(self)
+    if _run.stages:
+      parent = _run.stages[-1]
+      parent.rows += self.rows
+      parent.bytes += self.bytes
+    entry = {'type': 'stage',
+             'name': '/'.join([s.name for s in _run.stages] + [self.name]),
+             'seconds': seconds,
+             'rows': self.rows,
+             'bytes': self.bytes,
+             'peak_rss_kb': peak_rss_kb()}
+    if self.rows and seconds > 0:
+      entry['rows_per_sec'] = self.rows / seconds
+    if self.bytes and seconds > 0:
+      entry['mb_per_sec'] = self.bytes / seconds / (1024 * 1024)
+    if exc_type is not None:
+      entry['error'] = exc_type.__name__
+    _run.write(entry)
+    return False
+
+
+class _NullStage:
+  """Stand-in returned by stage() when metrics are disabled."""
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, exc_tb):
+    return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Run:
+  """State for one instrumented run."""
+
+  def __init__(self, name, log_path):
+    self.name = name
+    self.start = time.time()
+    self.stages = []
+    self.counters = {}
+    self.rows = 0
+    self.bytes = 0
+    FileLog.set_log_dir(log_path)
+    self.filename = '%s%s.%s.metrics.jsonl' % (
+        log_path, name, datetime.now().strftime('%Y%m%d_%H%M%S'))
+    self.out_file = open(self.filename, 'w')
+
+  def write(self, entry):
+    self.out_file.write(json.dumps(entry) + '\n')
+    self.out_file.flush()
+
+  def close(self, error=None):
+    counters = dict(self.counters)
+    for name, hits in self.counters.items():
+      if name.endswith(_CACHE_HIT_SUFFIX):
+        prefix = name[:-len(_CACHE_HIT_SUFFIX)]
+        misses = self.counters.get(prefix + _CACHE_MISS_SUFFIX, 0)
+        if hits + misses:
+          counters[prefix + '.cache_hit_rate'] = float(hits) / (hits + misses)
+    if counters:
+      self.write({'type': 'counters', 'values': counters})
+    seconds = time.time() - self.start
+    entry = {'type': 'run', 'name': self.name, 'seconds': seconds,
+             'rows': self.rows, 'bytes': self.bytes,
+             'peak_rss_kb': peak_rss_kb()}
+    if error:
+      entry['error'] = error
+    self.write(entry)
+    self.out_file.close()
+
+
+def enabled():
+  """Returns True if a run is currently being instrumented.
+
+  Use this to skip computing values that only exist to be recorded.
+  """
+  return _run is not None
+
+
+def peak_rss_kb():
+  """Returns the peak resident set size of this process, in kilobytes."""
+  return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def start_run(name, log_path=FileLog.default_log_path):
+  """Starts collecting metrics for a run, if collection is turned on.
+
+  Keyword Arguments:
+  name -- Name of the run, used as the prefix of the metrics file.
+  log_path -- Directory to write the metrics file to, defaults to the FileLog
+              log directory.
+  """
+  global _run
+  if not _COLLECT_METRICS or _run is not None:
+    return
+  _run = _Run(name, log_path)
+
+
+def end_run(error=None):
+  """Writes the run summary and closes the metrics file."""
+  global _run
+  if _run is None:
+    return
+  run, _run = _run, None
+  run.close(error)
+
+
+def instrument_run(name):
+  """Decorator that wraps a run() function in start_run() and end_run()."""
+  def decorator(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+      if not _COLLECT_METRICS or _run is not None:
+        return func(*args, **kwargs)
+      start_run(name)
+      try:
+        result = func(*args, **kwargs)
+      except BaseException, err:
+        end_run(error=type(err).__name__)
+        raise
+      end_run()
+      return result
+    return wrapper
+  return decorator
+
+
+def stage(name):
+  """Returns a context manager timing the enclosed block as a stage."""
+  if _run is None:
+    return _NULL_STAGE
+  return _Stage(name)
+
+
+def timed(name):
+  """Decorator that times every call of a function as a stage."""
+  def decorator(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+      if _run is None:
+        return func(*args, **kwargs)
+      with _Stage(name):
+        return func(*args, **kwargs)
+    return wrapper
+  return decorator
+
+
+def add_rows(num_rows):
+  """Adds to the number of rows parsed by the current stage."""
+  if _run is None:
+    return
+  _run.rows += num_rows
+  if _run.stages:
+    _run.stages[-1].rows += num_rows
+
+
+def add_bytes(num_bytes):
+  """Adds to the number of bytes read by the current stage."""
+  if _run is None:
+    return
+  _run.bytes += num_bytes
+  if _run.stages:
+    _run.stages[-1].bytes += num_bytes
+
+
+def add_file(filename):
+  """Adds the size of a file that is about to be read in full."""
+  if _run is None:
+    return
+  add_bytes(os.path.getsize(filename))
+
+
+def counted(input_file):
+  """Iterates over the lines of an open file, counting them as rows read.
+
+  The size of the file is added to the bytes read by the current stage. When
+  metrics are disabled the file itself is returned, so iteration costs nothing
+  extra.
+  """
+  if _run is None:
+    return input_file
+  return _count_lines(input_file)
+
+
+def _count_lines(input_file):
+  # Compressed files (see data_files) count their compressed size.
+  if hasattr(input_file, 'fileno'):
+    add_bytes(os.fstat(input_file.fileno()).st_size)
+  else:
+    add_bytes(os.path.getsize(input_file.name))
+  num_rows = 0
+  try:
+    for line in input_file:
+      num_rows += 1
+      yield line
+  finally:
+    add_rows(num_rows)
+
+
+def incr(name, amount=1):
+  """Increments a named counter."""
+  if _run is None:
+    return
+  _run.counters[name] = _run.counters.get(name, 0) + amount
+
+
+def record(name, value, **tags):
+  """Records a single named value, with optional tags (e.g. delta=4)."""
+  if _run is None:
+    return
+  entry = {'type': 'value', 'name': name, 'value': value}
+  if tags:
+    entry['tags'] = tags
+  if _run.stages:
+    entry['stage'] = _run.stages[-1].name
+  _run.write(entry)
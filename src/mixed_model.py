@@ -4,6 +4,10 @@ This module handles operations and graph drawing for the mixed model approach.
 __author = 'Chris Moghbel (cmoghbel@cs.ucla.edu)
 """
 import Util
+import vote_data
+from ranking import Ranking
+
+import numpy as npy
 
 import matplotlib
 matplotlib.use("Agg")
@@ -126,80 +130,76 @@ def draw_precision_recall_mixed(market_precisions, market_recalls,
   plt.close()
 
 
-def get_mixed_rankings(market_url_to_rank, market_precisions,
-                       precision_url_to_rank, expert_p_precisions,
-                       fscore_url_to_rank, expert_f_precisions,
-                       ci_url_to_rank, expert_c_precisions,
-                       gt_url_to_rank):
-  """Finds ranking based on min ranking of 4 rankings sets.
-
-  Ground truths rankings are used to break ties.
+def url_ranks(ranking, urls):
+  """Returns the rank of each url in a ranking, indexed by url id.
 
   Keyword Arguments:
-  market_url_to_rank -- Dictionary from url to market ranking.
-  precision_url_to_rank -- Dictionary from url to precision expert rankings.
-  fscore_url_to_rank -- Dictionary from url to fscore expert rankings.
-  ci_url_to_rank -- Dictionary from url to ci expert rankings.
-  gt_url_to_rank -- Dictionary from url to ground truth ranking.
+  ranking -- (Ranking) Or a list of (url, count) pairs, best first.
+  urls -- (npy.array) The sorted urls that url ids index, e.g. VoteData.urls.
 
   Returns:
-  mixed_rankings -- A list of (url, count) pairs representing the rankings.
+  ranks -- (npy.array<int64>) The 0 based rank of each url id, -1 if the url
+           is not in the ranking. Ranked urls that are not in urls have no url
+           id, and are left out.
   """
-  urls = set()
-  urls = urls.union(market_url_to_rank.keys())
-  urls = urls.union(precision_url_to_rank.keys())
-  urls = urls.union(fscore_url_to_rank.keys())
-  urls = urls.union(ci_url_to_rank.keys())
-
-  mixed_error_to_url_list = {}
-  for url in urls:
-    market_error = 100.0
-    precision_error = 100.0
-    fscore_error = 100.0
-    ci_error = 100.0
-    if url in market_url_to_rank:
-      market_rank = market_url_to_rank[url]
-      if market_rank <= len(market_precisions):
-        market_error = 100.0 - market_precisions[market_rank - 1]
-    if url in precision_url_to_rank:
-      precision_rank = precision_url_to_rank[url]
-      if precision_rank <= len(expert_p_precisions):
-        precision_error = 100.0 - expert_p_precisions[precision_rank - 1]
-    if url in fscore_url_to_rank:
-      fscore_rank = fscore_url_to_rank[url]
-      if fscore_rank <= len(expert_f_precisions):
-        fscore_error = 100.0 - expert_f_precisions[fscore_rank - 1]
-    if url in ci_url_to_rank:
-      ci_rank = ci_url_to_rank[url]
-      if ci_rank <= len(expert_c_precisions):
-        ci_error = 100.0 - expert_c_precisions[ci_rank - 1]
-    mixed_error = min(market_error, precision_error, fscore_error, ci_error)
-    if url in gt_url_to_rank:
-      gt_rank = gt_url_to_rank[url]
-      if mixed_error in mixed_error_to_url_list:
-        mixed_error_to_url_list[mixed_error].append((url, gt_rank))
-      else:
-        mixed_error_to_url_list[mixed_error] = [(url, gt_rank), ]
-
-  rankings = break_ties(mixed_error_to_url_list)
-  return rankings
-
-
-def break_ties(mixed_rank_to_url_list):
-  """Breaks ties in rank when finding rankings for mixed model.
-
-  Keyword Argument:
-  mixed_rank_to_url_list -- A dictionary from rank to a list of
-                            (url, count) pairs for that rank.
+  if isinstance(ranking, Ranking) and ranking.urls is urls:
+    return ranking.ranks()
+  ranks = npy.empty(len(urls), dtype=npy.int64)
+  ranks.fill(-1)
+  if ranking and len(urls):
+    wanted = npy.array([url for url, _ in ranking])
+    url_ids = npy.searchsorted(urls, wanted)
+    found = url_ids < len(urls)
+    found[found] = urls[url_ids[found]] == wanted[found]
+    ranks[url_ids[found]] = npy.flatnonzero(found)
+  return ranks
+
+
+def rank_errors(ranks, precisions):
+  """Returns the error (100 - precision) at the rank of each url id.
+
+  Urls that are not ranked, or ranked past the end of the precisions, have an
+  error of 100. As in the original lookup, rank 0 takes the last precision.
+  """
+  errors = npy.empty(len(ranks))
+  errors.fill(100.0)
+  precisions = npy.asarray(precisions, dtype=npy.float64)
+  if len(precisions):
+    in_range = (ranks >= 0) & (ranks <= len(precisions))
+    errors[in_range] = 100.0 - precisions[ranks[in_range] - 1]
+  return errors
+
+
+def get_mixed_rankings(components, gt_rankings, urls=None):
+  """Finds ranking based on min error over any number of ranking sets.
+
+  Each url gets the smallest error (100 - precision at its rank) it has in
+  any of the rankings; ground truths rankings are used to break ties.
+
+  Keyword Arguments:
+  components -- A list of (rankings, precisions) pairs, where rankings is a
+                Ranking (or list of (url, count) pairs) and precisions the
+                precision of those rankings at each number of guesses.
+  gt_rankings -- (Ranking) The ground truth rankings.
+  urls -- (npy.array) The sorted urls to index by, VoteData.urls if None.
 
   Returns:
-  rankings - A list of (url, count) pairs representing the ranking w/ ties
-             broken.
+  mixed_rankings -- A list of (url, ground truth rank) pairs representing the
+                    rankings.
   """
-  prelim_rankings = sorted(mixed_rank_to_url_list.items(), key=lambda x: x[0])
-  rankings = []
-  for _, urls in prelim_rankings:
-    urls_sorted = sorted(urls, key=lambda x: x[1])
-    for url in urls_sorted:
-      rankings.append(url)
-  return rankings
+  if urls is None:
+    urls = vote_data.load().urls
+  gt_ranks = url_ranks(gt_rankings, urls)
+  mixed_errors = npy.empty(len(urls))
+  mixed_errors.fill(100.0)
+  is_ranked = npy.zeros(len(urls), dtype=bool)
+  for rankings, precisions in components:
+    ranks = url_ranks(rankings, urls)
+    is_ranked |= ranks >= 0
+    npy.minimum(mixed_errors, rank_errors(ranks, precisions), mixed_errors)
+
+  url_ids = npy.flatnonzero(is_ranked & (gt_ranks >= 0))
+  # Sort by error, then by ground truth rank.
+  order = npy.lexsort((gt_ranks[url_ids], mixed_errors[url_ids]))
+  url_ids = url_ids[order]
+  return zip(urls[url_ids].tolist(), gt_ranks[url_ids].tolist())
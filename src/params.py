@@ -39,3 +39,12 @@ _SWITCHED = False
 
 _CI_WEIGHT = .65
 _WEIGHT = .15
+
+# Bootstrap confidence bands (see bootstrap.py). 'users' resamples the members
+# of each group, 'urls' the news being ranked. A seed of None picks one at random.
+_BOOTSTRAP_REPLICATES = 1000
+_BOOTSTRAP_RESAMPLE = 'users'
+_BOOTSTRAP_SEED = None
+
+# Toggle for writing a metrics file (see metrics.py) alongside the logs.
+_COLLECT_METRICS = False
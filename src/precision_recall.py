@@ -1,3 +1,4 @@
+import metrics
 import user_groups
 
 from params import _SIZE_TOP_NEWS
@@ -115,6 +116,15 @@ def draw_with_markers(precisions_list, recalls_list, labels, file_prefix,
   plt.close()
 
 
+def ranking_limit(gt_rankings):
+  """Returns how many urls of a ranking calc_precision_recall looks at.
+
+  Rankings that are only used for their precision and recall can be limited to
+  this many urls, see rankings.get_rankings.
+  """
+  return int(len(gt_rankings) * _SIZE_TOP_NEWS)
+
+
 def calc_precision_recall(gt_rankings, other_rankings):
   """Calculates the precision recall scores for a set of rankings against truth.
 
@@ -131,7 +141,7 @@ def calc_precision_recall(gt_rankings, other_rankings):
   """
   size_target_news = int(len(gt_rankings) * _SIZE_TOP_NEWS)
   max_num_news_to_consider = min(len(other_rankings),
-                                 int(len(gt_rankings) * _SIZE_TOP_NEWS))
+                                 ranking_limit(gt_rankings))
   target_news = set()
   for i in range(size_target_news):
     (url, _) = gt_rankings[i]
@@ -157,32 +167,25 @@ def calc_precision_recall(gt_rankings, other_rankings):
   return precisions, recalls
 
 
+@metrics.timed('get_precision_recalls')
 def get_precision_recalls(gt_rankings, rankings):
+  """Calculates the precision recall scores of each ranking in rankings.
+
+  Keyword Arguments:
+  gt_rankings -- The ground truth rankings.
+  rankings -- (UserGroups) The rankings of some models, see
+              rankings.get_rankings.
+
+  Returns:
+  (precisions, recalls) -- UserGroups, set for the same models as rankings.
+  """
   precisions = user_groups.UserGroups()
   recalls = user_groups.UserGroups()
 
-  precisions.population, recalls.population = calc_precision_recall(gt_rankings, rankings.population)
-  precisions.newsaholics, recalls.newsaholics = calc_precision_recall(gt_rankings, rankings.newsaholics)
-  precisions.active_users, recalls.active_users = calc_precision_recall(gt_rankings, rankings.active_users)
-  precisions.common_users, recalls.common_users = calc_precision_recall(gt_rankings, rankings.common_users)
-  precisions.precision, recalls.precision = calc_precision_recall(gt_rankings, rankings.precision)
-  precisions.fscore, recalls.fscore = calc_precision_recall(gt_rankings, rankings.fscore)
-  precisions.ci, recalls.ci = calc_precision_recall(gt_rankings, rankings.ci)
-  precisions.ci_hi, recalls.ci_hi = calc_precision_recall(gt_rankings, rankings.ci_hi)
-  precisions.ci_li, recalls.ci_li = calc_precision_recall(gt_rankings, rankings.ci_li)
-  precisions.ci_1, recalls.ci_1 = calc_precision_recall(gt_rankings, rankings.ci_1)
-  precisions.ci_2, recalls.ci_2 = calc_precision_recall(gt_rankings, rankings.ci_2)
-  precisions.ci_3, recalls.ci_3 = calc_precision_recall(gt_rankings, rankings.ci_3)
-  precisions.social_bias, recalls.social_bias = calc_precision_recall(gt_rankings, rankings.social_bias)
-  precisions.non_experts, recalls.non_experts = calc_precision_recall(gt_rankings, rankings.non_experts)
-  precisions.non_experts_sampled, recalls.non_experts_sampled = calc_precision_recall(gt_rankings, rankings.non_experts_sampled)
-  precisions.non_experts_25, recalls.non_experts_25 = calc_precision_recall(gt_rankings, rankings.non_experts_25)
-  precisions.non_experts_10, recalls.non_experts_10 = calc_precision_recall(gt_rankings, rankings.non_experts_10)
-  precisions.non_experts_1, recalls.non_experts_1 = calc_precision_recall(gt_rankings, rankings.non_experts_1)
-  precisions.super_experts, recalls.super_experts = calc_precision_recall(gt_rankings, rankings.super_experts)
-  precisions.weighted_followers, recalls.weighted_followers = calc_precision_recall(gt_rankings, rankings.weighted_followers)
-  precisions.ci_weighted, recalls.ci_weighted = calc_precision_recall(gt_rankings, rankings.ci_weighted)
-  precisions.weighted, recalls.weighted = calc_precision_recall(gt_rankings, rankings.weighted)
-  precisions.weighted_both, recalls.weighted_both = calc_precision_recall(gt_rankings, rankings.weighted_both)
+  for name in rankings.names():
+    model_precisions, model_recalls = calc_precision_recall(
+        gt_rankings, getattr(rankings, name))
+    setattr(precisions, name, model_precisions)
+    setattr(recalls, name, model_recalls)
 
   return precisions, recalls
@@ -0,0 +1,164 @@
+"""
+A ranking of urls by count, as produced by ground_truths and rankings.
+
+A Ranking holds the url ids (indexes into the sorted url array of vote_data,
+VoteData.urls) in ranked order and their counts. It is still a sequence of
+(url, count) pairs, so code written for the lists the rankings used to be
+keeps working:
+
+  for rank, (url, count) in enumerate(ranking):
+    ...
+
+Lookups that used to need a dictionary built by hand go through indexes that
+are built the first time they are needed and then kept:
+
+  ranking.rank_of(url)    # instead of url_to_rank[url]
+  ranking.url_at(rank)    # instead of rank_to_url[rank]
+  ranking.ranks()         # the rank of every url id, -1 if not ranked
+  ranking.top(k)          # the first k, as a Ranking
+"""
+import vote_data
+
+import numpy as npy
+
+
+class Ranking:
+  """Urls ranked by count, see module docstring."""
+
+  def __init__(self, url_ids, counts, urls=None):
+    """Create a new instance of this class.
+
+    Keyword Arguments:
+    url_ids -- (npy.array) Url ids in ranked order.
+    counts -- (npy.array) The count of each ranked url.
+    urls -- (npy.array) The sorted urls the ids index, VoteData.urls if None.
+    """
+    if urls is None:
+      urls = vote_data.load().urls
+    self.url_ids = npy.asarray(url_ids, dtype=npy.int64)
+    self.counts = npy.asarray(counts)
+    self.urls = urls
+    self._pairs = None
+    self._ranks = None
+
+  @classmethod
+  def from_counts(cls, url_to_count, urls=None, limit=None):
+    """Ranks urls by count, most first; ties are ranked by url.
+
+    Keyword Arguments:
+    url_to_count -- Dictionary of url to count (or weighted count).
+    urls -- (npy.array) The sorted urls to index by, VoteData.urls if None.
+    limit -- Only rank the first limit urls, None to rank them all.
+    """
+    if urls is None:
+      urls = vote_data.load().urls
+    if not url_to_count:
+      return cls(npy.array([], dtype=npy.int64), npy.array([]), urls)
+    url_ids = _url_ids(urls, url_to_count.keys())
+    counts = npy.array(url_to_count.values())
+    order = _order(url_ids, counts, limit)
+    return cls(url_ids[order], counts[order], urls)
+
+  @classmethod
+  def from_url_counts(cls, counts, ranked=None, urls=None, limit=None):
+    """Ranks url ids by count, most first; ties are ranked by url.
+
+    Keyword Arguments:
+    counts -- (npy.array) The count (or weighted count) of each url id.
+    ranked -- (npy.array) Boolean, the url ids to rank. Those with a count
+              other than 0 if None.
+    urls -- (npy.array) The sorted urls the ids index, VoteData.urls if None.
+    limit -- Only rank the first limit urls, None to rank them all.
+    """
+    if ranked is None:
+      ranked = counts != 0
+    url_ids = npy.flatnonzero(ranked)
+    order = _order(url_ids, counts[url_ids], limit)
+    return cls(url_ids[order], counts[url_ids[order]], urls)
+
+  @classmethod
+  def from_pairs(cls, pairs, urls=None):
+    """Wraps a list of (url, count) pairs, keeping their order."""
+    if urls is None:
+      urls = vote_data.load().urls
+    if not len(pairs):
+      return cls(npy.array([], dtype=npy.int64), npy.array([]), urls)
+    return cls(_url_ids(urls, [url for url, _ in pairs]),
+               npy.array([count for _, count in pairs]), urls)
+
+  def __len__(self):
+    return len(self.url_ids)
+
+  def __iter__(self):
+    return iter(self.pairs())
+
+  def __getitem__(self, i):
+    return self.pairs()[i]
+
+  def __repr__(self):
+    return 'Ranking(%s)' % self.pairs()[:5]
+
+  def pairs(self):
+    """Returns the ranking as a list of (url, count) pairs."""
+    if self._pairs is None:
+      self._pairs = zip(self.urls[self.url_ids].tolist(), self.counts.tolist())
+    return self._pairs
+
+  def url_list(self):
+    """Returns the ranked urls as a list of str."""
+    return [url for url, _ in self.pairs()]
+
+  def ranks(self):
+    """Returns the (0 based) rank of every url id, -1 for urls not ranked."""
+    if self._ranks is None:
+      ranks = npy.empty(len(self.urls), dtype=npy.int64)
+      ranks.fill(-1)
+      ranks[self.url_ids] = npy.arange(len(self.url_ids))
+      self._ranks = ranks
+    return self._ranks
+
+  def rank_of(self, url):
+    """Returns the (0 based) rank of a url, or -1 if it is not ranked."""
+    i = npy.searchsorted(self.urls, url)
+    if i < len(self.urls) and self.urls[i] == url:
+      return int(self.ranks()[i])
+    return -1
+
+  def url_at(self, rank):
+    """Returns the url at a (0 based) rank."""
+    return self.pairs()[rank][0]
+
+  def count_at(self, rank):
+    """Returns the count of the url at a (0 based) rank."""
+    return self.pairs()[rank][1]
+
+  def top(self, k):
+    """Returns the first k urls, as a Ranking."""
+    return Ranking(self.url_ids[:k], self.counts[:k], self.urls)
+
+
+def _url_ids(urls, url_list):
+  """Looks up the ids of urls, which must all be in the sorted urls array."""
+  wanted = npy.array(list(url_list))
+  url_ids = npy.searchsorted(urls, wanted)
+  found = url_ids < len(urls)
+  found[found] = urls[url_ids[found]] == wanted[found]
+  if not found.all():
+    raise ValueError('Urls without votes cannot be ranked: %s'
+                     % wanted[~found][:5].tolist())
+  return url_ids.astype(npy.int64)
+
+
+def _order(url_ids, counts, limit=None):
+  """Returns the indexes of the first limit urls, by count and then by url.
+
+  With a limit only the urls that can make it are sorted: those counted at
+  least as much as the limit'th most counted url, found with a partition.
+  """
+  if limit is not None and limit < len(counts):
+    if limit <= 0:
+      return npy.array([], dtype=npy.int64)
+    kth = counts[npy.argpartition(-counts, limit - 1)[limit - 1]]
+    head = npy.flatnonzero(counts >= kth)
+    return head[npy.lexsort((url_ids[head], -counts[head]))][:limit]
+  return npy.lexsort((url_ids, -counts))
@@ -1,20 +1,22 @@
 import math
 import Util
+import metrics
+import activity_groups
 import user_groups
+import vote_data
+import ground_truths
 
-from datetime import timedelta
+from ground_truths import DataSet
+from ranking import Ranking
 
-from constants import _TIMEDELTAS_FILE_URL_INDEX
-from constants import _TIMEDELTAS_FILE_USER_ID_INDEX
-from constants import _TIMEDELTAS_FILE_DELTA_INDEX
-from constants import _TIMEDELTAS_FILE_CATEGORY_INDEX
+import numpy as npy
 
 from params import _SWITCHED
-from params import _CI_WEIGHT
-from params import _WEIGHT
 
 
-def gather_tweet_counts(hours, seeds, groups, d_num_followers, category=None):
+@metrics.timed('gather_tweet_counts')
+def gather_tweet_counts(hours, seeds, groups, d_num_followers, category=None,
+                        names=None):
   """Gathers the tweet counts for a given set of months.
   
   Only counts votes if they occur within the given time delta from the seed
@@ -23,105 +25,83 @@ def gather_tweet_counts(hours, seeds, groups, d_num_followers, category=None):
   Keyword Arguments:
   hours -- The number of hours from the seed time in which to accept votes.
   seeds -- A dictionary of url to the datetime of it first being seend
-  Accepts a parameter for a set defining each of the following user groups:
-  newsaholics, active users, experts (precision), experts (F-score),
-  experts (confidence interval), and experts (super experts).
+  groups -- (UserGroups) The members of each group.
+  d_num_followers -- Dictionary of user id to follower count, for the models
+                     weighted by followers.
   category -- The category to gather tweets for, None if for all news.
+  names -- The models (see user_groups.MODELS) to count, None for all of them.
 
   Returns:
-  Dictionary of url to tweet count for all user groups. This includes:
-  ground truth, market, newsaholic, active users, common users, and
-  experts (precision, F-score, confidence interval, and super).
+  UserGroups with, for each model counted, a tuple (counts, voted) of arrays
+  indexed by url id: the (weighted) vote count of each url, and whether any of
+  the model's users voted for it.
   """
+  if names is None:
+    names = user_groups.MODELS.keys()
+
+  votes = vote_data.load()
+  scan_max_delta = None
+  if hours:
+    scan_max_delta = int(math.ceil(hours * 3600)) - 1
+  data_set = DataSet.TESTING
+  if _SWITCHED:
+    data_set = DataSet.TRAINING
+  seed_start, seed_end = ground_truths.seed_window(data_set)
+  # Only visit the votes that can be counted; the seed window also leaves out
+  # urls without a seed.
+  rows = votes.scan(scan_max_delta, seed_start, seed_end, category)
+  metrics.add_rows(len(rows))
+  url_ids = votes.url_id[rows]
+  user_ids, users = npy.unique(votes.user_id[rows], return_inverse=True)
+  num_urls = votes.num_urls()
+
+  # Each group's members among the voters, computed once however many models
+  # count the group.
+  members = {}
+  def is_member(group):
+    if group == user_groups.ALL_USERS:
+      return npy.ones(len(user_ids), dtype=bool)
+    if group not in members:
+      members[group] = activity_groups.to_bitmap(
+          activity_groups.to_array(getattr(groups, group)), user_ids)
+    return members[group]
+
   tweet_counts = user_groups.UserGroups()
-  tweet_counts.precision = {}
-  tweet_counts.fscore = {}
-  tweet_counts.ci = {}
-  tweet_counts.ci_hi = {}
-  tweet_counts.ci_li = {}
-  tweet_counts.ci_1 = {}
-  tweet_counts.ci_2 = {}
-  tweet_counts.ci_3 = {}
-  tweet_counts.super_experts = {}
-  tweet_counts.social_bias = {}
-  tweet_counts.newsaholics = {}
-  tweet_counts.active_users = {}
-  tweet_counts.common_users = {}
-  tweet_counts.non_experts = {}
-  tweet_counts.non_experts_sampled = {}
-  tweet_counts.non_experts_25 = {}
-  tweet_counts.non_experts_10 = {}
-  tweet_counts.non_experts_1 = {}
-  tweet_counts.weighted_followers = {}
-  tweet_counts.ci_weighted = {}
-  tweet_counts.weighted = {}
-  tweet_counts.weighted_both = {}
-
-  with open('../data/FolkWisdom/time_deltas.tsv') as input_file:
-    for line in input_file:
-      tokens = line.split('\t')
-      url = tokens[_TIMEDELTAS_FILE_URL_INDEX]
-      user_id = tokens[_TIMEDELTAS_FILE_USER_ID_INDEX]
-      time_delta = timedelta(seconds=int(tokens[_TIMEDELTAS_FILE_DELTA_INDEX]))
-      url_category = tokens[_TIMEDELTAS_FILE_CATEGORY_INDEX].strip()
-      max_delta = timedelta.max
-      if hours:
-        max_delta = timedelta(hours=hours)
-
-      if url in seeds:
-        (seed_tweet_id, seed_user_id, seed_time) = seeds[url]
-
-        if (in_correct_set(seed_time) and time_delta < max_delta
-            and category_matches(category, url_category)):
-
-          # Market
-          if tweet_counts.population == None:
-            tweet_counts.population = {}
-          if url in tweet_counts.population:
-            tweet_counts.population[url] += 1
-          else:
-            tweet_counts.population[url] = 1
-
-          increment_tweet_count(groups.precision, tweet_counts.precision, user_id, url)
-          increment_tweet_count(groups.fscore, tweet_counts.fscore, user_id, url)
-          increment_tweet_count(groups.ci, tweet_counts.ci, user_id, url)
-          increment_tweet_count(groups.ci_hi, tweet_counts.ci_hi, user_id, url)
-          increment_tweet_count(groups.ci_li, tweet_counts.ci_li, user_id, url)
-          increment_tweet_count(groups.ci_1, tweet_counts.ci_1, user_id, url)
-          increment_tweet_count(groups.ci_2, tweet_counts.ci_3, user_id, url)
-          increment_tweet_count(groups.ci_3, tweet_counts.ci_3, user_id, url)
-          increment_tweet_count(groups.super_experts, tweet_counts.super_experts, user_id, url)
-          increment_tweet_count(groups.social_bias, tweet_counts.social_bias, user_id, url)
-          increment_tweet_count(groups.newsaholics, tweet_counts.newsaholics, user_id, url)
-          increment_tweet_count(groups.active_users, tweet_counts.active_users, user_id, url)
-          increment_tweet_count(groups.common_users, tweet_counts.common_users, user_id, url)
-          increment_tweet_count(groups.non_experts, tweet_counts.non_experts, user_id, url)
-          increment_tweet_count(groups.non_experts_sampled, tweet_counts.non_experts_sampled, user_id, url)
-          increment_tweet_count(groups.non_experts_25, tweet_counts.non_experts_25, user_id, url)
-          increment_tweet_count(groups.non_experts_10, tweet_counts.non_experts_10, user_id, url)
-          increment_tweet_count(groups.non_experts_1, tweet_counts.non_experts_1, user_id, url)
-          weight = 1.0
-          if user_id in d_num_followers:
-            num_followers = d_num_followers[user_id] + 1 # need to account for the case of 0 followers
-            weight = math.log(num_followers)
-          increment_tweet_count(groups.ci, tweet_counts.weighted_followers, user_id, url, weight=weight)
-
-          # Weighted ci model
-          increment_tweet_count(groups.ci_hi, tweet_counts.ci_weighted, user_id, url, weight=_CI_WEIGHT)
-          increment_tweet_count(groups.ci_li, tweet_counts.ci_weighted, user_id, url, weight=(1 - _CI_WEIGHT))
-
-          # Weighted Model
-          increment_tweet_count(groups.non_experts, tweet_counts.weighted, user_id, url, weight=_WEIGHT)
-          increment_tweet_count(groups.ci, tweet_counts.weighted, user_id, url, weight=(1 - _WEIGHT))
-
-          # Weighted (Both)
-          increment_tweet_count(groups.non_experts, tweet_counts.weighted_both, user_id, url, weight=_WEIGHT)
-          increment_tweet_count(groups.ci_hi, tweet_counts.weighted_both, user_id, url, weight=((1 - _WEIGHT) * _CI_WEIGHT))
-          increment_tweet_count(groups.ci_li, tweet_counts.weighted_both, user_id, url, weight=((1 - _WEIGHT) * (1 - _CI_WEIGHT)))
-                
+  for name in names:
+    components = user_groups.MODELS[name]
+    in_model = npy.zeros(len(user_ids), dtype=bool)
+    weights = npy.zeros(len(user_ids))
+    for group, weight in components:
+      if weight == user_groups.FOLLOWERS:
+        weight = _followers_weights(user_ids, d_num_followers)
+      in_model |= is_member(group)
+      weights += is_member(group) * weight
+    in_rows = in_model[users]
+    voted = npy.zeros(num_urls, dtype=bool)
+    voted[url_ids[in_rows]] = True
+    if all(weight == 1 for _, weight in components):
+      counts = npy.bincount(url_ids[in_rows], minlength=num_urls)
+    else:
+      counts = npy.bincount(url_ids, weights=weights[users],
+                            minlength=num_urls)
+    setattr(tweet_counts, name, (counts, voted))
+    if metrics.enabled():
+      metrics.record('votes.%s' % name, counts.sum(), delta=hours,
+                     category=category)
+
   return tweet_counts
 
 
+def _followers_weights(user_ids, d_num_followers):
+  """Returns log(followers + 1) for each user, 1.0 for users not crawled."""
+  weights = npy.ones(len(user_ids))
+  for i, user_id in enumerate(user_ids.tolist()):
+    if str(user_id) in d_num_followers:
+      # need to account for the case of 0 followers
+      weights[i] = math.log(d_num_followers[str(user_id)] + 1)
+  return weights
+
+
 def in_correct_set(seed_time):
   in_correct_set = Util.is_in_testing_set(seed_time)
   if _SWITCHED:
@@ -138,43 +118,47 @@ def category_matches(category, url_category):
   return category_matches
 
 
-def increment_tweet_count(group, tc, user_id, url, weight=1.0):
-  if user_id in group:
-    if url in tc:
-      tc[url] += weight * 1
-    else:
-      tc[url] = weight * 1
-
+@metrics.timed('sort_tweet_counts')
+def sort_tweet_counts(tweet_counts, limit=None, full=()):
+  """Ranks the urls by the counts of each model in tweet_counts.
 
-def sort_tweet_counts(tweet_counts):
+  Keyword Arguments:
+  tweet_counts -- (UserGroups) As returned by gather_tweet_counts.
+  limit -- Only rank the first limit urls of each model, None for all.
+  full -- Models to rank all the urls of, whatever the limit.
+  """
   rankings = user_groups.UserGroups()
-  rankings.population= sorted(tweet_counts.population.items(), key=lambda x: x[1], reverse=True)
-  rankings.newsaholics= sorted(tweet_counts.newsaholics.items(), key=lambda x: x[1], reverse=True)
-  rankings.common_users = sorted(tweet_counts.common_users.items(), key=lambda x: x[1], reverse=True)
-  rankings.active_users = sorted(tweet_counts.active_users.items(), key=lambda x: x[1], reverse=True)
-  rankings.precision = sorted(tweet_counts.precision.items(), key=lambda x: x[1], reverse=True)
-  rankings.fscore = sorted(tweet_counts.fscore.items(), key=lambda x: x[1], reverse=True)
-  rankings.ci = sorted(tweet_counts.ci.items(), key=lambda x: x[1], reverse=True)
-  rankings.ci_hi = sorted(tweet_counts.ci_hi.items(), key=lambda x: x[1], reverse=True)
-  rankings.ci_li = sorted(tweet_counts.ci_li.items(), key=lambda x: x[1], reverse=True)
-  rankings.ci_1 = sorted(tweet_counts.ci_1.items(), key=lambda x: x[1], reverse=True)
-  rankings.ci_2 = sorted(tweet_counts.ci_3.items(), key=lambda x: x[1], reverse=True)
-  rankings.ci_3 = sorted(tweet_counts.ci_3.items(), key=lambda x: x[1], reverse=True)
-  rankings.non_experts = sorted(tweet_counts.non_experts.items(), key=lambda x: x[1], reverse=True)
-  rankings.non_experts_sampled = sorted(tweet_counts.non_experts_sampled.items(), key=lambda x: x[1], reverse=True)
-  rankings.non_experts_25 = sorted(tweet_counts.non_experts_25.items(), key=lambda x: x[1], reverse=True)
-  rankings.non_experts_10 = sorted(tweet_counts.non_experts_10.items(), key=lambda x: x[1], reverse=True)
-  rankings.non_experts_1 = sorted(tweet_counts.non_experts_1.items(), key=lambda x: x[1], reverse=True)
-  rankings.super_experts = sorted(tweet_counts.super_experts.items(), key=lambda x: x[1], reverse=True)
-  rankings.social_bias = sorted(tweet_counts.social_bias.items(), key=lambda x: x[1], reverse=True)
-  rankings.weighted_followers = sorted(tweet_counts.weighted_followers.items(), key=lambda x: x[1], reverse=True)
-  rankings.ci_weighted = sorted(tweet_counts.ci_weighted.items(), key=lambda x: x[1], reverse=True)
-  rankings.weighted = sorted(tweet_counts.weighted.items(), key=lambda x: x[1], reverse=True)
-  rankings.weighted_both = sorted(tweet_counts.weighted_both.items(), key=lambda x: x[1], reverse=True)
+  for name in tweet_counts.names():
+    counts, voted = getattr(tweet_counts, name)
+    model_limit = limit
+    if name in full:
+      model_limit = None
+    setattr(rankings, name, Ranking.from_url_counts(counts, voted,
+                                                    limit=model_limit))
   return rankings
 
 
-def get_rankings(delta, seeds, groups, category, d_num_followers):
-  tweet_counts = gather_tweet_counts(delta, seeds, groups, d_num_followers, category)
-  rankings = sort_tweet_counts(tweet_counts)
+def get_rankings(delta, seeds, groups, category, d_num_followers, names=None,
+                 limit=None, full=()):
+  """Ranks the urls by the votes of each of the given models.
+
+  Keyword Arguments:
+  delta -- The time window, in hours.
+  seeds -- The url to first time seen dictionary.
+  groups -- (UserGroups) The members of each group.
+  category -- The category to get rankings for, None for all news.
+  d_num_followers -- Dictionary of user id to follower count.
+  names -- The models (see user_groups.MODELS) to rank by, None for all. Only
+           these are counted.
+  limit -- Only rank the first limit urls of each model, None for all. E.g.
+           precision_recall.ranking_limit(gt_rankings) when the rankings are
+           only used for their precision and recall.
+  full -- Models to rank all the urls of, whatever the limit.
+
+  Returns:
+  UserGroups with the Ranking of each model in names.
+  """
+  tweet_counts = gather_tweet_counts(delta, seeds, groups, d_num_followers,
+                                     category, names)
+  rankings = sort_tweet_counts(tweet_counts, limit, full)
   return rankings
@@ -0,0 +1,197 @@
+"""
+Compact table of the seed tweet of every url.
+
+gen_seeds_and_deltas writes data/FolkWisdom/seed_times.tsv, the first tweet of
+every url. SeedTable holds it as parallel arrays indexed by url id, cached as
+.npy files under data/FolkWisdom/seeds/ and memory mapped when loaded, so
+loading the seeds takes a few reads instead of parsing every line into a
+tuple. The cache is rebuilt whenever seed_times.tsv changes, and within a
+process load() always returns the same SeedTable.
+
+Columns:
+urls -- Sorted array of the urls.
+seed_epoch -- (int64) Seed time of each url in seconds since the epoch (see
+              vote_data.to_epoch()).
+seed_tweet_id -- (int64) Id of the seed tweet of each url.
+seed_user_id -- (int64) Id of the user of the seed tweet of each url.
+
+Per url lookups go through a dictionary of url to url id, built on the first
+one, and the columns are then indexed by url id:
+
+  seeds = seed_table.load()
+  url_id = seeds.url_id_of(url)
+  if url_id >= 0:
+    seed_epoch = seeds.seed_epoch[url_id]
+
+Loops over many urls that only need to know whether a url was seeded within a
+window can instead test membership in seeded_urls(start, end).
+
+SeedTable can also be used like the dictionary of url to (seed tweet id,
+seed user id, seed time) the seeds used to be loaded as, which is slower as
+every lookup builds the tuple:
+
+  seed = seeds.get(url)
+  if seed is not None:
+    seed_tweet_id, seed_user_id, seed_time = seed
+"""
+import FileLog
+import columnar
+import metrics
+import vote_data
+
+import numpy as npy
+from datetime import datetime
+
+from constants import _DATETIME_FORMAT
+
+_SEEDS_FILENAME = '../data/FolkWisdom/seed_times.tsv'
+_CACHE_DIR = '../data/FolkWisdom/seeds/'
+_LOG_FILE = 'seed_table.log'
+_COLUMNS = ['urls', 'seed_epoch', 'seed_tweet_id', 'seed_user_id']
+
+# SeedTable already loaded in this process, by seeds filename.
+_loaded = {}
+
+
+class SeedTable:
+  """Columns of the seed times file, see module docstring."""
+
+  def __init__(self, columns):
+    self.urls = columns['urls']
+    self.seed_epoch = columns['seed_epoch']
+    self.seed_tweet_id = columns['seed_tweet_id']
+    self.seed_user_id = columns['seed_user_id']
+    self._url_index = None
+
+  def __len__(self):
+    return len(self.urls)
+
+  def url_id_of(self, url):
+    """Returns the url id of a url, -1 if it has no seed."""
+    if self._url_index is None:
+      urls = self.urls.tolist()
+      self._url_index = dict(zip(urls, xrange(len(urls))))
+    return self._url_index.get(url, -1)
+
+  def url_ids_of(self, urls):
+    """Returns the url id of each of an array of urls, -1 if it has no seed."""
+    urls = npy.asarray(urls)
+    if not len(self.urls):
+      return npy.repeat(-1, len(urls))
+    url_ids = npy.searchsorted(self.urls, urls)
+    url_ids[url_ids == len(self.urls)] = 0
+    return npy.where(self.urls[url_ids] == urls, url_ids, -1)
+
+  def seeded_urls(self, start_epoch=None, end_epoch=None):
+    """Returns the set of urls seeded in [start_epoch, end_epoch).
+
+    Either bound may be None for no bound, as returned by
+    ground_truths.seed_window().
+    """
+    mask = npy.ones(len(self.urls), dtype=bool)
+    if start_epoch is not None:
+      mask &= self.seed_epoch >= start_epoch
+    if end_epoch is not None:
+      mask &= self.seed_epoch < end_epoch
+    return set(self.urls[mask].tolist())
+
+  def seed_of(self, url_id):
+    """Returns the (seed tweet id, seed user id, seed time) of a url id, with
+    the ids as strings, as in seed_times.tsv.
+    """
+    return (str(self.seed_tweet_id[url_id]), str(self.seed_user_id[url_id]),
+            datetime.utcfromtimestamp(self.seed_epoch[url_id]))
+
+  def __contains__(self, url):
+    return self.url_id_of(url) >= 0
+
+  def has_key(self, url):
+    return url in self
+
+  def __getitem__(self, url):
+    url_id = self.url_id_of(url)
+    if url_id < 0:
+      raise KeyError(url)
+    return self.seed_of(url_id)
+
+  def get(self, url, default=None):
+    url_id = self.url_id_of(url)
+    if url_id < 0:
+      return default
+    return self.seed_of(url_id)
+
+  def __iter__(self):
+    return iter(self.urls.tolist())
+
+  def keys(self):
+    return self.urls.tolist()
+
+  def iteritems(self):
+    for url_id, url in enumerate(self.urls.tolist()):
+      yield url, self.seed_of(url_id)
+
+  def items(self):
+    return list(self.iteritems())
+
+
+def load(filename=_SEEDS_FILENAME, cache_dir=_CACHE_DIR):
+  """Returns the SeedTable of the given seed times file.
+
+  Keyword Arguments:
+  filename -- The seed times file, as written by gen_seeds_and_deltas.
+  cache_dir -- Directory of the .npy cache of the columns.
+  """
+  if filename in _loaded:
+    return _loaded[filename]
+  cached = columnar.load(cache_dir, [filename], _COLUMNS)
+  if cached is None:
+    columns = parse(filename)
+    try:
+      columnar.save(cache_dir, columns, [filename])
+      log('Cached seed columns in %s' % cache_dir)
+    except (IOError, OSError), err:
+      log('Could not cache seed columns in %s: %s' % (cache_dir, err))
+  else:
+    columns, _ = cached
+  seed_table = SeedTable(columns)
+  _loaded[filename] = seed_table
+  return seed_table
+
+
+@metrics.timed('parse_seed_times')
+def parse(filename=_SEEDS_FILENAME):
+  """Parses the seed times file into columns.
+
+  Returns:
+  columns -- Dictionary of column name to array.
+  """
+  log('Parsing %s...' % filename)
+  urls = []
+  seed_epochs = []
+  seed_tweet_ids = []
+  seed_user_ids = []
+  with open(filename) as input_file:
+    for line in metrics.counted(input_file):
+      tokens = line.split('\t')
+      seed_tweet_ids.append(int(tokens[0]))
+      seed_user_ids.append(int(tokens[1]))
+      seed_epochs.append(vote_data.to_epoch(
+          datetime.strptime(tokens[2], _DATETIME_FORMAT)))
+      urls.append(tokens[3].strip())
+  # As in a dictionary, the last line of a url wins.
+  urls = npy.array(urls[::-1], dtype=str)
+  urls, rows = npy.unique(urls, return_index=True)
+  rows = len(seed_epochs) - 1 - rows
+  return {'urls': urls,
+          'seed_epoch': npy.array(seed_epochs, dtype=npy.int64)[rows],
+          'seed_tweet_id': npy.array(seed_tweet_ids, dtype=npy.int64)[rows],
+          'seed_user_id': npy.array(seed_user_ids, dtype=npy.int64)[rows]}
+
+
+def log(message):
+  """Helper method to modularize the format of log messages.
+
+  Keyword Arguments:
+  message -- A string to log.
+  """
+  FileLog.log(_LOG_FILE, message)
@@ -0,0 +1,119 @@
+"""
+Data set shared by the worker processes of an analysis.
+
+An analysis over several (category, delta) cells, like bootstrap, can run its
+cells in parallel worker processes. If every worker loaded the votes, seeds,
+follower counts and user groups for itself, running n cells at once would
+take n times the memory. map_cells() instead loads them once, in the parent
+process, before the workers are forked:
+
+  shared_dataset.map_cells(_run_cell, [(category, delta)
+                                       for category in _CATEGORIES
+                                       for delta in _DELTAS],
+                           groups_seed=_BOOTSTRAP_SEED)
+
+The workers find everything already loaded (vote_data.load(),
+Util.load_seeds(), user_store.load_followers(), activity_groups.load(),
+gt_rankings() and groups() return what the parent loaded), without copying
+it:
+- The columns of vote_data, seed_table and user_store are memory mapped .npy
+  caches, so every process reads the same pages of the page cache.
+- The arrays computed in the parent, like the user ids of the activity groups,
+  are inherited when the workers are forked, and stay shared as long as no
+  process writes to them.
+
+The ground truth rankings of each category, and the user groups of each cell,
+are also computed in the parent. The cells of a category then do not all
+compute, and save, the same rankings, and no worker selects experts or builds
+the follower counts dictionary (followers.as_dict()) of its own.
+"""
+import FileLog
+import Util
+import activity_groups
+import data_files
+import ground_truths
+import metrics
+import user_groups
+import user_store
+import vote_data
+from ground_truths import DataSet
+
+from params import _SWITCHED
+from params import _EXCLUDE_RETWEETS
+from params import _EXCLUDE_TWEETS_WITHIN_DELTA
+
+_LOG_FILE = 'shared_dataset.log'
+
+_groups = {}  # (category, delta, seed) -> UserGroups
+
+
+@metrics.timed('preload_shared_dataset')
+def preload(cells=(), groups_seed=None):
+  """Loads the data set shared by the cells of an analysis.
+
+  Keyword Arguments:
+  cells -- List of (category, delta) cells, whose activity groups, ground
+           truth rankings and user groups are loaded.
+  groups_seed -- Seed the user groups of the cells are drawn with, see
+                 groups().
+  """
+  votes = vote_data.load()
+  seeds = Util.load_seeds()
+  followers = user_store.load_followers()
+  for category, delta in cells:
+    activity_groups.load(delta, category)
+    gt_rankings(category)
+    groups(category, delta, groups_seed)
+  log('Loaded %s votes, %s seeds and %s follower counts.'
+      % (len(votes), len(seeds), len(followers)))
+
+
+def gt_rankings(category):
+  """Returns the ground truth rankings of a category, as aFolkWisdom ranks
+  them (see ground_truths.get_gt_rankings()).
+  """
+  data_set = DataSet.TESTING
+  if _SWITCHED:
+    data_set = DataSet.TRAINING
+  return ground_truths.get_gt_rankings(
+      Util.load_seeds(), data_set, category,
+      exclude_tweets_within_delta=_EXCLUDE_TWEETS_WITHIN_DELTA,
+      exclude_retweets=_EXCLUDE_RETWEETS)
+
+
+def groups(category, delta, seed=None):
+  """Returns the UserGroups of a cell, see user_groups.get_all_user_groups().
+
+  The groups are selected once per process for a given seed, and a seed of
+  None is a random draw only the first time.
+  """
+  key = (category, delta, seed)
+  if not key in _groups:
+    _groups[key], _ = user_groups.get_all_user_groups(delta, category,
+                                                      seed=seed)
+  return _groups[key]
+
+
+def map_cells(func, cells, processes=None, groups_seed=None):
+  """Returns [func(cell) for cell in cells], computed in worker processes that
+  share the data set loaded by preload().
+
+  Keyword Arguments:
+  func -- A module level function (so that it can be pickled) of one
+          (category, delta) cell.
+  cells -- List of (category, delta) cells.
+  processes -- Number of worker processes, None for one per cpu.
+  groups_seed -- Seed the user groups of the cells are drawn with, for func to
+                 read with groups(category, delta, groups_seed).
+  """
+  preload(cells, groups_seed)
+  return data_files.map_files(func, cells, processes)
+
+
+def log(message):
+  """Helper method to modularize the format of log messages.
+
+  Keyword Arguments:
+  message -- A string to log.
+  """
+  FileLog.log(_LOG_FILE, message)
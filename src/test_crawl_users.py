@@ -0,0 +1,97 @@
+"""
+Tests crawl_users.crawl_user_info() against the local stand-in for the
+users/lookup endpoint in twitter_api_stub.
+
+Run from src/: python test_crawl_users.py
+"""
+import crawl_users
+import twitter_api_stub
+import user_store
+
+import random
+import shutil
+import tempfile
+import time
+import unittest
+
+
+class CrawlUserInfoTest(unittest.TestCase):
+
+  def setUp(self):
+    self.out_dir = tempfile.mkdtemp(prefix='crawl_users_') + '/'
+    self.saved = (crawl_users._OUTPUT_DIR, crawl_users._BACKOFF_SECONDS)
+    crawl_users._OUTPUT_DIR = self.out_dir
+    crawl_users._BACKOFF_SECONDS = .01
+    self.store = user_store.open_store(self.out_dir)
+    self.server = None
+    random.seed(7)
+
+  def tearDown(self):
+    if self.server is not None:
+      self.server.shutdown()
+      self.server.server_close()
+    self.store.close()
+    crawl_users._OUTPUT_DIR, crawl_users._BACKOFF_SECONDS = self.saved
+    shutil.rmtree(self.out_dir)
+
+  def start_stub(self, limit=1000, window=1, **settings):
+    """Starts the stand-in on a free port, returns its lookup url.
+
+    By default the rate limit is high enough to never slow the crawl down.
+    """
+    settings.update(limit=limit, window=window)
+    self.server = twitter_api_stub.start(port=0, **settings)
+    return twitter_api_stub.lookup_url(self.server.server_address[1])
+
+  def crawl(self, user_ids, lookup_url, num_workers=crawl_users._NUM_WORKERS):
+    rate_limiter = crawl_users.RateLimiter(requests_per_window=1000,
+                                           window_seconds=1)
+    return crawl_users.crawl_user_info(user_ids, lookup_url, num_workers,
+                                       rate_limiter, self.store)
+
+  def test_batches(self):
+    lookup_url = self.start_stub(latency=0, missing_rate=.1)
+    user_ids = set(str(user_id) for user_id in range(1000, 1250))
+    num_missing = len([user_id for user_id in user_ids
+                       if twitter_api_stub.is_missing(user_id, .1)])
+    found, bad, failed = self.crawl(user_ids, lookup_url)
+    self.assertEqual((found, bad, failed),
+                     (len(user_ids) - num_missing, num_missing, 0))
+    # 100 ids per request.
+    self.assertEqual(self.server.num_requests, 3)
+    self.assertEqual(self.store.num_users(), (found, bad))
+    with open(self.out_dir + 'user_info.tsv') as in_file:
+      self.assertEqual(len(in_file.readlines()), found)
+
+  def test_retries_5xx(self):
+    lookup_url = self.start_stub(latency=0, error_rate=.3, missing_rate=0)
+    user_ids = set(str(user_id) for user_id in range(1000, 2000))
+    self.assertEqual(self.crawl(user_ids, lookup_url), (1000, 0, 0))
+    self.assertTrue(self.server.num_errors > 0)
+    self.assertEqual(self.server.num_requests, 10 + self.server.num_errors)
+
+  def test_waits_for_rate_limit(self):
+    lookup_url = self.start_stub(latency=.05, limit=3, window=1,
+                                 missing_rate=0)
+    user_ids = set(str(user_id) for user_id in range(1000, 1600))
+    start = time.time()
+    self.assertEqual(self.crawl(user_ids, lookup_url, num_workers=4),
+                     (600, 0, 0))
+    # The fourth of the first requests in flight is over the limit, and the
+    # six batches need two windows.
+    self.assertTrue(self.server.num_limited > 0)
+    self.assertTrue(time.time() - start >= 1)
+
+  def test_does_not_retry_other_4xx(self):
+    lookup_url = self.start_stub(latency=0)
+    rate_limiter = crawl_users.RateLimiter(requests_per_window=1000,
+                                           window_seconds=1)
+    # More ids than a request may have is a 403 with requests remaining.
+    user_ids = [str(user_id) for user_id in range(1000, 1101)]
+    self.assertEqual(crawl_users.lookup_users(user_ids, lookup_url,
+                                              rate_limiter), None)
+    self.assertEqual(self.server.num_requests, 1)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,238 @@
+"""
+Columnar copy of the raw monthly tweet files.
+
+Every analysis that reads the raw tweeter_stream_data.*.tweet.http_nyti_ms.tsv
+files re-tokenizes every line, even to read one or two fields. convert() writes
+each tweet file once into a directory of .npy columns, one per _TWEETFILE_*
+field, under data/TweetColumns/<month>/<tweet file>/. load() then reads only
+the requested columns of a month, memory mapped:
+
+  columns = tweet_columns.load('09', ['user_id', 'created_at'])
+  user_ids = columns['user_id']
+
+Columns:
+tweet_id, user_id, retweet_count, origin_user_id, origin_tweet_id -- (int64)
+    0 if empty or null.
+created_at -- (int64) Seconds since the epoch (see vote_data.to_epoch()).
+retweeted -- (bool) Whether the tweet is a retweet.
+tweet_text, source, filter_words, insert_timestamp -- (int32) Index of the
+    value into the sorted array of distinct values, <name>_values. load()
+    returns both.
+
+Each directory has a manifest (see columnar) with the size and modification
+time of its tweet file, so convert() only converts new or changed files, and
+load() converts them on demand. Tweet files may be compressed (see
+data_files), and are converted in parallel worker processes.
+"""
+import FileLog
+import Util
+import columnar
+import data_files
+import metrics
+import vote_data
+
+import os
+import numpy as npy
+from datetime import datetime
+
+from constants import _TWEETFILE_TWEET_ID_INDEX
+from constants import _TWEETFILE_USER_ID_INDEX
+from constants import _TWEETFILE_TWEET_TEXT_INDEX
+from constants import _TWEETFILE_CREATED_AT_INDEX
+from constants import _TWEETFILE_RETWEETED_INDEX
+from constants import _TWEETFILE_RETWEET_COUNT_INDEX
+from constants import _TWEETFILE_ORIGIN_USER_ID_INDEX
+from constants import _TWEETFILE_ORIGIN_TWEET_ID_INDEX
+from constants import _TWEETFILE_SOURCE_INDEX
+from constants import _TWEETFILE_FILTER_WORDS_INDEX
+from constants import _TWEETFILE_INSERT_TIMESTAMP_INDEX
+from constants import _DATETIME_FORMAT
+from constants import _FULL_SET_MONTHS
+
+_COLUMNS_DIR = '../data/TweetColumns/'
+_LOG_FILE = 'tweet_columns.log'
+
+# How each field is stored.
+_ID = 'id'
+_TIME = 'time'
+_FLAG = 'flag'
+_STRING = 'string'
+
+# (column name, field index, kind) of the fields of a tweet file.
+_SCHEMA = [('tweet_id', _TWEETFILE_TWEET_ID_INDEX, _ID),
+           ('user_id', _TWEETFILE_USER_ID_INDEX, _ID),
+           ('tweet_text', _TWEETFILE_TWEET_TEXT_INDEX, _STRING),
+           ('created_at', _TWEETFILE_CREATED_AT_INDEX, _TIME),
+           ('retweeted', _TWEETFILE_RETWEETED_INDEX, _FLAG),
+           ('retweet_count', _TWEETFILE_RETWEET_COUNT_INDEX, _ID),
+           ('origin_user_id', _TWEETFILE_ORIGIN_USER_ID_INDEX, _ID),
+           ('origin_tweet_id', _TWEETFILE_ORIGIN_TWEET_ID_INDEX, _ID),
+           ('source', _TWEETFILE_SOURCE_INDEX, _STRING),
+           ('filter_words', _TWEETFILE_FILTER_WORDS_INDEX, _STRING),
+           ('insert_timestamp', _TWEETFILE_INSERT_TIMESTAMP_INDEX, _STRING)]
+_KINDS = dict((name, kind) for name, _, kind in _SCHEMA)
+
+
+def tweet_files(month):
+  """Returns the raw tweet files of the given month."""
+  filenames = []
+  dir_name = Util.get_data_dir_name_for(month)
+  for filename in sorted(os.listdir(dir_name)):
+    if '.tweet' in filename and 'http_nyti_ms' in filename:
+      filenames.append('%s/%s' % (dir_name, filename))
+  return filenames
+
+
+def file_columns_dir(tweet_file, columns_dir=_COLUMNS_DIR):
+  """Returns the directory the columns of a tweet file are written to."""
+  month_dir, filename = os.path.split(tweet_file)
+  return '%s%s/%s/' % (columns_dir, os.path.basename(month_dir), filename)
+
+
+@metrics.timed('convert_tweet_columns')
+def convert(months=_FULL_SET_MONTHS, columns_dir=_COLUMNS_DIR, processes=None):
+  """Converts the tweet files of the given months that are new or changed.
+
+  Keyword Arguments:
+  months -- The months of tweet files to convert.
+  columns_dir -- Directory to convert the tweet files to.
+  processes -- Number of files to convert at once, None for one per cpu.
+
+  Returns:
+  num_converted -- The number of tweet files converted.
+  """
+  stale = []
+  for month in months:
+    for tweet_file in tweet_files(month):
+      out_dir = file_columns_dir(tweet_file, columns_dir)
+      if not columnar.is_fresh(out_dir, [tweet_file]):
+        stale.append((tweet_file, out_dir))
+  _convert_files(stale, processes)
+  log('Converted %s tweet files.' % len(stale))
+  return len(stale)
+
+
+def _convert_files(files, processes=None):
+  """Converts (tweet file, out dir) pairs, in worker processes (see
+  data_files.map_files()), so compressed files are decompressed in parallel.
+  """
+  for tweet_file, _ in files:
+    metrics.add_file(tweet_file)
+  num_rows = data_files.map_files(_convert_file, files, processes)
+  metrics.add_rows(sum(num_rows))
+
+
+def _convert_file(paths):
+  """convert_file() of a (tweet file, out dir) pair, for map_files()."""
+  return convert_file(*paths)
+
+
+def convert_file(tweet_file, out_dir):
+  """Converts one tweet file (compressed or not) into columns in out_dir.
+
+  Returns:
+  num_rows -- The number of tweets converted.
+  """
+  log('Converting %s...' % tweet_file)
+  values = dict((name, []) for name, _, _ in _SCHEMA)
+  with data_files.open_file(tweet_file) as input_file:
+    for line in input_file:
+      tokens = line.rstrip('\r\n').split('\t')
+      for name, index, kind in _SCHEMA:
+        token = tokens[index]
+        if kind == _ID:
+          values[name].append(vote_data.parse_id(token))
+        elif kind == _TIME:
+          values[name].append(vote_data.to_epoch(
+              datetime.strptime(token, _DATETIME_FORMAT)))
+        elif kind == _FLAG:
+          values[name].append(vote_data.parse_flag(token))
+        else:
+          values[name].append(token)
+  columns = {}
+  for name, _, kind in _SCHEMA:
+    if kind == _STRING:
+      columns[name + '_values'], codes = vote_data._encode(values[name])
+      columns[name] = codes.astype(npy.int32)
+    elif kind == _FLAG:
+      columns[name] = npy.array(values[name], dtype=bool)
+    else:
+      columns[name] = npy.array(values[name], dtype=npy.int64)
+  columnar.save(out_dir, columns, [tweet_file])
+  return len(values['tweet_id'])
+
+
+def load(month, names=None, columns_dir=_COLUMNS_DIR):
+  """Loads columns of the tweets of a month, in tweet file order.
+
+  Tweet files without fresh columns are converted first.
+
+  Keyword Arguments:
+  month -- The month, e.g. '09'.
+  names -- Columns to load (see module docstring), None for all of them.
+  columns_dir -- Directory the columns were converted to.
+
+  Returns:
+  columns -- Dictionary of column name to array, plus <name>_values for each
+             string column.
+  """
+  if names is None:
+    names = [name for name, _, _ in _SCHEMA]
+  stored_names = list(names)
+  for name in names:
+    if _KINDS[name] == _STRING:
+      stored_names.append(name + '_values')
+
+  in_dirs = [(tweet_file, file_columns_dir(tweet_file, columns_dir))
+             for tweet_file in tweet_files(month)]
+  _convert_files([(tweet_file, in_dir) for tweet_file, in_dir in in_dirs
+                  if not columnar.is_fresh(in_dir, [tweet_file])])
+  file_columns = [columnar.load(in_dir, [tweet_file], stored_names)[0]
+                  for tweet_file, in_dir in in_dirs]
+  if len(file_columns) == 1:
+    return file_columns[0]
+
+  columns = {}
+  for name in names:
+    if _KINDS[name] == _STRING:
+      columns[name + '_values'], columns[name] = merge_strings(
+          [(file_column[name + '_values'], file_column[name])
+           for file_column in file_columns])
+    elif file_columns:
+      columns[name] = npy.concatenate([file_column[name]
+                                       for file_column in file_columns])
+    else:
+      columns[name] = npy.array([], dtype=npy.int64)
+  return columns
+
+
+def merge_strings(coded_values):
+  """Merges the dictionary encoded values of several files.
+
+  Keyword Arguments:
+  coded_values -- List of (values, codes) pairs, one per file.
+
+  Returns:
+  (values, codes) -- The distinct values of all files, and the index into them
+                     of every row.
+  """
+  if not coded_values:
+    return npy.array([], dtype='S1'), npy.array([], dtype=npy.int32)
+  values = npy.unique(npy.concatenate([file_values for file_values, _
+                                       in coded_values]))
+  codes = [npy.searchsorted(values, file_values)[file_codes]
+           for file_values, file_codes in coded_values]
+  return values, npy.concatenate(codes).astype(npy.int32)
+
+
+def log(message):
+  """Helper method to modularize the format of log messages.
+
+  Keyword Arguments:
+  message -- A string to log.
+  """
+  FileLog.log(_LOG_FILE, message)
+
+
+if __name__ == "__main__":
+  convert()
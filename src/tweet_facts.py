@@ -0,0 +1,263 @@
+"""
+Tweet level fact table of the raw tweet files.
+
+Analyses of the tweets themselves (source devices, retweets, ...) used to
+re-read every raw tweet file for each parameter, parsing dates and urls per
+line. TweetFacts holds the fields they need as numpy columns, built once from
+the columnar copy of the tweet files (see tweet_columns), so that those
+analyses become group by aggregations over the columns:
+
+  facts = tweet_facts.load()
+  rows = facts.tweet_rows()
+  counts = npy.bincount(facts.source_id[rows], minlength=len(facts.sources))
+
+There is one row per url parsed from a tweet, in file order, and one row with
+url_id -1 for a tweet without urls. Use tweet_rows() for one row per tweet.
+
+The columns are cached as .npy files under data/FolkWisdom/facts/, rebuilt
+whenever a tweet file, the url cache or the seed times change, and within a
+process load() always returns the same TweetFacts.
+
+Columns:
+tweet_id -- (int64) Id of the tweet.
+month_id -- (int8) Index into months of the month of the tweet's file.
+user_id -- (int64) Id of the user who tweeted.
+created_epoch -- (int64) Creation time of the tweet in seconds since the epoch
+                 (see vote_data.to_epoch()).
+url_id -- (int32) Index of the url into urls, -1 if the tweet has no url.
+delta -- (int64) Seconds between the tweet and the seed tweet of the url, -1
+         if the row has no url or the url has no seed.
+source_id -- (int32) Index of the source device into sources.
+retweeted -- (bool) Whether the tweet is a retweet.
+retweet_count -- (int64) Number of times the tweet was retweeted.
+filter_words_id -- (int32) Index of the filter words into filter_words.
+is_tweet -- (bool) Whether the row is the one row kept for its tweet: the
+            last url of the tweet, as in time_deltas.tsv.
+
+months -- The months of the tweet files, as given to load().
+urls -- Sorted array of the distinct urls.
+sources -- Sorted array of the distinct source devices.
+filter_words -- Sorted array of the distinct filter words.
+"""
+import FileLog
+import Util
+import URLUtil
+import columnar
+import data_files
+import metrics
+import tweet_columns
+
+import numpy as npy
+
+from constants import _CACHE_FILENAME
+from constants import _FULL_SET_MONTHS
+
+_SEEDS_FILENAME = '../data/FolkWisdom/seed_times.tsv'
+_CACHE_DIR = '../data/FolkWisdom/facts/'
+_LOG_FILE = 'tweet_facts.log'
+_COLUMNS = ['tweet_id', 'month_id', 'user_id', 'created_epoch', 'url_id',
+            'delta', 'source_id', 'retweeted', 'retweet_count',
+            'filter_words_id', 'is_tweet', 'months', 'urls', 'sources',
+            'filter_words']
+_NO_DELTA = -1
+
+# The columns of the tweet files used, see tweet_columns.
+_TWEET_COLUMNS = ['tweet_id', 'user_id', 'tweet_text', 'created_at',
+                  'retweeted', 'retweet_count', 'source', 'filter_words']
+_TWEET_STRING_COLUMNS = ['tweet_text', 'source', 'filter_words']
+
+# TweetFacts already loaded in this process, by cache directory.
+_loaded = {}
+
+
+class TweetFacts:
+  """Columns of the raw tweet files, see module docstring."""
+
+  def __init__(self, columns):
+    self.tweet_id = columns['tweet_id']
+    self.month_id = columns['month_id']
+    self.user_id = columns['user_id']
+    self.created_epoch = columns['created_epoch']
+    self.url_id = columns['url_id']
+    self.delta = columns['delta']
+    self.source_id = columns['source_id']
+    self.retweeted = columns['retweeted']
+    self.retweet_count = columns['retweet_count']
+    self.filter_words_id = columns['filter_words_id']
+    self.is_tweet = columns['is_tweet']
+    self.months = columns['months']
+    self.urls = columns['urls']
+    self.sources = columns['sources']
+    self.filter_words = columns['filter_words']
+
+  def __len__(self):
+    return len(self.tweet_id)
+
+  def tweet_rows(self):
+    """Returns the row number of the one row kept for each tweet."""
+    return npy.flatnonzero(self.is_tweet)
+
+  def url_rows(self):
+    """Returns the row number of every row with a url."""
+    return npy.flatnonzero(self.url_id >= 0)
+
+  def in_window(self, rows):
+    """Returns which of the rows were created within Util.is_in_window()."""
+    created_epoch = self.created_epoch[rows]
+    return ((created_epoch > Util._TRAINING_START_EPOCH)
+            & (created_epoch < Util._TESTING_END_EPOCH))
+
+  def has_delta(self, rows):
+    """Returns which of the rows have a delta."""
+    return self.delta[rows] != _NO_DELTA
+
+  def urls_bitmap(self, urls):
+    """Returns a bool array, indexable by url_id, of whether a url is in urls.
+    """
+    return npy.in1d(self.urls, npy.array(sorted(urls), dtype=self.urls.dtype))
+
+
+def source_files(months=_FULL_SET_MONTHS, seeds_filename=_SEEDS_FILENAME):
+  """Returns the files the tweet facts of the given months are built from."""
+  filenames = []
+  for month in months:
+    filenames.extend(tweet_columns.tweet_files(month))
+  return filenames + [data_files.find(_CACHE_FILENAME), seeds_filename]
+
+
+def load(months=_FULL_SET_MONTHS, cache_dir=_CACHE_DIR,
+         seeds_filename=_SEEDS_FILENAME, cache=None):
+  """Returns the TweetFacts of the tweet files of the given months.
+
+  Keyword Arguments:
+  months -- The months of tweet files to include.
+  cache_dir -- Directory of the .npy cache of the columns.
+  seeds_filename -- The seed times file, as written by gen_seeds_and_deltas.
+  cache -- Dictionary mapping short-url to long-url, loaded if needed and None.
+  """
+  if cache_dir in _loaded:
+    return _loaded[cache_dir]
+  sources = source_files(months, seeds_filename)
+  cached = columnar.load(cache_dir, sources, _COLUMNS)
+  if cached is None:
+    if cache is None:
+      cache = Util.load_cache()
+    columns = parse(months, Util.load_seeds(), cache)
+    try:
+      columnar.save(cache_dir, columns, sources)
+      log('Cached tweet facts in %s' % cache_dir)
+    except (IOError, OSError), err:
+      log('Could not cache tweet facts in %s: %s' % (cache_dir, err))
+  else:
+    columns, _ = cached
+  tweet_facts = TweetFacts(columns)
+  _loaded[cache_dir] = tweet_facts
+  return tweet_facts
+
+
+@metrics.timed('parse_tweet_facts')
+def parse(months, seeds, cache):
+  """Builds the columns from the tweet columns (see tweet_columns) of the
+  given months.
+
+  Urls are parsed once per distinct tweet text.
+
+  Keyword Arguments:
+  months -- The months of tweet files to parse.
+  seeds -- (SeedTable) The seeds, see seed_table.
+  cache -- Dictionary mapping short-url to long-url.
+
+  Returns:
+  columns -- Dictionary of column name to array.
+  """
+  month_columns = []
+  for month in months:
+    log('Reading tweet columns of %s...' % month)
+    month_columns.append(tweet_columns.load(month, _TWEET_COLUMNS))
+  tweets = {}
+  for name in _TWEET_COLUMNS:
+    if name in _TWEET_STRING_COLUMNS:
+      tweets[name + '_values'], tweets[name] = tweet_columns.merge_strings(
+          [(columns[name + '_values'], columns[name])
+           for columns in month_columns])
+    else:
+      tweets[name] = npy.concatenate([columns[name]
+                                      for columns in month_columns])
+  month_ids = npy.concatenate([npy.repeat(month_id, len(columns['tweet_id']))
+                               for month_id, columns
+                               in enumerate(month_columns)])
+  num_tweets = len(tweets['tweet_id'])
+  metrics.add_rows(num_tweets)
+
+  # The urls of each distinct text, flattened: text i has the urls
+  # text_url_ids[text_offsets[i]:text_offsets[i + 1]], or just -1 if none.
+  log('Parsing urls of %s tweet texts...' % len(tweets['tweet_text_values']))
+  text_urls = [URLUtil.parse_urls(text, cache) or ['']
+               for text in tweets['tweet_text_values'].tolist()]
+  text_offsets = npy.zeros(len(text_urls) + 1, dtype=npy.int64)
+  npy.cumsum([len(urls) for urls in text_urls], out=text_offsets[1:])
+  flat_urls = npy.array([url for urls in text_urls for url in urls], dtype=str)
+  has_url = flat_urls != ''
+  text_url_ids = npy.empty(len(flat_urls), dtype=npy.int32)
+  text_url_ids.fill(-1)
+  urls, text_url_ids[has_url] = npy.unique(flat_urls[has_url],
+                                           return_inverse=True)
+
+  # One row per url of each tweet, in tweet order.
+  text_ids = tweets['tweet_text']
+  num_urls = npy.diff(text_offsets)[text_ids]
+  row_tweet = npy.repeat(npy.arange(num_tweets), num_urls)
+  first_rows = npy.cumsum(num_urls) - num_urls
+  position = npy.arange(len(row_tweet)) - first_rows[row_tweet]
+  url_ids = text_url_ids[text_offsets[text_ids][row_tweet] + position]
+
+  seed_epochs, seed_tweet_ids = _find_seeds(seeds, urls)
+  tweet_ids = tweets['tweet_id'][row_tweet]
+  created_epochs = tweets['created_at'][row_tweet]
+  deltas = npy.empty(len(row_tweet), dtype=npy.int64)
+  deltas.fill(_NO_DELTA)
+  has_seed = url_ids >= 0
+  has_seed[has_seed] = seed_epochs[url_ids[has_seed]] != _NO_DELTA
+  deltas[has_seed] = (created_epochs[has_seed]
+                      - seed_epochs[url_ids[has_seed]])
+  is_seed = has_seed.copy()
+  is_seed[has_seed] = tweet_ids[has_seed] == seed_tweet_ids[url_ids[has_seed]]
+  deltas[is_seed] = 0
+
+  return {'tweet_id': tweet_ids,
+          'month_id': month_ids[row_tweet].astype(npy.int8),
+          'user_id': tweets['user_id'][row_tweet],
+          'created_epoch': created_epochs,
+          'url_id': url_ids,
+          'delta': deltas,
+          'source_id': tweets['source'][row_tweet],
+          'retweeted': tweets['retweeted'][row_tweet],
+          'retweet_count': tweets['retweet_count'][row_tweet],
+          'filter_words_id': tweets['filter_words'][row_tweet],
+          'is_tweet': position == num_urls[row_tweet] - 1,
+          'months': npy.array(months),
+          'urls': urls,
+          'sources': tweets['source_values'],
+          'filter_words': tweets['filter_words_values']}
+
+
+def _find_seeds(seeds, urls):
+  """Returns the seed epoch (_NO_DELTA if none) and seed tweet id of each url.
+  """
+  seed_ids = seeds.url_ids_of(urls)
+  has_seed = seed_ids >= 0
+  seed_epochs = npy.empty(len(urls), dtype=npy.int64)
+  seed_epochs.fill(_NO_DELTA)
+  seed_epochs[has_seed] = seeds.seed_epoch[seed_ids[has_seed]]
+  seed_tweet_ids = npy.zeros(len(urls), dtype=npy.int64)
+  seed_tweet_ids[has_seed] = seeds.seed_tweet_id[seed_ids[has_seed]]
+  return seed_epochs, seed_tweet_ids
+
+
+def log(message):
+  """Helper method to modularize the format of log messages.
+
+  Keyword Arguments:
+  message -- A string to log.
+  """
+  FileLog.log(_LOG_FILE, message)
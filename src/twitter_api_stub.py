@@ -0,0 +1,183 @@
+"""
+A local stand-in for the Twitter users/lookup endpoint.
+
+Serves GET /1/users/lookup.json?user_id=1,2,3 with made up (but stable) user
+objects, so crawl_users.crawl_user_info() can be exercised without touching
+twitter. Latency, rate limits, 5xx errors and missing users are configurable,
+and rate limit state is reported in X-RateLimit-* headers like twitter does.
+
+Suggested way to use:
+(1) In process:
+    server = twitter_api_stub.start(port=8089, latency=.2, limit=100,
+                                    window=60, error_rate=.05)
+    crawl_users.crawl_user_info(user_ids,
+                                lookup_url=twitter_api_stub.lookup_url(8089))
+    server.shutdown()
+
+(2) Standalone: python twitter_api_stub.py [port]
+"""
+import sys
+import json
+import time
+import random
+import urlparse
+import threading
+import BaseHTTPServer
+import SocketServer
+
+_DEFAULT_PORT = 8089
+_LOOKUP_PATH = '/1/users/lookup.json'
+_MAX_IDS_PER_REQUEST = 100
+_CREATED_AT = 'Wed Aug 27 13:08:45 +0000 2008'
+
+
+class _Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+  """Threaded server holding the stand-in's settings and rate limit state."""
+
+  daemon_threads = True
+  allow_reuse_address = True
+
+  def __init__(self, port, latency, limit, window, error_rate, missing_rate):
+    BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', port), _Handler)
+    self.latency = latency
+    self.limit = limit
+    self.window = window
+    self.error_rate = error_rate
+    self.missing_rate = missing_rate
+    self.lock = threading.Lock()
+    self.window_start = time.time()
+    self.remaining = limit
+    self.num_requests = 0
+    self.num_limited = 0
+    self.num_errors = 0
+
+  def take_request(self):
+    """Counts a request against the rate limit.
+
+    Returns:
+    (allowed, remaining, reset) -- Whether the request is within the limit,
+                                   and the values of the rate limit headers.
+    """
+    with self.lock:
+      now = time.time()
+      if now - self.window_start >= self.window:
+        self.window_start = now
+        self.remaining = self.limit
+      self.num_requests += 1
+      reset = int(self.window_start + self.window) + 1
+      if self.remaining <= 0:
+        self.num_limited += 1
+        return False, 0, reset
+      self.remaining -= 1
+      return True, self.remaining, reset
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+  """Handles users/lookup requests."""
+
+  def do_GET(self): # pylint: disable-msg=C0103
+    server = self.server
+    url = urlparse.urlparse(self.path)
+    if url.path != _LOOKUP_PATH:
+      self.send_json(404, {'error': 'Not found'})
+      return
+    time.sleep(server.latency)
+    allowed, remaining, reset = server.take_request()
+    headers = {'X-RateLimit-Limit': server.limit,
+               'X-RateLimit-Remaining': remaining,
+               'X-RateLimit-Reset': reset}
+    if not allowed:
+      self.send_json(400, {'error': 'Rate limit exceeded.'}, headers)
+      return
+    if random.random() < server.error_rate:
+      with server.lock:
+        server.num_errors += 1
+      self.send_json(random.choice([500, 502, 503]),
+                     {'error': 'Something is technically wrong.'}, headers)
+      return
+    params = urlparse.parse_qs(url.query)
+    user_ids = [user_id for user_id
+                in params.get('user_id', [''])[0].split(',') if user_id]
+    if not user_ids or len(user_ids) > _MAX_IDS_PER_REQUEST:
+      self.send_json(403, {'error': 'Too many terms specified in query.'},
+                     headers)
+      return
+    users = [make_user(user_id) for user_id in user_ids
+             if not is_missing(user_id, server.missing_rate)]
+    if not users:
+      self.send_json(404, {'error': 'No user matches for specified terms.'},
+                     headers)
+      return
+    self.send_json(200, users, headers)
+
+  def send_json(self, code, body, headers=None):
+    payload = json.dumps(body)
+    self.send_response(code)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Content-Length', str(len(payload)))
+    for name, value in (headers or {}).items():
+      self.send_header(name, str(value))
+    self.end_headers()
+    self.wfile.write(payload)
+
+  def log_message(self, format, *args): # pylint: disable-msg=W0622
+    """Keep request logging off stderr."""
+    pass
+
+
+def is_missing(user_id, missing_rate):
+  """Deterministically marks a fraction of user ids as suspended/deleted."""
+  return random.Random(user_id).random() < missing_rate
+
+
+def make_user(user_id):
+  """Makes up a user object, the same one every time for a given id."""
+  rand = random.Random(user_id)
+  return {'id': int(user_id),
+          'id_str': user_id,
+          'screen_name': 'user%s' % user_id,
+          'name': 'User %s' % user_id,
+          'followers_count': int(rand.paretovariate(1.2)),
+          'statuses_count': rand.randint(0, 50000),
+          'friends_count': rand.randint(0, 2000),
+          'created_at': _CREATED_AT,
+          'listed_count': rand.randint(0, 100),
+          'verified': rand.random() < .01,
+          'utc_offset': -18000,
+          'time_zone': 'Eastern Time (US & Canada)',
+          'lang': 'en'}
+
+
+def lookup_url(port=_DEFAULT_PORT):
+  """Returns the users/lookup url of a stand-in running on the given port."""
+  return 'http://127.0.0.1:%s%s' % (port, _LOOKUP_PATH)
+
+
+def start(port=_DEFAULT_PORT, latency=.1, limit=180, window=15 * 60,
+          error_rate=0, missing_rate=.01):
+  """Starts the stand-in in a background thread.
+
+  Keyword Arguments:
+  port -- Port to listen on (127.0.0.1 only).
+  latency -- Seconds to wait before answering each request.
+  limit -- Number of requests allowed per rate limit window.
+  window -- Length of the rate limit window, in seconds.
+  error_rate -- Fraction of requests answered with a 5xx error.
+  missing_rate -- Fraction of user ids that do not exist.
+
+  Returns:
+  The server; call its shutdown() method to stop it.
+  """
+  server = _Server(port, latency, limit, window, error_rate, missing_rate)
+  thread = threading.Thread(target=server.serve_forever)
+  thread.daemon = True
+  thread.start()
+  return server
+
+
+if __name__ == "__main__":
+  port = _DEFAULT_PORT
+  if len(sys.argv) > 1:
+    port = int(sys.argv[1])
+  print 'Serving %s' % lookup_url(port)
+  _Server(port, .1, 180, 15 * 60, .01, .01).serve_forever()
@@ -1,10 +1,13 @@
 import Util
+import metrics
 import ground_truths
 import basic_groups
 import experts
 import even_groups
 import random
 
+from collections import OrderedDict
+
 from ground_truths import DataSet
 
 from params import _SIZE_EXPERTS
@@ -12,57 +15,98 @@ from params import _SIZE_TOP_NEWS
 from params import _EXCLUDE_RETWEETS
 from params import _EXCLUDE_TWEETS_WITHIN_DELTA
 from params import _SWITCHED
-from params import _TRAINING_SET_MONTHS
-from params import _TESTING_SET_MONTHS
 from params import _NUM_GROUPS
 from params import _SIZE_OF_GROUP_IN_PERCENT
 from params import _NON_EXPERTS_SAMPLE_SIZE
+from params import _CI_WEIGHT
+from params import _WEIGHT
+
+
+# The groups users are selected into by get_all_user_groups. Each is a set of
+# user ids, except even_groups which is a list of sets.
+GROUPS = ['population', 'newsaholics', 'active_users', 'common_users',
+          'precision', 'fscore', 'ci', 'ci_hi', 'ci_li', 'ci_1', 'ci_2', 'ci_3',
+          'super_experts', 'social_bias', 'even_groups', 'all_experts',
+          'non_experts', 'non_experts_sampled', 'non_experts_25',
+          'non_experts_10', 'non_experts_1']
+
+# Component group that counts the votes of every user, not just its members.
+ALL_USERS = None
+# Component weight that weights each vote by the log of the voter's follower
+# count (plus one, for users without followers).
+FOLLOWERS = 'followers'
+
+# The models news is ranked by, see rankings.get_rankings. Each model counts
+# the votes of its component groups, as a list of (group, weight): a url
+# scores the sum of the weights of the votes it got from their members.
+MODELS = OrderedDict([
+    ('population', [(ALL_USERS, 1)]),
+    ('newsaholics', [('newsaholics', 1)]),
+    ('active_users', [('active_users', 1)]),
+    ('common_users', [('common_users', 1)]),
+    ('precision', [('precision', 1)]),
+    ('fscore', [('fscore', 1)]),
+    ('ci', [('ci', 1)]),
+    ('ci_hi', [('ci_hi', 1)]),
+    ('ci_li', [('ci_li', 1)]),
+    ('ci_1', [('ci_1', 1)]),
+    ('ci_2', [('ci_2', 1)]),
+    ('ci_3', [('ci_3', 1)]),
+    ('super_experts', [('super_experts', 1)]),
+    ('social_bias', [('social_bias', 1)]),
+    ('non_experts', [('non_experts', 1)]),
+    ('non_experts_sampled', [('non_experts_sampled', 1)]),
+    ('non_experts_25', [('non_experts_25', 1)]),
+    ('non_experts_10', [('non_experts_10', 1)]),
+    ('non_experts_1', [('non_experts_1', 1)]),
+    ('weighted_followers', [('ci', FOLLOWERS)]),
+    ('ci_weighted', [('ci_hi', _CI_WEIGHT), ('ci_li', 1 - _CI_WEIGHT)]),
+    ('weighted', [('non_experts', _WEIGHT), ('ci', 1 - _WEIGHT)]),
+    ('weighted_both', [('non_experts', _WEIGHT),
+                       ('ci_hi', (1 - _WEIGHT) * _CI_WEIGHT),
+                       ('ci_li', (1 - _WEIGHT) * (1 - _CI_WEIGHT))]),
+])
 
 
 class UserGroups:
-  population = None
-  newsaholics = None
-  active_users = None
-  common_users = None
-  precision = None
-  fscore = None
-  ci = None
-  ci_hi = None
-  ci_li = None
-  ci_1 = None
-  ci_2 = None
-  ci_3 = None
-  super_experts = None
-  social_bias = None
-  even_groups = None
-  all_experts = None
-  non_experts = None
-  non_experts_sampled = None
-  non_experts_25 = None
-  non_experts_10 = None
-  non_experts_1 = None
-  weighted_followers = None
-  ci_weighted = None
-  weighted = None
-  weighted_both = None
-
-
-def get_all_user_groups(delta=4, category=None):
+  """A value (members, tweet counts, ranking, ...) per group or model.
+
+  Every name in GROUPS and MODELS is an attribute, None until it is set.
+  """
+
+  def __init__(self):
+    for name in GROUPS + MODELS.keys():
+      setattr(self, name, None)
+
+  def names(self):
+    """Returns the names of the models that are set, in MODELS order."""
+    return [name for name in MODELS if getattr(self, name) is not None]
+
+
+@metrics.timed('get_all_user_groups')
+def get_all_user_groups(delta=4, category=None, seed=None):
+  """Selects all the user groups for a delta and category.
+
+  Keyword Arguments:
+  delta -- The time window, in hours.
+  category -- The category, None for all news.
+  seed -- Seed for drawing the sampled non expert groups, None for a random
+          draw.
+
+  Returns:
+  (groups, d_num_followers) -- The UserGroups, and the follower count of
+                               each crawled user.
+  """
+  rand = random.Random(seed)
   seeds = Util.load_seeds()
 
   # Set up params appropriately.
   data_set = DataSet.TRAINING
-  months = _TRAINING_SET_MONTHS
   if _SWITCHED:
     data_set = DataSet.TESTING
-    months = _TESTING_SET_MONTHS
-  retweets = set()
-  if _EXCLUDE_RETWEETS:
-    retweets = ground_truths.find_retweets(months)
-
   gt_rankings = ground_truths.get_gt_rankings(seeds, data_set, category,
                                               exclude_tweets_within_delta=_EXCLUDE_TWEETS_WITHIN_DELTA,
-                                              retweets=retweets)
+                                              exclude_retweets=_EXCLUDE_RETWEETS)
   target_news = ground_truths.find_target_news(gt_rankings, _SIZE_TOP_NEWS)
 
   groups = UserGroups()
@@ -115,9 +159,9 @@ def get_all_user_groups(delta=4, category=None):
   sample_size_25 = int(len(groups.non_experts) * 0.05)
   sample_size_10 = int(len(groups.non_experts) * 0.10)
   sample_size_1 = int(len(groups.non_experts) * 0.02)
-  groups.non_experts_sampled = set(random.sample(groups.non_experts, sample_size))
-  groups.non_experts_25 = set(random.sample(groups.non_experts, sample_size_25))
-  groups.non_experts_10 = set(random.sample(groups.non_experts, sample_size_10))
-  groups.non_experts_1 = set(random.sample(groups.non_experts, sample_size_1))
+  groups.non_experts_sampled = set(rand.sample(groups.non_experts, sample_size))
+  groups.non_experts_25 = set(rand.sample(groups.non_experts, sample_size_25))
+  groups.non_experts_10 = set(rand.sample(groups.non_experts, sample_size_10))
+  groups.non_experts_1 = set(rand.sample(groups.non_experts, sample_size_1))
 
   return groups, d_num_followers
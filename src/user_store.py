@@ -0,0 +1,419 @@
+"""
+Indexed store of crawled twitter user profiles.
+
+Profiles live in a SQLite database (data/SocialHubBias/users.db) keyed by
+user id, with the time each user was crawled and a marker for 'bad' users
+(suspended or deleted, so twitter does not return them). Crawls upsert into
+it as they go, so an interrupted crawl resumes where it stopped, and the
+users left to crawl are one set difference query:
+
+  store = user_store.open_store()
+  users_to_crawl = store.frontier(candidate_user_ids)
+
+The first open_store() imports the existing user_info.tsv and bad_user.tsv
+written by crawl_users. Follower counts can be read as numpy arrays; they are
+cached as .npy files next to the database and only re-exported after the
+store changes. load_followers() wraps them for lookups, top-k and median
+splits, and keeps them for the rest of the process:
+
+  followers = user_store.load_followers()
+  most_followed = followers.top(100)
+"""
+import FileLog
+import Util
+import columnar
+
+import os
+import random
+import sqlite3
+import threading
+import numpy as npy
+from datetime import datetime
+
+from constants import _DATETIME_FORMAT
+
+_LOG_FILE = 'user_store.log'
+_OUTPUT_DIR = '../data/SocialHubBias/'
+_DB_FILENAME = 'users.db'
+_FOLLOWERS_CACHE_DIR = 'followers/'
+
+_followers = {}  # db_path -> (store, Followers)
+# Stores inherited from the parent process, kept so that a forked process
+# never closes the parent's connection either.
+_parent_stores = []
+
+_PROFILE_COLUMNS = ['screen_name', 'name', 'followers_count', 'statuses_count',
+                    'friends_count', 'created_at', 'listed_count', 'verified',
+                    'utc_offset', 'time_zone', 'lang']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+  user_id INTEGER PRIMARY KEY,
+  screen_name TEXT,
+  name TEXT,
+  followers_count INTEGER,
+  statuses_count INTEGER,
+  friends_count INTEGER,
+  created_at TEXT,
+  listed_count INTEGER,
+  verified INTEGER,
+  utc_offset TEXT,
+  time_zone TEXT,
+  lang TEXT,
+  crawled_at TEXT,
+  bad INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS meta (
+  key TEXT PRIMARY KEY,
+  value INTEGER
+);
+INSERT OR IGNORE INTO meta VALUES ('version', 0);
+"""
+
+
+class UserStore:
+  """A SQLite user profile store, safe to share between threads."""
+
+  def __init__(self, db_path):
+    self.db_path = db_path
+    self.lock = threading.Lock()
+    # SQLite connections cannot be used across fork(), see load_followers().
+    self.pid = os.getpid()
+    Util.ensure_dir_exist(db_path)
+    self.conn = sqlite3.connect(db_path, check_same_thread=False)
+    self.conn.text_factory = str
+    self.conn.executescript(_SCHEMA)
+    self.conn.execute("INSERT OR IGNORE INTO meta VALUES ('token', ?)",
+                      (random.getrandbits(62),))
+    self.conn.commit()
+
+  def close(self):
+    with self.lock:
+      self.conn.close()
+
+  def version(self):
+    """Returns a counter that increases every time the store is written."""
+    with self.lock:
+      return self.conn.execute(
+          "SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+  def token(self):
+    """Returns a random number picked when the store was created, which
+    tells it apart from a store recreated at the same path, whose version
+    starts over.
+    """
+    with self.lock:
+      return self.conn.execute(
+          "SELECT value FROM meta WHERE key = 'token'").fetchone()[0]
+
+  def _bump_version(self):
+    self.conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+  def num_users(self):
+    """Returns (num crawled users, num bad users)."""
+    with self.lock:
+      return self.conn.execute(
+          'SELECT COUNT(*) - COALESCE(SUM(bad), 0), COALESCE(SUM(bad), 0) '
+          'FROM users').fetchone()
+
+  def upsert_users(self, users):
+    """Inserts or updates crawled users.
+
+    Keyword Arguments:
+    users -- (List<crawl_users.User>) The users, with their crawl timestamp.
+    """
+    rows = [_to_row(user) for user in users]
+    with self.lock:
+      self.conn.executemany(
+          'INSERT OR REPLACE INTO users (user_id, %s, crawled_at, bad) '
+          'VALUES (%s, 0)' % (', '.join(_PROFILE_COLUMNS),
+                              ', '.join(['?'] * (len(_PROFILE_COLUMNS) + 2))),
+          rows)
+      self._bump_version()
+      self.conn.commit()
+
+  def mark_bad(self, user_ids, crawled_at=None):
+    """Marks users as bad, i.e. twitter did not return them.
+
+    Users already crawled keep their profile, but are marked bad.
+    """
+    crawled_at = _format_time(crawled_at or datetime.now())
+    rows = [(int(user_id), crawled_at) for user_id in user_ids]
+    with self.lock:
+      self.conn.executemany(
+          'INSERT OR IGNORE INTO users (user_id, crawled_at, bad) '
+          'VALUES (?, ?, 1)', rows)
+      self.conn.executemany(
+          'UPDATE users SET bad = 1, crawled_at = ? WHERE user_id = ?',
+          [(time, user_id) for user_id, time in rows])
+      self._bump_version()
+      self.conn.commit()
+
+  def frontier(self, user_ids):
+    """Returns the users that are neither crawled nor marked bad.
+
+    Keyword Arguments:
+    user_ids -- (Iterable<str>) Candidate user ids.
+
+    Returns:
+    (Set<str>) The candidates still to crawl.
+    """
+    with self.lock:
+      self.conn.execute(
+          'CREATE TEMP TABLE IF NOT EXISTS candidates '
+          '(user_id INTEGER PRIMARY KEY)')
+      self.conn.execute('DELETE FROM candidates')
+      self.conn.executemany('INSERT OR IGNORE INTO candidates VALUES (?)',
+                            [(int(user_id),) for user_id in user_ids])
+      rows = self.conn.execute('SELECT user_id FROM candidates EXCEPT '
+                               'SELECT user_id FROM users').fetchall()
+      self.conn.execute('DELETE FROM candidates')
+      self.conn.commit()
+    return set([str(user_id) for (user_id,) in rows])
+
+  def bad_users(self):
+    """Returns the set of user ids marked bad."""
+    with self.lock:
+      rows = self.conn.execute(
+          'SELECT user_id FROM users WHERE bad = 1').fetchall()
+    return set([str(user_id) for (user_id,) in rows])
+
+  def load_users(self):
+    """Loads the crawled (not bad) users.
+
+    Returns:
+    users -- (Dict<str, crawl_users.User>) user_id => user, as returned by
+             crawl_users.load_user_info.
+    """
+    # Imported here, so the analyses that only read the store do not need
+    # tweepy, which crawl_users imports.
+    import crawl_users
+    with self.lock:
+      rows = self.conn.execute(
+          'SELECT user_id, %s, crawled_at FROM users WHERE bad = 0'
+          % ', '.join(_PROFILE_COLUMNS)).fetchall()
+    users = {}
+    for row in rows:
+      user_id = str(row[0])
+      (screen_name, name, followers_count, statuses_count, friends_count,
+       created_at, listed_count, verified, utc_offset, time_zone,
+       lang) = row[1:-1]
+      users[user_id] = crawl_users.User(
+          user_id, screen_name, name, followers_count, statuses_count,
+          friends_count, created_at, listed_count, bool(verified), utc_offset,
+          time_zone, lang, row[-1])
+    return users
+
+  def screen_names(self, user_ids):
+    """Returns a dictionary of user id (str) to screen name."""
+    with self.lock:
+      self.conn.execute(
+          'CREATE TEMP TABLE IF NOT EXISTS wanted (user_id INTEGER PRIMARY KEY)')
+      self.conn.execute('DELETE FROM wanted')
+      self.conn.executemany('INSERT OR IGNORE INTO wanted VALUES (?)',
+                            [(int(user_id),) for user_id in user_ids])
+      rows = self.conn.execute(
+          'SELECT users.user_id, screen_name FROM users JOIN wanted '
+          'ON users.user_id = wanted.user_id').fetchall()
+      self.conn.execute('DELETE FROM wanted')
+      self.conn.commit()
+    return dict([(str(user_id), screen_name) for user_id, screen_name in rows])
+
+  def followers_counts(self):
+    """Returns the follower counts of the crawled (not bad) users.
+
+    Returns:
+    (user_ids, followers_counts) -- int64 arrays, sorted by user id.
+    """
+    cache_dir = os.path.join(os.path.dirname(self.db_path),
+                             _FOLLOWERS_CACHE_DIR)
+    attrs = {'version': self.version(), 'token': self.token()}
+    cached = columnar.load(cache_dir, [], ['user_id', 'followers_count'])
+    if cached is not None and cached[1] == attrs:
+      columns = cached[0]
+      return columns['user_id'], columns['followers_count']
+    with self.lock:
+      rows = self.conn.execute(
+          'SELECT user_id, followers_count FROM users WHERE bad = 0 '
+          'ORDER BY user_id').fetchall()
+    if rows:
+      table = npy.array(rows, dtype=npy.int64)
+      user_ids, followers_counts = table[:, 0], table[:, 1]
+    else:
+      user_ids = npy.array([], dtype=npy.int64)
+      followers_counts = npy.array([], dtype=npy.int64)
+    try:
+      columnar.save(cache_dir, {'user_id': user_ids,
+                                'followers_count': followers_counts},
+                    [], attrs)
+    except (IOError, OSError), err:
+      log('Could not cache follower counts in %s: %s' % (cache_dir, err))
+    return user_ids, followers_counts
+
+  def import_tsv(self, user_info_file, bad_user_file=None):
+    """Imports users from files written by crawl_users.
+
+    Later lines win, as crawl_users appends re-crawled users. Users in
+    user_info_file are not marked bad, even if a crawl of them failed before
+    they were re-crawled.
+    """
+    import crawl_users
+    users = {}
+    if os.path.exists(user_info_file):
+      log('Importing %s...' % user_info_file)
+      users = crawl_users.load_user_info(user_info_file)
+      self.upsert_users(users.values())
+    if bad_user_file and os.path.exists(bad_user_file):
+      log('Importing %s...' % bad_user_file)
+      with open(bad_user_file) as in_file:
+        bad_ids = [line.strip() for line in in_file
+                   if line.strip() and not line.strip() in users]
+      self.mark_bad(bad_ids)
+
+
+def open_store(output_dir=None):
+  """Opens the user store, creating it from the crawl_users files if needed.
+
+  Keyword Arguments:
+  output_dir -- Directory of the store and of user_info.tsv and bad_user.tsv,
+                defaults to data/SocialHubBias/.
+  """
+  output_dir = output_dir or _OUTPUT_DIR
+  db_path = output_dir + _DB_FILENAME
+  is_new = not os.path.exists(db_path)
+  store = UserStore(db_path)
+  if is_new:
+    store.import_tsv(output_dir + 'user_info.tsv',
+                     output_dir + 'bad_user.tsv')
+  return store
+
+
+class Followers:
+  """Follower counts of the crawled users, as arrays sorted by user id."""
+
+  def __init__(self, user_ids, followers_counts, version=None):
+    self.user_ids = user_ids
+    self.followers_counts = followers_counts
+    self.version = version
+    self._as_dict = None
+
+  def __len__(self):
+    return len(self.user_ids)
+
+  def lookup(self, user_ids):
+    """Looks up the follower counts of the given users.
+
+    Keyword Arguments:
+    user_ids -- (Iterable<str>) The users to look up.
+
+    Returns:
+    (user_ids, followers_counts) -- int64 arrays of the users that were
+                                    crawled, and their follower counts.
+    """
+    wanted = npy.array([int(user_id) for user_id in user_ids], dtype=npy.int64)
+    if not len(wanted) or not len(self.user_ids):
+      empty = npy.array([], dtype=npy.int64)
+      return empty, empty
+    positions = npy.searchsorted(self.user_ids, wanted)
+    positions[positions == len(self.user_ids)] = 0
+    found = self.user_ids[positions] == wanted
+    return wanted[found], self.followers_counts[positions[found]]
+
+  def top(self, k, user_ids=None):
+    """Returns the ids (int64) of the k most followed users, most first.
+
+    Keyword Arguments:
+    k -- The number of users to return.
+    user_ids -- (Iterable<str>) Only consider these users, all if None.
+    """
+    if user_ids is None:
+      ids, counts = self.user_ids, self.followers_counts
+    else:
+      ids, counts = self.lookup(user_ids)
+    k = min(k, len(ids))
+    if k <= 0:
+      return npy.array([], dtype=npy.int64)
+    # Partition out the top k, then only sort those.
+    top_k = npy.argpartition(-counts, k - 1)[:k]
+    top_k = top_k[npy.argsort(-counts[top_k], kind='mergesort')]
+    return ids[top_k]
+
+  def split_by_median(self, user_ids):
+    """Splits users into the more and the less followed half.
+
+    Users that were not crawled are left out; with an odd number of users the
+    extra one goes to the less followed half.
+
+    Returns:
+    (high, low) -- (Set<str>, Set<str>) The two halves.
+    """
+    ids, counts = self.lookup(user_ids)
+    num_high = len(ids) / 2
+    order = npy.argsort(-counts, kind='mergesort')
+    high = set([str(user_id) for user_id in ids[order[:num_high]].tolist()])
+    low = set([str(user_id) for user_id in ids[order[num_high:]].tolist()])
+    return high, low
+
+  def as_dict(self):
+    """Returns a dictionary of user id (str) to follower count."""
+    if self._as_dict is None:
+      self._as_dict = dict(zip([str(user_id) for user_id
+                                in self.user_ids.tolist()],
+                               self.followers_counts.tolist()))
+    return self._as_dict
+
+
+def load_followers(output_dir=None):
+  """Returns the Followers of the store in output_dir.
+
+  The arrays are kept for the rest of the process, and only reloaded once the
+  store has been written to.
+  """
+  db_path = (output_dir or _OUTPUT_DIR) + _DB_FILENAME
+  if db_path in _followers:
+    store, followers = _followers[db_path]
+    if store.pid != os.getpid():
+      # Loaded before this process was forked (e.g. by shared_dataset); the
+      # arrays are still good, but the connection is the parent's.
+      _parent_stores.append(store)
+      store = open_store(output_dir)
+  else:
+    store, followers = open_store(output_dir), None
+  version = store.version()
+  if followers is None or followers.version != version:
+    user_ids, followers_counts = store.followers_counts()
+    followers = Followers(user_ids, followers_counts, version)
+  _followers[db_path] = (store, followers)
+  return followers
+
+
+def _format_time(date_time):
+  if isinstance(date_time, datetime):
+    return date_time.strftime(_DATETIME_FORMAT)
+  elif date_time:
+    # Drop the microseconds of str(datetime.now()), as written by crawl_users.
+    return str(date_time)[:19]
+  return None
+
+
+def _to_row(user):
+  created_at = _format_time(user.created_at)
+  verified = None
+  if user.verified is not None:
+    verified = int(bool(user.verified))
+  utc_offset = user.utc_offset
+  if utc_offset is not None:
+    utc_offset = str(utc_offset)
+  return (int(user.id), user.screen_name, user.name, user.followers_count,
+          user.statuses_count, user.friends_count, created_at,
+          user.listed_count, verified, utc_offset, user.time_zone, user.lang,
+          _format_time(user.timestamp_crawled))
+
+
+def log(message):
+  """Helper method to modularize the format of log messages.
+
+  Keyword Arguments:
+  message -- A string to log.
+  """
+  FileLog.log(_LOG_FILE, message)
@@ -0,0 +1,80 @@
+"""
+Counts votes by (bucket x group) in one pass over the vote data.
+
+Analyses like a_time_constraint and a_hour_thresholds bucket the votes by some
+value, usually the delta, and count how many votes of each bucket were cast
+by the members of a number of user groups:
+
+  votes = vote_data.load()
+  rows = votes.scan(...)
+  members = vote_buckets.memberships(votes.user_id[rows],
+                                     [common_users, experts_ci])
+  counts = vote_buckets.count(votes.delta[rows], [0, 3600, 4 * 3600],
+                              members)
+
+counts[i, j] is the number of votes with edges[i] <= value < edges[i + 1] by
+members of group j. A new bucketing is just another call to count().
+"""
+import activity_groups
+
+import numpy as npy
+
+
+def memberships(user_ids, groups):
+  """Returns which votes were cast by members of each group.
+
+  Keyword Arguments:
+  user_ids -- (npy.array) The user id of each vote.
+  groups -- List of groups, each a set of user ids (str) or an array (int64),
+            or None for a group of every user.
+
+  Returns:
+  members -- (npy.array) Boolean, num votes x num groups.
+  """
+  voters, voter_of_vote = npy.unique(user_ids, return_inverse=True)
+  members = npy.empty((len(user_ids), len(groups)), dtype=bool)
+  for j, group in enumerate(groups):
+    if group is None:
+      members[:, j] = True
+      continue
+    if not isinstance(group, npy.ndarray):
+      group = activity_groups.to_array(group)
+    members[:, j] = activity_groups.to_bitmap(group, voters)[voter_of_vote]
+  return members
+
+
+def count(values, edges, members):
+  """Counts the votes of each group that fall in each bucket.
+
+  Keyword Arguments:
+  values -- (npy.array) The value of each vote to bucket by, e.g. its delta.
+  edges -- Ascending bucket edges: bucket i holds the values in
+           [edges[i], edges[i + 1]). Values outside all buckets are not
+           counted; use npy.inf as the last edge for an open ended bucket.
+  members -- (npy.array) Boolean, num votes x num groups, see memberships().
+
+  Returns:
+  counts -- (npy.array) int64, num buckets x num groups.
+  """
+  edges = npy.asarray(edges)
+  num_buckets = len(edges) - 1
+  num_groups = members.shape[1]
+  buckets = npy.searchsorted(edges, values, side='right') - 1
+  buckets[buckets >= num_buckets] = -1
+  votes, groups = npy.nonzero(members & (buckets >= 0)[:, npy.newaxis])
+  cells = buckets[votes] * num_groups + groups
+  counts = npy.bincount(cells, minlength=num_buckets * num_groups)
+  return counts.reshape(num_buckets, num_groups)
+
+
+def cumulative_percentages(counts, total=None):
+  """Returns the running total of counts over the buckets, as percentages.
+
+  Keyword Arguments:
+  counts -- (npy.array) num buckets x num groups, see count().
+  total -- The count that is 100 percent, the number of counted votes of the
+           first group if None.
+  """
+  if total is None:
+    total = counts[:, 0].sum()
+  return npy.cumsum(counts, axis=0) / float(total) * 100.0
@@ -0,0 +1,405 @@
+"""
+Columnar view of the time deltas file.
+
+Each row of data/FolkWisdom/time_deltas.tsv is one vote: a tweet of a url,
+with the time since the url was first seen. VoteData holds those rows as numpy
+columns so that filters (time delta, retweets, ...) become vectorized masks
+instead of a scan of the text file per query.
+
+The columns are parsed once and cached as .npy files under
+data/FolkWisdom/votes/. The cache is rebuilt whenever time_deltas.tsv changes,
+and within a process load() always returns the same VoteData.
+
+Columns:
+tweet_id -- (int64) Id of the tweet.
+user_id -- (int64) Id of the user who tweeted.
+delta -- (int64) Seconds between the tweet and the seed tweet of its url.
+url_id -- (int32) Index of the url into urls.
+category_id -- (int16) Index of the url's category into categories.
+retweeted -- (bool) Whether the tweet is a retweet.
+origin_tweet_id -- (int64) Id of the retweeted tweet, 0 if not a retweet.
+origin_user_id -- (int64) Id of the retweeted user, 0 if not a retweet.
+
+urls -- Sorted array of the distinct urls.
+categories -- Sorted array of the distinct categories ('None' for urls without
+              one).
+
+url_seed_epoch -- (int64) Seed time of each url in seconds since the epoch
+                  (see to_epoch()), -1 for urls without a seed.
+
+Rows are also indexed by category: category_rows holds the row numbers sorted
+by category, and the rows of category i are
+category_rows[category_offsets[i]:category_offsets[i + 1]]. Use
+rows_of_category() to get them.
+
+Similarly, rows are indexed by url: the rows of url i, sorted by delta, are
+url_rows[url_offsets[i]:url_offsets[i + 1]]. Use rows_of_url() to get them,
+e.g. to drill down into one story without scanning the rest.
+
+Finally, rows are split into blocks of _BLOCK_SIZE consecutive rows with the
+min/max delta and seed epoch, and the categories present, of each block.
+time_deltas.tsv is sorted by delta, so scan() can skip every block past a
+maximum delta, as well as blocks outside a seed window or without a category:
+  rows = votes.scan(max_delta=3600, seed_start=..., seed_end=..., category=...)
+"""
+import FileLog
+import columnar
+import metrics
+
+import calendar
+import numpy as npy
+from datetime import datetime
+
+from constants import _TIMEDELTAS_FILE_TWEET_ID_INDEX
+from constants import _TIMEDELTAS_FILE_USER_ID_INDEX
+from constants import _TIMEDELTAS_FILE_DELTA_INDEX
+from constants import _TIMEDELTAS_FILE_URL_INDEX
+from constants import _TIMEDELTAS_FILE_CATEGORY_INDEX
+from constants import _TIMEDELTAS_FILE_RETWEETED_INDEX
+from constants import _TIMEDELTAS_FILE_ORIGIN_TWEET_ID_INDEX
+from constants import _TIMEDELTAS_FILE_ORIGIN_USER_ID_INDEX
+from constants import _DATETIME_FORMAT
+
+_TIMEDELTAS_FILENAME = '../data/FolkWisdom/time_deltas.tsv'
+_SEEDS_FILENAME = '../data/FolkWisdom/seed_times.tsv'
+_CACHE_DIR = '../data/FolkWisdom/votes/'
+_LOG_FILE = 'vote_data.log'
+_COLUMNS = ['tweet_id', 'user_id', 'delta', 'url_id', 'category_id',
+            'retweeted', 'origin_tweet_id', 'origin_user_id', 'urls',
+            'categories', 'category_offsets', 'category_rows',
+            'url_seed_epoch', 'block_min_delta', 'block_max_delta',
+            'block_min_seed', 'block_max_seed', 'block_categories',
+            'url_offsets', 'url_rows']
+_BLOCK_SIZE = 4096
+_NO_SEED = -1
+
+# VoteData already loaded in this process, by time deltas filename.
+_loaded = {}
+
+
+class VoteData:
+  """Columns of the time deltas file, see module docstring."""
+
+  def __init__(self, columns, has_retweet_info, sources=None):
+    self.tweet_id = columns['tweet_id']
+    self.user_id = columns['user_id']
+    self.delta = columns['delta']
+    self.url_id = columns['url_id']
+    self.category_id = columns['category_id']
+    self.retweeted = columns['retweeted']
+    self.origin_tweet_id = columns['origin_tweet_id']
+    self.origin_user_id = columns['origin_user_id']
+    self.urls = columns['urls']
+    self.categories = columns['categories']
+    self.category_offsets = columns['category_offsets']
+    self.category_rows = columns['category_rows']
+    self.url_seed_epoch = columns['url_seed_epoch']
+    self.block_min_delta = columns['block_min_delta']
+    self.block_max_delta = columns['block_max_delta']
+    self.block_min_seed = columns['block_min_seed']
+    self.block_max_seed = columns['block_max_seed']
+    # (num blocks x num categories) bool, whether a block has the category.
+    self.block_categories = columns['block_categories']
+    self.url_offsets = columns['url_offsets']
+    self.url_rows = columns['url_rows']
+    # False when time_deltas.tsv predates the retweet columns.
+    self.has_retweet_info = has_retweet_info
+    # columnar.fingerprint() of the file the columns were parsed from.
+    self.sources = sources
+
+  def __len__(self):
+    return len(self.tweet_id)
+
+  def num_urls(self):
+    return len(self.urls)
+
+  def url_list(self):
+    """Returns the urls as a list of str, indexable by url_id."""
+    return self.urls.tolist()
+
+  def url_id_of(self, url):
+    """Returns the url_id of the given url, or -1 if it never received a vote."""
+    i = npy.searchsorted(self.urls, url)
+    if i < len(self.urls) and self.urls[i] == url:
+      return int(i)
+    return -1
+
+  def category_id_of(self, category):
+    """Returns the category_id of the given category, or -1 if it has no votes."""
+    i = npy.searchsorted(self.categories, str(category))
+    if i < len(self.categories) and self.categories[i] == str(category):
+      return int(i)
+    return -1
+
+  def rows_of_category(self, category):
+    """Returns the (ascending) row numbers of the votes for urls of a category.
+
+    Keyword Arguments:
+    category -- The category, e.g. 'world'. None selects urls without a
+                category, not all urls.
+    """
+    i = self.category_id_of(category)
+    if i < 0:
+      return npy.array([], dtype=self.category_rows.dtype)
+    return self.category_rows[self.category_offsets[i]:
+                              self.category_offsets[i + 1]]
+
+  def rows_of_url(self, url):
+    """Returns the row numbers of the votes for a url, sorted by delta.
+
+    Keyword Arguments:
+    url -- The url, or its url_id.
+    """
+    if isinstance(url, basestring):
+      url = self.url_id_of(url)
+    if url < 0:
+      return npy.array([], dtype=self.url_rows.dtype)
+    return self.url_rows[self.url_offsets[url]:self.url_offsets[url + 1]]
+
+  def vote_counts(self):
+    """Returns the total number of votes of each url, indexed by url_id."""
+    return npy.diff(self.url_offsets)
+
+  def matching_blocks(self, max_delta=None, seed_start=None, seed_end=None,
+                      category=None):
+    """Returns a boolean array of the blocks that may hold matching rows.
+
+    See scan() for the arguments.
+    """
+    keep = npy.ones(len(self.block_min_delta), dtype=bool)
+    if max_delta is not None:
+      keep &= self.block_min_delta <= max_delta
+    if seed_start is not None:
+      keep &= self.block_max_seed >= seed_start
+    if seed_end is not None:
+      keep &= self.block_min_seed < seed_end
+    if category:
+      i = self.category_id_of(category)
+      if i < 0:
+        keep[:] = False
+      else:
+        keep &= self.block_categories[:, i]
+    return keep
+
+  def scan(self, max_delta=None, seed_start=None, seed_end=None,
+           category=None):
+    """Returns the (ascending) row numbers of the votes matching a predicate.
+
+    Blocks whose statistics rule out a match are skipped without looking at
+    their rows. Every argument left as None does not filter.
+
+    Keyword Arguments:
+    max_delta -- Only votes with delta <= max_delta (in seconds).
+    seed_start -- Only votes for urls seeded at or after this epoch.
+    seed_end -- Only votes for urls seeded before this epoch.
+    category -- Only votes for urls of this category.
+    """
+    keep = self.matching_blocks(max_delta, seed_start, seed_end, category)
+    if category:
+      rows = self.rows_of_category(category)
+      rows = rows[keep[rows // _BLOCK_SIZE]]
+    elif keep.all():
+      rows = npy.arange(len(self))
+    else:
+      starts = npy.flatnonzero(keep) * _BLOCK_SIZE
+      ends = npy.minimum(starts + _BLOCK_SIZE, len(self))
+      rows = npy.concatenate([npy.arange(start, end) for start, end
+                              in zip(starts.tolist(), ends.tolist())] or
+                             [npy.array([], dtype=npy.int64)])
+    metrics.incr('vote_scan.blocks_read', int(keep.sum()))
+    metrics.incr('vote_scan.blocks_skipped', int(len(keep) - keep.sum()))
+
+    mask = None
+    if max_delta is not None:
+      mask = self.delta[rows] <= max_delta
+    if seed_start is not None or seed_end is not None:
+      seed_epochs = self.url_seed_epoch[self.url_id[rows]]
+      seed_mask = seed_epochs != _NO_SEED
+      if seed_start is not None:
+        seed_mask &= seed_epochs >= seed_start
+      if seed_end is not None:
+        seed_mask &= seed_epochs < seed_end
+      if mask is None:
+        mask = seed_mask
+      else:
+        mask &= seed_mask
+    if mask is not None:
+      rows = rows[mask]
+    return rows
+
+
+def load(filename=_TIMEDELTAS_FILENAME, cache_dir=_CACHE_DIR,
+         seeds_filename=_SEEDS_FILENAME):
+  """Returns the VoteData for the given time deltas file.
+
+  Keyword Arguments:
+  filename -- The time deltas file, as written by gen_seeds_and_deltas.
+  cache_dir -- Directory of the .npy cache of the columns.
+  seeds_filename -- The seed times file, as written by gen_seeds_and_deltas.
+  """
+  if filename in _loaded:
+    return _loaded[filename]
+  sources = [filename, seeds_filename]
+  cached = columnar.load(cache_dir, sources, _COLUMNS)
+  if cached is None:
+    columns, has_retweet_info = parse(filename, seeds_filename)
+    try:
+      columnar.save(cache_dir, columns, sources,
+                    {'has_retweet_info': has_retweet_info})
+      log('Cached vote columns in %s' % cache_dir)
+    except (IOError, OSError), err:
+      log('Could not cache vote columns in %s: %s' % (cache_dir, err))
+  else:
+    columns, attrs = cached
+    has_retweet_info = attrs['has_retweet_info']
+  vote_data = VoteData(columns, has_retweet_info,
+                       columnar.fingerprint(sources))
+  _loaded[filename] = vote_data
+  return vote_data
+
+
+@metrics.timed('parse_time_deltas')
+def parse(filename=_TIMEDELTAS_FILENAME, seeds_filename=_SEEDS_FILENAME):
+  """Parses the time deltas (and seed times) file into columns.
+
+  Returns:
+  (columns, has_retweet_info) -- Dictionary of column name to array, and
+                                 whether the file has the retweet columns.
+  """
+  log('Parsing %s...' % filename)
+  tweet_ids = []
+  user_ids = []
+  deltas = []
+  urls = []
+  categories = []
+  retweeted = []
+  origin_tweet_ids = []
+  origin_user_ids = []
+  has_retweet_info = True
+  with open(filename) as input_file:
+    for line in metrics.counted(input_file):
+      tokens = line.rstrip('\r\n').split('\t')
+      tweet_ids.append(int(tokens[_TIMEDELTAS_FILE_TWEET_ID_INDEX]))
+      user_ids.append(int(tokens[_TIMEDELTAS_FILE_USER_ID_INDEX]))
+      deltas.append(int(tokens[_TIMEDELTAS_FILE_DELTA_INDEX]))
+      urls.append(tokens[_TIMEDELTAS_FILE_URL_INDEX])
+      categories.append(tokens[_TIMEDELTAS_FILE_CATEGORY_INDEX].strip())
+      if len(tokens) > _TIMEDELTAS_FILE_ORIGIN_USER_ID_INDEX:
+        retweeted.append(parse_flag(tokens[_TIMEDELTAS_FILE_RETWEETED_INDEX]))
+        origin_tweet_ids.append(
+            parse_id(tokens[_TIMEDELTAS_FILE_ORIGIN_TWEET_ID_INDEX]))
+        origin_user_ids.append(
+            parse_id(tokens[_TIMEDELTAS_FILE_ORIGIN_USER_ID_INDEX]))
+      else:
+        has_retweet_info = False
+        retweeted.append(False)
+        origin_tweet_ids.append(0)
+        origin_user_ids.append(0)
+  if not has_retweet_info:
+    log('%s has no retweet columns, rerun gen_seeds_and_deltas to add them.'
+        % filename)
+
+  unique_urls, url_ids = _encode(urls)
+  unique_categories, category_ids = _encode(categories)
+  # Stable, so the rows of each category stay in ascending order.
+  category_rows = npy.argsort(category_ids, kind='mergesort')
+  category_offsets = _offsets(category_ids, len(unique_categories))
+  deltas = npy.array(deltas, dtype=npy.int64)
+  # Sorted by url, then delta (lexsort is stable, so ties keep file order).
+  url_rows = npy.lexsort((deltas, url_ids))
+  url_offsets = _offsets(url_ids, len(unique_urls))
+  columns = {'tweet_id': npy.array(tweet_ids, dtype=npy.int64),
+             'user_id': npy.array(user_ids, dtype=npy.int64),
+             'delta': deltas,
+             'url_id': url_ids.astype(npy.int32),
+             'category_id': category_ids.astype(npy.int16),
+             'retweeted': npy.array(retweeted, dtype=bool),
+             'origin_tweet_id': npy.array(origin_tweet_ids, dtype=npy.int64),
+             'origin_user_id': npy.array(origin_user_ids, dtype=npy.int64),
+             'urls': unique_urls,
+             'categories': unique_categories,
+             'category_offsets': category_offsets,
+             'category_rows': category_rows.astype(npy.int32),
+             'url_offsets': url_offsets,
+             'url_rows': url_rows.astype(npy.int32)}
+  columns['url_seed_epoch'] = _find_seed_epochs(seeds_filename, unique_urls)
+  columns.update(_block_statistics(columns, len(unique_categories)))
+  return columns, has_retweet_info
+
+
+def _offsets(codes, num_codes):
+  """Returns the CSR offsets of rows grouped by code (length num_codes + 1)."""
+  offsets = npy.zeros(num_codes + 1, dtype=npy.int64)
+  npy.cumsum(npy.bincount(codes, minlength=num_codes), out=offsets[1:])
+  return offsets
+
+
+def _find_seed_epochs(seeds_filename, urls):
+  """Returns the seed epoch of each url, _NO_SEED if it has none."""
+  seed_epochs = {}
+  with open(seeds_filename) as input_file:
+    for line in input_file:
+      tokens = line.split('\t')
+      seed_time = datetime.strptime(tokens[2], _DATETIME_FORMAT)
+      seed_epochs[tokens[3].strip()] = to_epoch(seed_time)
+  return npy.array([seed_epochs.get(url, _NO_SEED) for url in urls.tolist()],
+                   dtype=npy.int64)
+
+
+def _block_statistics(columns, num_categories):
+  """Computes the per block statistics used by VoteData.scan()."""
+  num_rows = len(columns['delta'])
+  starts = npy.arange(0, num_rows, _BLOCK_SIZE)
+  seed_epochs = columns['url_seed_epoch'][columns['url_id']]
+  block_categories = npy.zeros((len(starts), num_categories), dtype=bool)
+  if num_rows:
+    block_ids = npy.arange(num_rows) // _BLOCK_SIZE
+    block_categories[block_ids, columns['category_id']] = True
+    return {'block_min_delta': npy.minimum.reduceat(columns['delta'], starts),
+            'block_max_delta': npy.maximum.reduceat(columns['delta'], starts),
+            'block_min_seed': npy.minimum.reduceat(seed_epochs, starts),
+            'block_max_seed': npy.maximum.reduceat(seed_epochs, starts),
+            'block_categories': block_categories}
+  empty = npy.array([], dtype=npy.int64)
+  return {'block_min_delta': empty, 'block_max_delta': empty,
+          'block_min_seed': empty, 'block_max_seed': empty,
+          'block_categories': block_categories}
+
+
+def to_epoch(date_time):
+  """Converts a (naive) datetime to seconds since the epoch."""
+  return calendar.timegm(date_time.timetuple())
+
+
+def _encode(values):
+  """Dictionary encodes a list of strings.
+
+  Returns:
+  (dictionary, codes) -- Sorted array of the distinct values, and the index
+                         of each value into it.
+  """
+  if not values:
+    return npy.array([], dtype='S1'), npy.array([], dtype=npy.int64)
+  return npy.unique(npy.array(values), return_inverse=True)
+
+
+def parse_flag(token):
+  """Parses a boolean field of a tweet file ('1', 'True', '0', 'False', ...)."""
+  return token.strip().lower() in ('1', 'true', 't', 'yes', 'y')
+
+
+def parse_id(token):
+  """Parses an optional id field of a tweet file, 0 if empty or null."""
+  try:
+    return int(token)
+  except ValueError:
+    return 0
+
+
+def log(message):
+  """Helper method to modularize the format of log messages.
+
+  Keyword Arguments:
+  message -- A string to log.
+  """
+  FileLog.log(_LOG_FILE, message)